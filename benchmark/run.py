@@ -0,0 +1,259 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# pylint: disable=C0111
+
+# The benchmark package provides the means to measure the performance of the
+# computational core of the lizard waterbalance Django app.
+#
+# Copyright (C) 2012 Nelen & Schuurmans
+#
+# This package is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this package.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Measure the time each stage of the waterbalance computation takes.
+
+The stages are the memoized methods of WaterbalanceComputer2. They are
+executed in the order of WaterbalanceComputer2.compute, so the time of a
+stage does not include the time of the stages it depends on.
+
+"""
+
+import json
+import logging
+import os
+import subprocess
+import sys
+
+from datetime import datetime
+from optparse import OptionParser
+from time import time
+from xml.etree import ElementTree
+
+from timeseries.timeseries import TimeSeries
+
+from lizard_wbcomputation.compute import WaterbalanceComputer2
+from xmlmodel.reader import attach_timeseries_to_structures
+from xmlmodel.reader import parse_parameters
+from xmlmodel.utils import convert_dom
+from xmlmodel.validation import validate_settings
+from xmlmodel.wbcompute import ASSOC
+from xmlmodel.wbcompute import insert_calculation_range
+from xmlmodel.wbcompute import negate_outgoing_timeseries
+
+from benchmark.synthetic import create_area
+
+
+def compute_impacts(computer, start_date, end_date):
+    for substance in ['phosphate', 'nitrogen', 'sulphate']:
+        computer.get_impact_timeseries(start_date, end_date, substance)
+
+
+STAGES = [
+    ('input', lambda c, s, e: c.get_input_timeseries(s, e)),
+    ('buckets', lambda c, s, e: c.get_buckets_timeseries(s, e)),
+    ('summary', lambda c, s, e: c.get_bucketflow_summary(s, e)),
+    ('vertical', lambda c, s, e: c.get_vertical_open_water_timeseries(s, e)),
+    ('level_control', lambda c, s, e: c.get_level_control_timeseries(s, e)),
+    ('sluice_error', lambda c, s, e: c.calc_sluice_error_timeseries(s, e)),
+    ('fractions', lambda c, s, e: c.get_fraction_timeseries(s, e)),
+    ('impacts', compute_impacts),
+    ('concentration', lambda c, s, e: c.get_concentration_timeseries(s, e)),
+    ]
+
+
+def prepare_area(area, start_date):
+    """Prepare the given Area for computation just like wbcompute does."""
+    negate_outgoing_timeseries(area)
+    area.set_init_water_level(start_date)
+    validate_settings(area)
+
+
+def time_stages(area, start_date, end_date):
+    """Return the dict of stage name to the time in seconds it took."""
+    computer = WaterbalanceComputer2(None, area)
+    seconds = {}
+    for name, stage in STAGES:
+        t1 = time()
+        stage(computer, start_date, end_date)
+        seconds[name] = time() - t1
+    return seconds
+
+
+def benchmark_synthetic(buckets, pumping_stations, years, repeat):
+    """Return the timings of the computation for a synthetic Area.
+
+    Each repetition uses a new Area, so no repetition profits from the time
+    series that a previous repetition has cached.
+
+    """
+    timings = {}
+    for _ in range(repeat):
+        t1 = time()
+        area, start_date, end_date = create_area(buckets, pumping_stations,
+                                                 years)
+        prepare_area(area, start_date)
+        seconds = {'reading': time() - t1}
+        seconds.update(time_stages(area, start_date, end_date))
+        for name, value in seconds.items():
+            timings.setdefault(name, []).append(value)
+    return timings
+
+
+def read_run_file(run_file):
+    """Return the Run.xml settings that wbcompute uses."""
+    run_dom = ElementTree.parse(run_file)
+    convert_dom(run_dom)
+    root = run_dom.getroot()
+    run_info = dict((i.tag, i.text)
+                    for i in root.getchildren()
+                    if i.tag != u"properties")
+    insert_calculation_range(run_dom, run_info)
+    return run_info
+
+
+def benchmark_run_file(run_file, repeat):
+    """Return the timings of the computation specified by the given Run.xml.
+
+    The reading stage consists of the reading of the time series and the
+    parameters, just as it does in wbcompute.
+
+    """
+    run_info = read_run_file(run_file)
+    start_date = run_info['startDateTime']
+    end_date = run_info['endDateTime']
+    timings = {}
+    for _ in range(repeat):
+        t1 = time()
+        tsd = TimeSeries.as_dict(run_info['inputTimeSeriesFile'])
+        area = parse_parameters(run_info['inputParameterFile'])
+        attach_timeseries_to_structures(area, tsd, ASSOC)
+        prepare_area(area, start_date)
+        seconds = {'reading': time() - t1}
+        seconds.update(time_stages(area, start_date, end_date))
+        for name, value in seconds.items():
+            timings.setdefault(name, []).append(value)
+    return timings
+
+
+def get_revision():
+    """Return the git revision of the working directory, if any."""
+    try:
+        process = subprocess.Popen(['git', 'rev-parse', 'HEAD'],
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+        output = process.communicate()[0]
+    except OSError:
+        return None
+    if process.returncode != 0:
+        return None
+    return output.strip()
+
+
+def compare(old, new):
+    """Return the lines that compare the best timings of two result dicts."""
+    lines = []
+    for benchmark in sorted(new['benchmarks']):
+        if benchmark not in old['benchmarks']:
+            continue
+        old_stages = old['benchmarks'][benchmark]['stages']
+        new_stages = new['benchmarks'][benchmark]['stages']
+        for stage in sorted(new_stages):
+            if stage not in old_stages:
+                continue
+            old_best = min(old_stages[stage])
+            new_best = min(new_stages[stage])
+            if old_best > 0:
+                ratio = '%.2f' % (new_best / old_best)
+            else:
+                ratio = '-'
+            lines.append('%-40s %-15s %10.3f %10.3f %6s' % \
+                (benchmark, stage, old_best, new_best, ratio))
+    return lines
+
+
+def main(args=None):
+    """Run the benchmarks and store their results as JSON.
+
+    The positional arguments are the paths to the Run.xml files that specify
+    the real-world computations to benchmark, e.g. the Run-unix.xml files in
+    data/deltares.
+
+    """
+    if args is None:
+        args = sys.argv[1:]
+    parser = OptionParser(usage="%prog [options] [Run.xml ...]")
+    parser.add_option("--buckets", type="int", default=8,
+                      help="number of buckets of the synthetic area")
+    parser.add_option("--pumping-stations", type="int", default=4,
+                      help="number of measured intakes and pumps of the "
+                      "synthetic area")
+    parser.add_option("--years", type="int", default=10,
+                      help="number of years of the synthetic time series")
+    parser.add_option("--repeat", type="int", default=3,
+                      help="number of times to run each benchmark")
+    parser.add_option("--no-synthetic", action="store_false",
+                      dest="synthetic", default=True,
+                      help="skip the benchmark of the synthetic area")
+    parser.add_option("--output", default="benchmark.json",
+                      help="file to store the results in")
+    parser.add_option("--compare",
+                      help="results of an earlier run to compare with")
+    options, run_files = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.WARNING)
+
+    benchmarks = {}
+    if options.synthetic:
+        name = 'synthetic-b%d-p%d-y%d' % \
+            (options.buckets, options.pumping_stations, options.years)
+        print >> sys.stderr, "running benchmark %s" % name
+        benchmarks[name] = {
+            'parameters': {'buckets': options.buckets,
+                           'pumping_stations': options.pumping_stations,
+                           'years': options.years},
+            'stages': benchmark_synthetic(options.buckets,
+                                          options.pumping_stations,
+                                          options.years,
+                                          options.repeat),
+            }
+    for run_file in run_files:
+        name = os.path.normpath(run_file)
+        print >> sys.stderr, "running benchmark %s" % name
+        benchmarks[name] = {
+            'parameters': {'run_file': run_file},
+            'stages': benchmark_run_file(run_file, options.repeat),
+            }
+
+    results = {'revision': get_revision(),
+               'date': datetime.now().isoformat(),
+               'python': sys.version.split()[0],
+               'repeat': options.repeat,
+               'benchmarks': benchmarks,
+               }
+    output = open(options.output, 'w')
+    try:
+        json.dump(results, output, indent=2, sort_keys=True)
+    finally:
+        output.close()
+
+    if options.compare:
+        old = json.load(open(options.compare))
+        print "%-40s %-15s %10s %10s %6s" % \
+            ('benchmark', 'stage', 'old [s]', 'new [s]', 'ratio')
+        for line in compare(old, results):
+            print line
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
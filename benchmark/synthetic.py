@@ -0,0 +1,273 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# pylint: disable=C0111
+
+# The benchmark package provides the means to measure the performance of the
+# computational core of the lizard waterbalance Django app.
+#
+# Copyright (C) 2012 Nelen & Schuurmans
+#
+# This package is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this package.  If not, see <http://www.gnu.org/licenses/>.
+
+import math
+import random
+
+from datetime import datetime
+from datetime import timedelta
+
+from timeseries.timeseries import TimeSeries
+
+from lizard_wbcomputation.bucket_types import BucketTypes
+from xmlmodel.reader import Area
+from xmlmodel.reader import Bucket
+from xmlmodel.reader import PumpingStation
+
+
+AREA_SETTINGS = {
+    'surface': 280715.0,
+    'bottom_height': -2.75,
+    'ini_con_cl': 90.0,
+    'max_intake': 99999.0,
+    'max_outtake': 115200.0,
+    'concentr_chloride_precipitation': 6.0,
+    'concentr_chloride_seepage': 50.0,
+    'min_concentr_phosphate_precipitation': 0.0,
+    'incr_concentr_phosphate_precipitation': 0.02,
+    'min_concentr_phosphate_seepage': 0.1,
+    'incr_concentr_phosphate_seepage': 0.02,
+    'min_concentr_nitrogen_precipitation': 0.0,
+    'incr_concentr_nitrogen_precipitation': 0.0,
+    'min_concentr_nitrogen_seepage': 0.0,
+    'incr_concentr_nitrogen_seepage': 0.0,
+    'min_concentr_sulphate_precipitation': 0.0,
+    'incr_concentr_sulphate_precipitation': 0.0,
+    'min_concentr_sulphate_seepage': 0.0,
+    'incr_concentr_sulphate_seepage': 0.0,
+    }
+
+BUCKET_SETTINGS = {
+    'surface': 3852795.0,
+    'is_computed': True,
+    'bottom_porosity': 0.2,
+    'bottom_crop_evaporation_factor': 0.75,
+    'bottom_min_crop_evaporation_factor': 0.0,
+    'bottom_drainage_fraction': 0.1,
+    'bottom_indraft_fraction': 0.1,
+    'bottom_max_water_level': 1.0,
+    'bottom_min_water_level': 0.0,
+    'bottom_equi_water_level': 0.0,
+    'bottom_init_water_level': 0.5,
+    'porosity': 0.2,
+    'crop_evaporation_factor': 1.0,
+    'min_crop_evaporation_factor': 1.0,
+    'drainage_fraction': 0.01,
+    'indraft_fraction': 0.00333,
+    'max_water_level': 1.0,
+    'min_water_level': 0.0,
+    'equi_water_level': 0.0,
+    'init_water_level': 0.0,
+    'label_flow_off': 'NIETS',
+    'label_drainage_indraft': 'NIETS',
+    'replace_impact_by_nutricalc': False,
+    'concentr_chloride_flow_off': 25.0,
+    'concentr_chloride_drainage_indraft': 50.0,
+    'min_concentr_phosphate_flow_off': 0.6,
+    'min_concentr_phosphate_drainage_indraft': 0.6,
+    'incr_concentr_phosphate_flow_off': 0.6,
+    'incr_concentr_phosphate_drainage_indraft': 0.6,
+    'min_concentr_nitrogen_flow_off': 0.0,
+    'min_concentr_nitrogen_drainage_indraft': 0.0,
+    'incr_concentr_nitrogen_flow_off': 0.0,
+    'incr_concentr_nitrogen_drainage_indraft': 0.0,
+    'min_concentr_sulphate_flow_off': 0.0,
+    'min_concentr_sulphate_drainage_indraft': 0.0,
+    'incr_concentr_sulphate_flow_off': 0.0,
+    'incr_concentr_sulphate_drainage_indraft': 0.0,
+    }
+
+PUMPING_STATION_SETTINGS = {
+    'concentr_chloride': 100.0,
+    'min_concentr_phosphate': 0.1,
+    'incr_concentr_phosphate': 0.0,
+    'min_concentr_nitrogen': 0.0,
+    'incr_concentr_nitrogen': 0.0,
+    'min_concentr_sulphate': 0.0,
+    'incr_concentr_sulphate': 0.0,
+    }
+
+
+class SyntheticAreaFactory(object):
+    """Creates an xmlmodel Area with generated settings and time series.
+
+    The Area has the given number of buckets, which are evenly spread over
+    the different bucket types, and the given number of measured intakes and
+    pumps, in addition to the intake and pump that are used for level control.
+    Each input time series contains a daily value for each day of the given
+    number of years.
+
+    The time series are generated with a fixed seed, so two factories with the
+    same arguments create the same Area.
+
+    """
+    def __init__(self, buckets=8, pumping_stations=4, years=10,
+                 start_date=datetime(2000, 1, 1), seed=0):
+        self.nr_buckets = buckets
+        self.nr_pumping_stations = pumping_stations
+        self.start_date = start_date
+        self.end_date = start_date + timedelta(int(round(365.25 * years)))
+        self.seed = seed
+
+    def create(self):
+        """Return the synthetic Area.
+
+        Just as wbcompute does for an Area read from file, you should still
+        set its initial water level and validate its settings before you can
+        compute its waterbalance.
+
+        """
+        self.random = random.Random(self.seed)
+        area = self._create_area()
+        for index in range(self.nr_buckets):
+            area.bucket.append(self._create_bucket(area, index))
+        area.pumpingstation.append(
+            self._create_pumping_station(area, 'inlaatPB1', True, True))
+        area.pumpingstation.append(
+            self._create_pumping_station(area, 'uitlaatPB1', False, True))
+        for index in range(self.nr_pumping_stations):
+            into = index % 2 == 0
+            if into:
+                name = 'inlaat%d' % (index + 1)
+            else:
+                name = 'uitlaat%d' % (index + 1)
+            area.pumpingstation.append(
+                self._create_pumping_station(area, name, into, False))
+        return area
+
+    def dates(self):
+        date = self.start_date
+        while date < self.end_date:
+            yield date
+            date += timedelta(1)
+
+    def create_timeseries(self, function):
+        """Return the TimeSeries with the values of function for each date.
+
+        Parameter *function* is a callable that returns the value for the
+        given date.
+
+        """
+        timeseries = TimeSeries()
+        for date in self.dates():
+            timeseries[date] = function(date)
+        return timeseries
+
+    def _create_area(self):
+        area = Area()
+        area.location_id = 'SYNTH'
+        area.name = 'synthetic area'
+        area.bucket = []
+        area.pumpingstation = []
+        for name, value in AREA_SETTINGS.items():
+            setattr(area, name, value)
+
+        bottom_height = area.bottom_height
+        attach = area.attach_timeseries
+        attach('precipitation', self.create_timeseries(self._precipitation))
+        attach('evaporation', self.create_timeseries(self._evaporation))
+        attach('seepage', self.create_timeseries(lambda date: 0.95))
+        attach('infiltration', self.create_timeseries(lambda date: 0.0))
+        attach('water_level', self.create_timeseries(
+            lambda date: bottom_height + 0.5 + self._season(date) * 0.05))
+        attach('minimum_level', self.create_timeseries(
+            lambda date: bottom_height + 0.43 + self._season(date) * 0.05))
+        attach('maximum_level', self.create_timeseries(
+            lambda date: bottom_height + 0.51 + self._season(date) * 0.05))
+        attach('nutricalc_min', self.create_timeseries(lambda date: 0.0))
+        attach('nutricalc_incr', self.create_timeseries(lambda date: 0.0))
+        return area
+
+    def _create_bucket(self, area, index):
+        bucket = Bucket()
+        bucket.location_id = '%s-BUCKET-%d' % (area.location_id, index + 1)
+        bucket.name = bucket.location_id
+        surface_types = BucketTypes.SURFACE_TYPES
+        bucket.surface_type = surface_types[index % len(surface_types)][0]
+        for name, value in BUCKET_SETTINGS.items():
+            setattr(bucket, name, value)
+
+        if bucket.surface_type == BucketTypes.STEDELIJK_SURFACE:
+            sewer = self._sewer
+        else:
+            sewer = lambda date: 0.0
+        bucket.attach_timeseries('seepage',
+                                 self.create_timeseries(lambda date: 0.95))
+        bucket.attach_timeseries('sewer', self.create_timeseries(sewer))
+        bucket.attach_timeseries('flow_off',
+                                 self.create_timeseries(lambda date: 0.0))
+        bucket.attach_timeseries('net_drainage',
+                                 self.create_timeseries(lambda date: 0.0))
+        return bucket
+
+    def _create_pumping_station(self, area, name, into, is_computed):
+        station = PumpingStation()
+        station.location_id = '%s_%s' % (area.location_id, name)
+        station.name = station.location_id
+        station.into = into
+        station.is_computed = is_computed
+        for setting, value in PUMPING_STATION_SETTINGS.items():
+            setattr(station, setting, value)
+
+        if is_computed:
+            discharge = lambda date: 0.0
+        else:
+            discharge = self._discharge
+        station.attach_timeseries('sum_timeseries',
+                                  self.create_timeseries(discharge))
+        return station
+
+    def _season(self, date):
+        """Return a value between -1 and 1 that peaks in the summer."""
+        return -math.cos(2 * math.pi * date.timetuple().tm_yday / 365.25)
+
+    def _precipitation(self, date):
+        if self.random.random() < 0.5:
+            return 0.0
+        return self.random.expovariate(1 / 4.0)
+
+    def _evaporation(self, date):
+        return max(0.0, 2.5 + 2.5 * self._season(date) +
+                   self.random.uniform(-0.5, 0.5))
+
+    def _sewer(self, date):
+        if self.random.random() < 0.9:
+            return 0.0
+        return self.random.uniform(0.0, 500.0)
+
+    def _discharge(self, date):
+        if self.random.random() < 0.3:
+            return 0.0
+        return self.random.uniform(0.0, 20000.0)
+
+
+def create_area(buckets=8, pumping_stations=4, years=10,
+                start_date=datetime(2000, 1, 1), seed=0):
+    """Return a synthetic Area and the date range of its time series.
+
+    See class SyntheticAreaFactory for the meaning of the parameters.
+
+    """
+    factory = SyntheticAreaFactory(buckets, pumping_stations, years,
+                                   start_date, seed)
+    return factory.create(), factory.start_date, factory.end_date
@@ -0,0 +1,83 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# pylint: disable=C0111
+
+# The benchmark package provides the means to measure the performance of the
+# computational core of the lizard waterbalance Django app.
+#
+# Copyright (C) 2012 Nelen & Schuurmans
+#
+# This package is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this package.  If not, see <http://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+
+from lizard_wbcomputation.bucket_types import BucketTypes
+
+from benchmark.run import compare
+from benchmark.synthetic import create_area
+
+
+class SyntheticAreaTests(TestCase):
+
+    def setUp(self):
+        self.area, self.start_date, self.end_date = \
+            create_area(buckets=5, pumping_stations=3, years=1)
+
+    def test_a(self):
+        """Test the area has buckets of each type."""
+        self.assertEqual(5, len(self.area.buckets))
+        surface_types = set(bucket.surface_type
+                            for bucket in self.area.buckets)
+        self.assertEqual(len(BucketTypes.SURFACE_TYPES), len(surface_types))
+
+    def test_b(self):
+        """Test the area has the level control stations."""
+        self.assertEqual(5, len(self.area.pumping_stations))
+        computed = [(station.into, station.location_id)
+                    for station in self.area.pumping_stations
+                    if station.is_computed]
+        self.assertEqual([(True, 'SYNTH_inlaatPB1'),
+                          (False, 'SYNTH_uitlaatPB1')], computed)
+
+    def test_c(self):
+        """Test the input time series have a value for each day."""
+        events = list(self.area.retrieve_precipitation().events())
+        self.assertEqual(365, len(events))
+        self.assertEqual(self.start_date, events[0][0])
+
+    def test_d(self):
+        """Test the area contains all expected fields."""
+        self.assertTrue(self.area.validate())
+        for obj in self.area.buckets + self.area.pumping_stations:
+            self.assertTrue(obj.validate())
+
+    def test_e(self):
+        """Test two areas with the same arguments are the same."""
+        area = create_area(buckets=5, pumping_stations=3, years=1)[0]
+        self.assertEqual(list(self.area.retrieve_precipitation().events()),
+                         list(area.retrieve_precipitation().events()))
+
+
+class CompareTests(TestCase):
+
+    def test_a(self):
+        """Test the comparison of two results."""
+        old = {'benchmarks': {'a': {'stages': {'input': [2.0, 1.0]}}}}
+        new = {'benchmarks': {'a': {'stages': {'input': [0.5, 0.6]}},
+                              'b': {'stages': {'input': [1.0]}}}}
+        lines = compare(old, new)
+        self.assertEqual(1, len(lines))
+        self.assertTrue(lines[0].startswith('a '))
+        self.assertTrue(lines[0].endswith('1.000      0.500   0.50'))
@@ -26,6 +26,7 @@ import logging
 
 from lizard_waterbalance.models import IncompleteData
 from lizard_waterbalance.models import PumpingStation as DatabasePumpingStation
+from lizard_waterbalance.models import sum_abs_events
 from lizard_wbcomputation.bucket_types import BucketTypes
 from timeseries.timeseriesstub import add_timeseries
 from timeseries.timeseriesstub import map_timeseries
@@ -40,11 +41,77 @@ NEW_ATTR_NAMES = {
     "incr_concentr_phosphate": "stof_increment",
     }
 
+def load_concentrations(configuration):
+    """Return the dict of label program name to Concentration.
+
+    The dict contains the Concentration(s) of the given WaterbalanceConf.
+
+    """
+    concentrations = {}
+    for concentr in configuration.config_concentrations.all().select_related('label'):
+        concentrations.setdefault(concentr.label.program_name, concentr)
+    return concentrations
+
+
+class ConfigurationSnapshot(object):
+    """Contains the configuration data of an Area that a computation uses.
+
+    The snapshot retrieves the buckets, pumping stations and concentrations
+    from the database once, when it is created. Changes to the database after
+    that moment are not visible in the snapshot.
+
+    Instance variables:
+    * open_water -- the OpenWater of the configuration
+    * concentrations -- dict of label program name to Concentration
+    * buckets -- tuple of the Bucket(s) of the open water
+    * pumping_stations -- tuple of the PumpingStation(s) of the open water
+
+    """
+    def __init__(self, configuration):
+        self.open_water = configuration.open_water
+        self.concentrations = load_concentrations(configuration)
+        self.buckets = tuple(
+            Bucket(configuration, b, self.concentrations).copy_properties()
+            for b in self.open_water.buckets.all())
+        db_stations = DatabasePumpingStation.objects.filter(
+            open_water=self.open_water).select_related('label')
+        self.pumping_stations = tuple(
+            PumpingStation(configuration, s, self.concentrations).copy_properties()
+            for s in db_stations)
+
+
 class Area(object):
+    """Provides the configuration data of a waterbalance computation.
 
+    The Area loads a ConfigurationSnapshot on the first access of its
+    buckets, pumping stations or concentrations and uses that snapshot for
+    the rest of its lifetime. To see the changes to the database after that
+    moment, use a new Area.
+
+    """
     def __init__(self, configuration):
 
         self.configuration = configuration
+        self._snapshot = None
+
+    @property
+    def snapshot(self):
+        """Return the ConfigurationSnapshot of the current Area."""
+        if self._snapshot is None:
+            self._snapshot = ConfigurationSnapshot(self.configuration)
+        return self._snapshot
+
+    def get_concentration(self, program_name, attribute):
+        """Return the attribute of the Concentration of the given Label.
+
+        The Label is specified by its program name. If no such Label exists,
+        this method returns None.
+
+        """
+        concentr = self.snapshot.concentrations.get(program_name)
+        if concentr is None:
+            return None
+        return getattr(concentr, attribute)
 
     @property
     def surface(self):
@@ -109,21 +176,12 @@ class Area(object):
     @property
     def buckets(self):
         """Return the Bucket(s) for the current Area."""
-        config = self.configuration
-        database_buckets = config.open_water.buckets.all()
-        new_buckets = [Bucket(config, b) for b in database_buckets]
-        return map(lambda b:b.copy_properties(), new_buckets)
+        return list(self.snapshot.buckets)
 
     @property
     def pumping_stations(self):
         """Return the PumpingStation(s) for the current Area."""
-        open_water = self.configuration.open_water
-        stations = []
-        for s in DatabasePumpingStation.objects.filter(open_water=open_water):
-            station = PumpingStation(self.configuration, s)
-            station.copy_properties()
-            stations.append(station)
-        return stations
+        return list(self.snapshot.pumping_stations)
 
     def retrieve_precipitation(self, start_date, end_date):
         """Return the precipitation time series for the current Area.
@@ -261,10 +319,7 @@ class Area(object):
         'precipitation'.
 
         """
-        for concentr in self.configuration.config_concentrations.all().select_related('Label'):
-            if concentr.label.program_name == "precipitation":
-                return concentr.cl_concentration
-        return None
+        return self.get_concentration('precipitation', 'cl_concentration')
 
     @property
     def concentr_chloride_seepage(self):
@@ -274,9 +329,7 @@ class Area(object):
         'seepage'.
 
         """
-        for concentr in self.configuration.config_concentrations.all().select_related('Label'):
-            if concentr.label.program_name == "seepage":
-                return concentr.cl_concentration
+        return self.get_concentration('seepage', 'cl_concentration')
 
     @property
     def min_concentr_phosphate_precipitation(self):
@@ -286,10 +339,7 @@ class Area(object):
         'precipitation'.
 
         """
-        for concentr in self.configuration.config_concentrations.all().select_related('Label'):
-            if concentr.label.program_name == "precipitation":
-                return concentr.stof_lower_concentration
-        return None
+        return self.get_concentration('precipitation', 'stof_lower_concentration')
 
     @property
     def incr_concentr_phosphate_precipitation(self):
@@ -299,10 +349,7 @@ class Area(object):
         'precipitation'.
 
         """
-        for concentr in self.configuration.config_concentrations.all().select_related('Label'):
-            if concentr.label.program_name == "precipitation":
-                return concentr.stof_increment
-        return None
+        return self.get_concentration('precipitation', 'stof_increment')
 
     @property
     def min_concentr_phosphate_seepage(self):
@@ -312,10 +359,7 @@ class Area(object):
         'seepage'.
 
         """
-        for concentr in self.configuration.config_concentrations.all().select_related('Label'):
-            if concentr.label.program_name == "seepage":
-                return concentr.stof_lower_concentration
-        return None
+        return self.get_concentration('seepage', 'stof_lower_concentration')
 
     @property
     def incr_concentr_phosphate_seepage(self):
@@ -325,10 +369,7 @@ class Area(object):
         'seepage'.
 
         """
-        for concentr in self.configuration.config_concentrations.all().select_related('Label'):
-            if concentr.label.program_name == "seepage":
-                return concentr.stof_increment
-        return None
+        return self.get_concentration('seepage', 'stof_increment')
 
     @property
     def min_concentr_nitrogyn_precipitation(self):
@@ -373,9 +414,10 @@ class Area(object):
 
 class Bucket(object):
 
-    def __init__(self, configuration, database_bucket):
+    def __init__(self, configuration, database_bucket, concentrations=None):
         self.configuration = configuration
         self.database_bucket = database_bucket
+        self._concentrations = concentrations
 
     def copy_properties(self):
         """Store the properties that do not belong to the database bucket."""
@@ -470,10 +512,12 @@ class Bucket(object):
         function returns None.
 
         """
-        for concentr in self.configuration.config_concentrations.all().select_related('Label'):
-            if concentr.label.program_name == program_name:
-                return getattr(concentr, attribute)
-        return None
+        if self._concentrations is None:
+            self._concentrations = load_concentrations(self.configuration)
+        concentr = self._concentrations.get(program_name)
+        if concentr is None:
+            return None
+        return getattr(concentr, attribute)
 
     @property
     def concentr_chloride_flow_off(self):
@@ -498,9 +542,11 @@ class Bucket(object):
 
 class PumpingStation(object):
 
-    def __init__(self, configuration, db_station):
+    def __init__(self, configuration, db_station, concentrations=None):
         self.configuration = configuration
         self.db_station = db_station
+        self._concentrations = concentrations
+        self._sum_timeseries = None
 
     def copy_properties(self):
         """Store the properties that do not belong to the database bucket."""
@@ -524,13 +570,39 @@ class PumpingStation(object):
         returns a time series whose values are non-positive. This holds even
         if the stored event values have a different sign.
 
+        The sum is computed once and returned by each next call.
+
         """
         self = args[0]
-        result = SparseTimeseriesStub()
+        if self._sum_timeseries is None:
+            self._sum_timeseries = self._compute_sum_timeseries()
+        return self._sum_timeseries
+
+    def _compute_sum_timeseries(self):
+        """Return the sum of the time series of each of its PumpLine(s).
+
+        The database sums the time series that are not sticky and whose
+        default value is 0. The other time series are summed one by one.
+
+        """
         factor = (1.0 if self.into else -1.0)
+        summable = []
+        remaining = []
+        for pump_line in self.db_station.pump_lines.all().select_related('timeserie'):
+            timeseries = pump_line.retrieve_timeseries()
+            if timeseries is None or timeseries.stick_to_last_value or \
+                   timeseries.default_value:
+                remaining.append(timeseries)
+            else:
+                summable.append(timeseries)
+
+        result = SparseTimeseriesStub()
+        for date, value in sum_abs_events(summable):
+            result.add_value(date, factor * value)
+
         map_f = lambda v: factor * abs(v)
-        for pump_line in self.db_station.pump_lines.all():
-            timeseries = map_timeseries(pump_line.retrieve_timeseries(), map_f)
+        for timeseries in remaining:
+            timeseries = map_timeseries(timeseries, map_f)
             result = add_timeseries(result, timeseries)
         return result
 
@@ -541,9 +613,9 @@ class PumpingStation(object):
         the program name of the label of the bucket.
 
         """
-        for concentr in self.configuration.config_concentrations.all().select_related('Label'):
-            if concentr.label.program_name == self.db_station.label.program_name:
-                return concentr.cl_concentration
+        concentr = self._find_concentration()
+        if concentr is not None:
+            return concentr.cl_concentration
 
     def set_concentrations(self, new_attr_names):
         """Set the concentrations of the current PumpingStation
@@ -565,10 +637,9 @@ class PumpingStation(object):
         the program name of the label of the PumpingStation.
 
         """
-        for concentr in self.configuration.config_concentrations.all().select_related('Label'):
-            if concentr.label.program_name == self.db_station.label.program_name:
-                return concentr
-        return None
+        if self._concentrations is None:
+            self._concentrations = load_concentrations(self.configuration)
+        return self._concentrations.get(self.db_station.label.program_name)
 
     def __hash__(self):
         return hash(self.name)
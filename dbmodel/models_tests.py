@@ -26,6 +26,8 @@ import unittest
 
 from mock import Mock
 
+from models import Area
+from models import Bucket
 from models import PumpingStation
 
 class PumpingStationTests(unittest.TestCase):
@@ -54,3 +56,35 @@ class PumpingStationTests(unittest.TestCase):
         station.set_concentrations(new_attr_names)
         self.assertEqual(0.2, station.min_concentr_phosphate)
         self.assertEqual(0.4, station.incr_concentr_phosphate)
+
+
+class BucketTests(unittest.TestCase):
+
+    def setUp(self):
+        self.concentration = Mock()
+        self.concentration.cl_concentration = 25.0
+        self.concentration.stof_increment = 0.4
+
+    def test_a(self):
+        """Test that a concentration is looked up by label program name."""
+        bucket = Bucket(None, None, {'flow_off': self.concentration})
+        self.assertEqual(25.0, bucket.concentr_chloride_flow_off)
+        self.assertEqual(0.4, bucket.incr_concentr_phosphate_flow_off)
+
+    def test_b(self):
+        """Test that a concentration of an unknown label is None."""
+        bucket = Bucket(None, None, {'flow_off': self.concentration})
+        self.assertEqual(None, bucket.concentr_chloride_drainage_indraft)
+
+
+class AreaTests(unittest.TestCase):
+
+    def test_a(self):
+        """Test that the Area uses a single snapshot."""
+        area = Area(None)
+        area._snapshot = Mock()
+        area._snapshot.buckets = ()
+        area._snapshot.concentrations = {}
+        self.assertTrue(area.snapshot is area._snapshot)
+        self.assertEqual([], area.buckets)
+        self.assertEqual(None, area.concentr_chloride_precipitation)
@@ -9,6 +9,7 @@ from lizard_waterbalance.forms import TimeseriesFewsForm
 from lizard_waterbalance.forms import WaterbalanceTimeserieForm
 
 from lizard_waterbalance.models import Bucket
+from lizard_waterbalance.models import ComputationJob
 from lizard_waterbalance.models import Concentration
 from lizard_waterbalance.models import OpenWater
 from lizard_waterbalance.models import Parameter
@@ -273,10 +274,16 @@ class WaterbalanceScenarioAdmin(admin.ModelAdmin):
     list_display = ( 'name', 'order', 'active', 'public')
     search_fields = ['name', ]
 
+class ComputationJobAdmin(admin.ModelAdmin):
+    list_filter = ('status', )
+    list_display = ('configuration', 'status', 'created', 'started',
+                    'finished')
+
 
 
 
 admin.site.register(Bucket, BucketAdmin)
+admin.site.register(ComputationJob, ComputationJobAdmin)
 #admin.site.register(SobekBucket, SobekBucketAdmin)
 #admin.site.register(Concentration)
 admin.site.register(OpenWater, OpenWaterAdmin)
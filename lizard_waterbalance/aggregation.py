@@ -0,0 +1,395 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#******************************************************************************
+#
+# This file is part of the lizard_waterbalance Django app.
+#
+# The lizard_waterbalance app is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the lizard_waterbalance app.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2012 Nelen & Schuurmans
+#
+#******************************************************************************
+
+"""Aggregate events to periods using numpy arrays.
+
+The functions in this module work on arrays of dates, with numpy type
+datetime64, and arrays of values. Each period, for example a month, is
+identified by an integer key, so the events of a period are the consecutive
+events that have the same key. The aggregations are computed per group of
+events using the start index of each group, which avoids a Python loop over
+all events.
+
+"""
+
+import numpy
+
+DATE_TYPE = 'datetime64[us]'
+
+# the number of months of each period that consists of whole months
+MONTHS = {'month': 1, 'quarter': 3, 'year': 12, 'hydro_year': 12}
+
+ONE_DAY = numpy.timedelta64(1, 'D')
+ONE_SECOND = numpy.timedelta64(1, 's')
+
+
+def to_date_array(dates):
+    """Return the array of datetime64 values of the given datetimes."""
+    return numpy.array(list(dates), dtype=DATE_TYPE)
+
+
+def to_datetimes(dates):
+    """Return the list of datetimes of the given datetime64 array."""
+    return dates.astype(DATE_TYPE).tolist()
+
+
+def events_to_arrays(events):
+    """Return the pair of the date array and value array of the events."""
+    dates, values = [], []
+    for date, value in events:
+        dates.append(date)
+        values.append(value)
+    return to_date_array(dates), numpy.array(values, dtype=float)
+
+
+def period_keys(dates, period):
+    """Return the array of the key of the period of each date.
+
+    Parameter *period* is one of 'day', 'month', 'quarter', 'year' and
+    'hydro_year', where the hydrological year starts on the first day of
+    October.
+
+    """
+    if period == 'day':
+        return dates.astype('datetime64[D]').astype(numpy.int64)
+    months = dates.astype('datetime64[M]').astype(numpy.int64)
+    if period == 'month':
+        return months
+    elif period == 'quarter':
+        return months // 3
+    elif period == 'year':
+        return months // 12
+    elif period == 'hydro_year':
+        return (months + 3) // 12
+    raise ValueError("unknown period '%s'" % period)
+
+
+def key_dates(keys, period):
+    """Return the array of the first date of each of the given periods."""
+    if period == 'day':
+        return keys.astype('datetime64[D]').astype(DATE_TYPE)
+    months = keys * MONTHS[period]
+    if period == 'hydro_year':
+        months = months - 3
+    return months.astype('datetime64[M]').astype(DATE_TYPE)
+
+
+def first_of_period(dates, period):
+    """Return the array of the first date of the period of each date."""
+    return key_dates(period_keys(dates, period), period)
+
+
+def end_of_period(dates, period):
+    """Return the array of the last second of the period of each date.
+
+    Each period starts at the given date, so for a period of a month, the
+    period of 2011-04-05 ends at 2011-05-04 23:59:59.
+
+    """
+    days = dates.astype('datetime64[D]')
+    if period == 'day':
+        ends = days + ONE_DAY
+    else:
+        month_starts = days.astype('datetime64[M]')
+        offsets = days - month_starts.astype('datetime64[D]')
+        ends = (month_starts + MONTHS[period]).astype('datetime64[D]') + \
+            offsets
+    return ends.astype(DATE_TYPE) - ONE_SECOND
+
+
+def group_starts(*key_arrays):
+    """Return the array of the start index of each group of events.
+
+    A new group starts at each event for which one of the given keys differs
+    from the key of the previous event.
+
+    """
+    starts = numpy.zeros(1, dtype=numpy.int64)
+    for keys in key_arrays:
+        if len(keys) == 0:
+            return numpy.zeros(0, dtype=numpy.int64)
+        changes = numpy.flatnonzero(keys[1:] != keys[:-1]) + 1
+        starts = numpy.union1d(starts, changes)
+    return starts
+
+
+def group_sizes(starts, length):
+    """Return the array of the number of events of each group."""
+    return numpy.diff(numpy.append(starts, length))
+
+
+def grouped_sums(values, starts):
+    """Return the array of the sum of the values of each group."""
+    if len(starts) == 0:
+        return numpy.zeros(0)
+    return numpy.add.reduceat(values, starts)
+
+
+def grouped_averages(values, starts):
+    """Return the array of the average of the values of each group."""
+    return grouped_sums(values, starts) / group_sizes(starts, len(values))
+
+
+def cumulative_sums(values, reset_starts):
+    """Return the array of the cumulative sum of the values of each segment.
+
+    The cumulative sum restarts at 0 at each of the given start indices.
+
+    """
+    if len(values) == 0:
+        return numpy.zeros(0)
+    totals = numpy.cumsum(values)
+    offsets = numpy.append(0.0, totals[reset_starts[1:] - 1])
+    return totals - numpy.repeat(offsets,
+                                 group_sizes(reset_starts, len(values)))
+
+
+def aggregate(dates, values, period, average=False):
+    """Return the pair of date and value arrays of the events per period.
+
+    The date of each aggregated event is the first date of its period and its
+    value is the sum, or the average, of the values in that period.
+
+    """
+    keys = period_keys(dates, period)
+    starts = group_starts(keys)
+    if average:
+        sums = grouped_averages(values, starts)
+    else:
+        sums = grouped_sums(values, starts)
+    return key_dates(keys[starts], period), sums
+
+
+def aggregate_cumulative(dates, values, period, reset_period):
+    """Return the pair of date and value arrays of the cumulative events.
+
+    The date of each cumulative event is the first date of its period and its
+    value is the sum of the values from the start of the reset period to the
+    end of the period. When a period spans multiple reset periods, it has an
+    event for each of these reset periods.
+
+    """
+    keys = period_keys(dates, period)
+    reset_keys = period_keys(dates, reset_period)
+    reset_starts = group_starts(reset_keys)
+    starts = group_starts(keys, reset_keys)
+    totals = cumulative_sums(values, reset_starts)
+    ends = starts + group_sizes(starts, len(values)) - 1
+    return key_dates(keys[starts], period), totals[ends]
+
+
+def insert_resets(dates, values, reset_period):
+    """Return the pair of date and value arrays with an additional reset.
+
+    A reset is an event with value 0.0 at the start of a reset period. This
+    function inserts such a reset between two successive events when the
+    reset period of the second event starts after the first event.
+
+    """
+    if reset_period in MONTHS:
+        firsts = first_of_period(dates, reset_period)
+    else:
+        firsts = dates
+    positions = numpy.flatnonzero((dates[:-1] < firsts[1:]) &
+                                  (firsts[1:] <= dates[1:])) + 1
+    return (numpy.insert(dates, positions, firsts[positions]),
+            numpy.insert(values, positions, 0.0))
+
+
+def _day_steps(times, ends):
+    """Return the number of whole days from each time up to each end."""
+    one_day = ONE_DAY.astype('timedelta64[us]').astype(numpy.int64)
+    return numpy.maximum(-((times - ends) // one_day), 0)
+
+
+def fill_daily_gaps(dates, values, default_value, sticky, start_date=None,
+                    end_date=None):
+    """Return the pair of date and value arrays with the missing days added.
+
+    Between two successive events, this function adds an event for each day
+    after the first event and before the second one. If sticky holds, the
+    value of an added event is the value of the previous event, otherwise it
+    is the given default value.
+
+    If sticky holds and start and end are not None, the events also start at
+    the start date, where each day before the first event gets the default
+    value. If sticky holds and end is not None, the events continue up to and
+    including the end date with the value of the last event.
+
+    """
+    one_day = ONE_DAY.astype('timedelta64[us]').astype(numpy.int64)
+    times = dates.astype(DATE_TYPE).astype(numpy.int64)
+    values = numpy.asarray(values, dtype=float)
+    if sticky:
+        fill_values = values
+    else:
+        fill_values = numpy.empty(len(values))
+        fill_values.fill(default_value)
+
+    # the number of days each event stands for, including its own day
+    counts = numpy.ones(len(times), dtype=numpy.int64)
+    counts[:-1] = numpy.maximum(_day_steps(times[:-1], times[1:]), 1)
+    end = None
+    if sticky and end_date is not None:
+        end = numpy.datetime64(end_date, 'us').astype(numpy.int64)
+        if len(times) > 0:
+            counts[-1] += max((end - times[-1]) // one_day, 0)
+
+    index = numpy.repeat(numpy.arange(len(times)), counts)
+    offsets = numpy.arange(len(index)) - \
+        numpy.repeat(numpy.cumsum(counts) - counts, counts)
+    filled_times = times[index] + offsets * one_day
+    filled_values = numpy.where(offsets == 0, values[index],
+                                fill_values[index])
+
+    if end is not None and start_date is not None:
+        start = numpy.datetime64(start_date, 'us').astype(numpy.int64)
+        if len(times) > 0:
+            leading = _day_steps(start, times[0])
+        else:
+            leading = max((end - start) // one_day + 1, 0)
+        leading_values = numpy.empty(leading)
+        leading_values.fill(default_value)
+        filled_times = numpy.concatenate(
+            (start + numpy.arange(leading) * one_day, filled_times))
+        filled_values = numpy.concatenate((leading_values, filled_values))
+    return filled_times.astype(DATE_TYPE), filled_values
+
+
+def _key_array(keys):
+    keys = numpy.asarray(keys)
+    if keys.dtype == object:
+        keys = keys.astype(DATE_TYPE)
+    return keys
+
+
+class TopHeight(object):
+    """Maintains the height of the top of each bar in a stacked bar chart.
+
+    Instance variables:
+      *keys*
+        sorted array of the key of each bar
+      *heights*
+        array of the total height of each bar
+
+    Each bar is identified by a key, which often is its horizontal position in
+    the chart, for example a date.
+
+    """
+    def __init__(self):
+        self.keys = None
+        self.heights = None
+
+    def stack_bars(self, keys, heights):
+        """Set or update the heights of the given bars.
+
+        Parameters:
+        * keys -- sequence of bar keys
+        * heights -- sequence of additional bar heights
+
+        """
+        keys = _key_array(keys)
+        heights = numpy.asarray(heights, dtype=float)
+        if len(keys) == 0:
+            return
+        if self.keys is None:
+            all_keys = numpy.unique(keys)
+            all_heights = numpy.zeros(len(all_keys))
+        else:
+            all_keys = numpy.union1d(self.keys, keys)
+            all_heights = numpy.zeros(len(all_keys))
+            all_heights[numpy.searchsorted(all_keys, self.keys)] = \
+                self.heights
+        numpy.add.at(all_heights, numpy.searchsorted(all_keys, keys), heights)
+        self.keys, self.heights = all_keys, all_heights
+
+    def get_heights(self, keys):
+        """Return the array of heights of the given bars.
+
+        When a specified key is not present, this method returns 0 for that
+        key.
+
+        """
+        keys = _key_array(keys)
+        if self.keys is None or len(keys) == 0:
+            return numpy.zeros(len(keys))
+        indices = numpy.searchsorted(self.keys, keys)
+        indices = numpy.minimum(indices, len(self.keys) - 1)
+        return numpy.where(self.keys[indices] == keys,
+                           self.heights[indices], 0.0)
+
+
+def lttb_indices(x, y, threshold):
+    """Return the array of indices of the points to keep of the given line.
+
+    This function implements the Largest-Triangle-Three-Buckets algorithm of
+    Sveinn Steinarsson. It always keeps the first and last point and divides
+    the other points in buckets. From each bucket it keeps the point that
+    forms the largest triangle with the point kept from the previous bucket
+    and the average point of the next bucket. The line of the kept points has
+    the same visual shape as the line of all points.
+
+    """
+    length = len(x)
+    if threshold >= length or threshold < 3:
+        return numpy.arange(length)
+    x = numpy.asarray(x, dtype=float)
+    y = numpy.asarray(y, dtype=float)
+    edges = numpy.floor(numpy.arange(threshold - 1) *
+                        (length - 2) / float(threshold - 2)).astype(int) + 1
+    edges[-1] = length - 1
+    indices = numpy.zeros(threshold, dtype=numpy.int64)
+    kept = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_start, next_end = end, edges[bucket + 2]
+        else:
+            next_start, next_end = length - 1, length
+        average_x = x[next_start:next_end].mean()
+        average_y = y[next_start:next_end].mean()
+        areas = numpy.abs((x[kept] - average_x) * (y[start:end] - y[kept]) -
+                          (x[kept] - x[start:end]) * (average_y - y[kept]))
+        kept = start + numpy.argmax(areas)
+        indices[bucket + 1] = kept
+    indices[-1] = length - 1
+    return indices
+
+
+def min_max_indices(y, buckets):
+    """Return the array of indices of the points to keep of the given line.
+
+    This function divides the points in the given number of buckets and keeps
+    the first and last point and the minimum and maximum of each bucket, so
+    the line of the kept points still shows each peak.
+
+    """
+    length = len(y)
+    if 2 * buckets + 2 >= length or buckets < 1:
+        return numpy.arange(length)
+    y = numpy.asarray(y, dtype=float)
+    indices = [numpy.array([0, length - 1])]
+    for bucket in numpy.array_split(numpy.arange(length), buckets):
+        values = y[bucket]
+        indices.append(bucket[[numpy.argmin(values), numpy.argmax(values)]])
+    return numpy.unique(numpy.concatenate(indices))
@@ -0,0 +1,233 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#******************************************************************************
+#
+# This file is part of the lizard_waterbalance Django app.
+#
+# The lizard_waterbalance app is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the lizard_waterbalance app.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2012 Nelen & Schuurmans
+#
+#******************************************************************************
+
+from datetime import datetime
+from unittest import TestCase
+
+import numpy
+
+from lizard_waterbalance.aggregation import TopHeight
+from lizard_waterbalance.aggregation import aggregate
+from lizard_waterbalance.aggregation import aggregate_cumulative
+from lizard_waterbalance.aggregation import end_of_period
+from lizard_waterbalance.aggregation import fill_daily_gaps
+from lizard_waterbalance.aggregation import first_of_period
+from lizard_waterbalance.aggregation import insert_resets
+from lizard_waterbalance.aggregation import lttb_indices
+from lizard_waterbalance.aggregation import min_max_indices
+from lizard_waterbalance.aggregation import to_date_array
+from lizard_waterbalance.aggregation import to_datetimes
+
+
+class PeriodTests(TestCase):
+
+    def test_a(self):
+        """Test the first date of the hydrological year."""
+        dates = to_date_array([datetime(2010, 9, 30), datetime(2010, 10, 1)])
+        self.assertEqual([datetime(2009, 10, 1), datetime(2010, 10, 1)],
+                         to_datetimes(first_of_period(dates, 'hydro_year')))
+
+    def test_b(self):
+        """Test the first date of the quarter."""
+        dates = to_date_array([datetime(1969, 12, 31), datetime(2010, 5, 5)])
+        self.assertEqual([datetime(1969, 10, 1), datetime(2010, 4, 1)],
+                         to_datetimes(first_of_period(dates, 'quarter')))
+
+    def test_c(self):
+        """Test the end of a period of a month."""
+        dates = to_date_array([datetime(2011, 1, 1), datetime(2011, 12, 1)])
+        self.assertEqual([datetime(2011, 1, 31, 23, 59, 59),
+                          datetime(2011, 12, 31, 23, 59, 59)],
+                         to_datetimes(end_of_period(dates, 'month')))
+
+
+class AggregateTests(TestCase):
+
+    def setUp(self):
+        self.dates = to_date_array([datetime(2011, 3, 31), datetime(2011, 4, 1),
+                                    datetime(2011, 4, 2), datetime(2011, 5, 1)])
+        self.values = numpy.array([1.0, 2.0, 4.0, 8.0])
+
+    def test_a(self):
+        """Test the sums per month."""
+        dates, values = aggregate(self.dates, self.values, 'month')
+        self.assertEqual([datetime(2011, 3, 1), datetime(2011, 4, 1),
+                          datetime(2011, 5, 1)], to_datetimes(dates))
+        self.assertEqual([1.0, 6.0, 8.0], values.tolist())
+
+    def test_b(self):
+        """Test the averages per quarter."""
+        dates, values = aggregate(self.dates, self.values, 'quarter',
+                                  average=True)
+        self.assertEqual([datetime(2011, 1, 1), datetime(2011, 4, 1)],
+                         to_datetimes(dates))
+        self.assertEqual([1.0, 14.0 / 3], values.tolist())
+
+    def test_c(self):
+        """Test the cumulative sums per month that restart each quarter."""
+        dates, values = aggregate_cumulative(self.dates, self.values, 'month',
+                                             'quarter')
+        self.assertEqual([1.0, 6.0, 14.0], values.tolist())
+
+    def test_d(self):
+        """Test a period that spans two reset periods has two events."""
+        dates, values = aggregate_cumulative(self.dates, self.values, 'year',
+                                             'month')
+        self.assertEqual([datetime(2011, 1, 1)] * 3, to_datetimes(dates))
+        self.assertEqual([1.0, 6.0, 8.0], values.tolist())
+
+    def test_e(self):
+        """Test the aggregation of no events."""
+        dates, values = aggregate_cumulative(to_date_array([]),
+                                             numpy.zeros(0), 'day', 'year')
+        self.assertEqual([], to_datetimes(dates))
+        self.assertEqual([], values.tolist())
+
+
+class InsertResetsTests(TestCase):
+
+    def test_a(self):
+        """Test a reset is inserted at the start of a new month."""
+        dates = to_date_array([datetime(2011, 4, 30), datetime(2011, 5, 31)])
+        dates, values = insert_resets(dates, numpy.array([10.0, 5.0]),
+                                      'month')
+        self.assertEqual([datetime(2011, 4, 30), datetime(2011, 5, 1),
+                          datetime(2011, 5, 31)], to_datetimes(dates))
+        self.assertEqual([10.0, 0.0, 5.0], values.tolist())
+
+    def test_b(self):
+        """Test no reset is inserted within the same year."""
+        dates = to_date_array([datetime(2011, 4, 30), datetime(2011, 5, 31)])
+        dates, values = insert_resets(dates, numpy.array([10.0, 5.0]), 'year')
+        self.assertEqual([10.0, 5.0], values.tolist())
+
+
+class TopHeightTests(TestCase):
+
+    def test_a(self):
+        """Test the heights of stacked bars are added per key."""
+        top_height = TopHeight()
+        top_height.stack_bars([datetime(2011, 1, 1), datetime(2011, 2, 1)],
+                              [1.0, 2.0])
+        top_height.stack_bars([datetime(2011, 2, 1), datetime(2011, 3, 1)],
+                              [4.0, 8.0])
+        heights = top_height.get_heights([datetime(2011, 1, 1),
+                                          datetime(2011, 2, 1),
+                                          datetime(2011, 3, 1),
+                                          datetime(2011, 4, 1)])
+        self.assertEqual([1.0, 6.0, 8.0, 0.0], heights.tolist())
+
+    def test_b(self):
+        """Test the heights of bars that have not been stacked are 0."""
+        heights = TopHeight().get_heights([datetime(2011, 1, 1)])
+        self.assertEqual([0.0], heights.tolist())
+
+
+class LttbIndicesTests(TestCase):
+
+    def test_a(self):
+        """Test all points are kept when there are not more than requested."""
+        indices = lttb_indices([0, 1, 2], [0.0, 1.0, 0.0], 5)
+        self.assertEqual([0, 1, 2], indices.tolist())
+
+    def test_b(self):
+        """Test the first, the last and the peak point are kept."""
+        y = [0.0] * 10
+        y[4] = 10.0
+        indices = lttb_indices(range(10), y, 3)
+        self.assertEqual([0, 4, 9], indices.tolist())
+
+    def test_c(self):
+        """Test the requested number of points is kept in ascending order."""
+        x = numpy.arange(1000)
+        indices = lttb_indices(x, numpy.sin(x / 10.0), 100)
+        self.assertEqual(100, len(indices))
+        self.assertTrue(numpy.all(numpy.diff(indices) > 0))
+
+
+class MinMaxIndicesTests(TestCase):
+
+    def test_a(self):
+        """Test the minimum and maximum of each bucket are kept."""
+        y = [5.0, 1.0, 9.0, 5.0, 5.0, 0.0, 7.0, 5.0, 5.0, 5.0]
+        indices = min_max_indices(y, 2)
+        self.assertEqual([0, 1, 2, 5, 6, 9], indices.tolist())
+
+    def test_b(self):
+        """Test all points are kept when there are not more than requested."""
+        self.assertEqual([0, 1, 2], min_max_indices([1.0, 2.0, 3.0], 1).tolist())
+
+
+class FillDailyGapsTests(TestCase):
+
+    def setUp(self):
+        self.dates = to_date_array([datetime(2011, 1, 2), datetime(2011, 1, 5)])
+        self.values = numpy.array([1.0, 2.0])
+
+    def test_a(self):
+        """Test the gaps get the default value when not sticky."""
+        dates, values = fill_daily_gaps(self.dates, self.values, 0.0, False,
+                                        datetime(2011, 1, 1),
+                                        datetime(2011, 1, 7))
+        self.assertEqual([datetime(2011, 1, day) for day in range(2, 6)],
+                         to_datetimes(dates))
+        self.assertEqual([1.0, 0.0, 0.0, 2.0], values.tolist())
+
+    def test_b(self):
+        """Test the gaps get the previous value when sticky."""
+        dates, values = fill_daily_gaps(self.dates, self.values, 0.0, True)
+        self.assertEqual([datetime(2011, 1, day) for day in range(2, 6)],
+                         to_datetimes(dates))
+        self.assertEqual([1.0, 1.0, 1.0, 2.0], values.tolist())
+
+    def test_c(self):
+        """Test a sticky time series spans the whole period."""
+        dates, values = fill_daily_gaps(self.dates, self.values, 5.0, True,
+                                        datetime(2010, 12, 31),
+                                        datetime(2011, 1, 7))
+        self.assertEqual([datetime(2010, 12, 31)] +
+                         [datetime(2011, 1, day) for day in range(1, 8)],
+                         to_datetimes(dates))
+        self.assertEqual([5.0, 5.0, 1.0, 1.0, 1.0, 2.0, 2.0, 2.0],
+                         values.tolist())
+
+    def test_d(self):
+        """Test a sticky time series without events has the default value."""
+        dates, values = fill_daily_gaps(to_date_array([]), [], 5.0, True,
+                                        datetime(2011, 1, 1),
+                                        datetime(2011, 1, 3))
+        self.assertEqual([datetime(2011, 1, day) for day in range(1, 4)],
+                         to_datetimes(dates))
+        self.assertEqual([5.0, 5.0, 5.0], values.tolist())
+
+    def test_e(self):
+        """Test the added days keep the time of day of the previous event."""
+        dates = to_date_array([datetime(2011, 1, 1, 12),
+                               datetime(2011, 1, 3, 6),
+                               datetime(2011, 1, 3, 18)])
+        dates, values = fill_daily_gaps(dates, [1.0, 2.0, 3.0], 0.0, True,
+                                        None, datetime(2011, 1, 4))
+        self.assertEqual([datetime(2011, 1, 1, 12), datetime(2011, 1, 2, 12),
+                          datetime(2011, 1, 3, 6), datetime(2011, 1, 3, 18)],
+                         to_datetimes(dates))
+        self.assertEqual([1.0, 1.0, 2.0, 3.0], values.tolist())
@@ -0,0 +1,249 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#******************************************************************************
+#
+# This file is part of the lizard_waterbalance Django app.
+#
+# The lizard_waterbalance app is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the lizard_waterbalance app.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2012 Nelen & Schuurmans
+#
+#******************************************************************************
+
+"""Store computation results in the Django cache in a compact form.
+
+The results of a waterbalance computation are mostly (dicts of) time series.
+A CacheCodec pickles these results, where each time series is stored as two
+arrays, one for the dates and one for the values, and compresses the pickle.
+The Rollups that are attached to a time series are stored the same way.
+When the compressed pickle is larger than the maximum chunk size, the codec
+stores it in several chunks and stores a manifest that lists these chunks
+under the original key.
+
+By default, memcached can only store items that are up to 1 MB in size, so
+the default maximum chunk size is a bit smaller than that.
+
+"""
+
+import cPickle
+import logging
+import zlib
+
+from array import array
+from cStringIO import StringIO
+from datetime import datetime
+from datetime import timedelta
+
+from django.conf import settings
+from lizard_waterbalance.rollups import Rollup
+from timeseries.timeseriesstub import SparseTimeseriesStub
+from timeseries.timeseriesstub import TimeseriesStub
+
+logger = logging.getLogger(__name__)
+
+# maximum size in bytes of a single item in the cache
+CHUNK_SIZE = getattr(settings, 'WATERBALANCE_CACHE_CHUNK_SIZE', 1000 * 1000)
+
+# number of seconds that data remains in the cache, the cache keys contain a
+# fingerprint of the input so the data only has to expire to make room
+TIMEOUT = getattr(settings, 'WATERBALANCE_CACHE_TIMEOUT', 30 * 24 * 60 * 60)
+
+# level of compression of the pickled data, from 1 (fast) to 9 (small)
+COMPRESSION_LEVEL = 6
+
+# the time series classes whose events are stored as arrays, these classes
+# only store their events so we can restore them from their events
+ARRAY_CLASSES = (SparseTimeseriesStub, TimeseriesStub)
+
+EPOCH = datetime(1970, 1, 1)
+
+MANIFEST = 'waterbalance-cache-manifest'
+
+
+def events_to_arrays(events):
+    """Return the tuple that contains the given events.
+
+    The tuple contains the first date, the array of the number of seconds
+    between two successive dates and the array of the values. This function
+    returns None when the events cannot be stored that way, for example when
+    a value is not a float.
+
+    """
+    first_date = None
+    previous_seconds = 0
+    deltas = array('l')
+    values = array('d')
+    for date, value in events:
+        if date.microsecond != 0 or type(value) is not float:
+            return None
+        delta = date - EPOCH
+        seconds = delta.days * 86400 + delta.seconds
+        if first_date is None:
+            first_date = date
+        else:
+            deltas.append(seconds - previous_seconds)
+        previous_seconds = seconds
+        values.append(value)
+    return first_date, deltas.tostring(), values.tostring()
+
+
+def arrays_to_events(first_date, deltas, values):
+    """Return the list of events from the items of a tuple of arrays.
+
+    The parameters are the items of the tuple that function events_to_arrays
+    returns.
+
+    """
+    value_array = array('d')
+    value_array.fromstring(values)
+    delta_array = array('l')
+    delta_array.fromstring(deltas)
+    events = []
+    date = first_date
+    for index, value in enumerate(value_array):
+        if index > 0:
+            date = date + timedelta(seconds=delta_array[index - 1])
+        events.append((date, value))
+    return events
+
+
+def timeseries_to_arrays(timeseries):
+    """Return the tuple that contains the events of the given time series.
+
+    See function events_to_arrays for the contents of the tuple.
+
+    """
+    return events_to_arrays(timeseries.events())
+
+
+def arrays_to_timeseries(timeseries_class, first_date, deltas, values):
+    """Return the time series of the given class with the given events.
+
+    The parameters are the class and the items of the tuple that function
+    timeseries_to_arrays returns.
+
+    """
+    timeseries = timeseries_class()
+    for date, value in arrays_to_events(first_date, deltas, values):
+        timeseries.add_value(date, value)
+    return timeseries
+
+
+def _persistent_id(obj):
+    if type(obj) in ARRAY_CLASSES:
+        arrays = timeseries_to_arrays(obj)
+        if arrays is not None:
+            return (type(obj),) + arrays + (getattr(obj, 'rollups', None),)
+    elif type(obj) is Rollup:
+        arrays = events_to_arrays(zip(obj.dates, obj.values))
+        if arrays is not None:
+            return (Rollup,) + arrays
+    return None
+
+
+def _persistent_load(pid):
+    if pid[0] is Rollup:
+        events = arrays_to_events(*pid[1:])
+        return Rollup([date for date, _ in events],
+                      [value for _, value in events])
+    timeseries = arrays_to_timeseries(*pid[:4])
+    if len(pid) > 4 and pid[4] is not None:
+        timeseries.rollups = pid[4]
+    return timeseries
+
+
+def encode(data, level=COMPRESSION_LEVEL):
+    """Return the compressed pickle of the given data."""
+    stream = StringIO()
+    pickler = cPickle.Pickler(stream, cPickle.HIGHEST_PROTOCOL)
+    pickler.persistent_id = _persistent_id
+    pickler.dump(data)
+    return zlib.compress(stream.getvalue(), level)
+
+
+def decode(payload):
+    """Return the data from the given compressed pickle."""
+    unpickler = cPickle.Unpickler(StringIO(zlib.decompress(payload)))
+    unpickler.persistent_load = _persistent_load
+    return unpickler.load()
+
+
+class CacheCodec(object):
+    """Stores and retrieves data in a Django cache using encode and decode.
+
+    Instance variables:
+      *cache*
+        the Django cache to use
+      *chunk_size*
+        maximum size in bytes of a single item in the cache
+
+    """
+    def __init__(self, cache, chunk_size=CHUNK_SIZE):
+        self.cache = cache
+        self.chunk_size = chunk_size
+
+    def chunk_keys(self, key, count):
+        return ['%s::chunk%d' % (key, index) for index in range(count)]
+
+    def get(self, key):
+        """Return the data stored under the given key.
+
+        This method returns None when the data is not present in the cache or
+        when one of its chunks has been evicted.
+
+        """
+        item = self.cache.get(key)
+        if item is None:
+            return None
+        try:
+            if isinstance(item, tuple) and item[0] == MANIFEST:
+                count, checksum = item[1:]
+                chunk_keys = self.chunk_keys(key, count)
+                chunks = self.cache.get_many(chunk_keys)
+                if len(chunks) < count:
+                    logger.debug("cache item %s misses some of its chunks", key)
+                    return None
+                payload = ''.join(chunks[chunk_key] for chunk_key in chunk_keys)
+                if zlib.crc32(payload) != checksum:
+                    logger.warning("cache item %s has corrupt chunks", key)
+                    return None
+            else:
+                payload = item
+            return decode(payload)
+        except Exception:
+            logger.exception("unable to decode cache item %s", key)
+            return None
+
+    def set(self, key, data, timeout=TIMEOUT):
+        """Store the given data under the given key."""
+        payload = encode(data)
+        if len(payload) <= self.chunk_size:
+            self.cache.set(key, payload, timeout)
+            return
+        chunks = [payload[start:start + self.chunk_size]
+                  for start in range(0, len(payload), self.chunk_size)]
+        chunk_keys = self.chunk_keys(key, len(chunks))
+        logger.debug("store cache item %s of %d bytes in %d chunks", key,
+                     len(payload), len(chunks))
+        self.cache.set_many(dict(zip(chunk_keys, chunks)), timeout)
+        self.cache.set(key, (MANIFEST, len(chunks), zlib.crc32(payload)),
+                       timeout)
+
+    def delete_many(self, keys):
+        """Delete the data stored under the given keys, including the chunks."""
+        to_delete = list(keys)
+        for key, item in self.cache.get_many(keys).iteritems():
+            if isinstance(item, tuple) and item[0] == MANIFEST:
+                to_delete.extend(self.chunk_keys(key, item[1]))
+        self.cache.delete_many(to_delete)
@@ -0,0 +1,144 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#******************************************************************************
+#
+# This file is part of the lizard_waterbalance Django app.
+#
+# The lizard_waterbalance app is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the lizard_waterbalance app.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2012 Nelen & Schuurmans
+#
+#******************************************************************************
+
+import random
+
+from datetime import datetime
+from datetime import timedelta
+from unittest import TestCase
+
+from timeseries.timeseriesstub import SparseTimeseriesStub
+
+from lizard_waterbalance.cache_codec import CacheCodec
+from lizard_waterbalance.cache_codec import decode
+from lizard_waterbalance.cache_codec import encode
+from lizard_waterbalance.rollups import attach_rollups
+
+
+class DictCache(object):
+    """Implements the part of the Django cache interface the codec and lock use.
+
+    """
+
+    def __init__(self):
+        self.items = {}
+
+    def get(self, key):
+        return self.items.get(key)
+
+    def get_many(self, keys):
+        return dict((key, self.items[key]) for key in keys if key in self.items)
+
+    def set(self, key, value, timeout=None):
+        self.items[key] = value
+
+    def add(self, key, value, timeout=None):
+        if key in self.items:
+            return False
+        self.items[key] = value
+        return True
+
+    def delete(self, key):
+        self.items.pop(key, None)
+
+    def set_many(self, items, timeout=None):
+        self.items.update(items)
+
+    def delete_many(self, keys):
+        for key in keys:
+            self.items.pop(key, None)
+
+
+def create_timeseries(days, seed=0):
+    generator = random.Random(seed)
+    timeseries = SparseTimeseriesStub()
+    for day in range(days):
+        timeseries.add_value(datetime(2000, 1, 1) + timedelta(day),
+                             generator.uniform(-10.0, 10.0))
+    return timeseries
+
+
+class CodecTests(TestCase):
+
+    def test_a(self):
+        """Test a dict of time series is decoded to the same events."""
+        data = {'precipitation': create_timeseries(10),
+                'seepage': create_timeseries(5, seed=1)}
+        decoded = decode(encode(data))
+        self.assertEqual(sorted(data.keys()), sorted(decoded.keys()))
+        for key in data:
+            self.assertEqual(SparseTimeseriesStub, type(decoded[key]))
+            self.assertEqual(list(data[key].events()),
+                             list(decoded[key].events()))
+
+    def test_b(self):
+        """Test a time series with non-float values is decoded correctly."""
+        timeseries = SparseTimeseriesStub()
+        timeseries.add_value(datetime(2000, 1, 1), 1)
+        decoded = decode(encode([timeseries]))
+        self.assertEqual([(datetime(2000, 1, 1), 1)],
+                         list(decoded[0].events()))
+
+    def test_c(self):
+        """Test the Rollups of a time series are decoded with it."""
+        timeseries = create_timeseries(40)
+        attach_rollups(timeseries)
+        decoded = decode(encode([timeseries]))[0]
+        rollup = timeseries.rollups.sums['month']
+        decoded_rollup = decoded.rollups.sums['month']
+        self.assertEqual(rollup.dates, decoded_rollup.dates)
+        self.assertEqual(rollup.values, decoded_rollup.values)
+
+
+class CacheCodecTests(TestCase):
+
+    def setUp(self):
+        self.cache = DictCache()
+        self.codec = CacheCodec(self.cache, chunk_size=1024)
+        self.data = {'sluice_error': create_timeseries(1000)}
+
+    def test_a(self):
+        """Test a large item is stored in chunks and retrieved."""
+        self.codec.set('key', self.data)
+        self.assertTrue(len(self.cache.items) > 2)
+        decoded = self.codec.get('key')
+        self.assertEqual(list(self.data['sluice_error'].events()),
+                         list(decoded['sluice_error'].events()))
+
+    def test_b(self):
+        """Test an item is missing when one of its chunks is missing."""
+        self.codec.set('key', self.data)
+        del self.cache.items['key::chunk1']
+        self.assertEqual(None, self.codec.get('key'))
+
+    def test_c(self):
+        """Test the deletion of an item also deletes its chunks."""
+        self.codec.set('key', self.data)
+        self.codec.delete_many(['key'])
+        self.assertEqual({}, self.cache.items)
+
+    def test_d(self):
+        """Test a small item is stored in a single item."""
+        self.codec.set('key', [1.0])
+        self.assertEqual(['key'], self.cache.items.keys())
+        self.assertEqual([1.0], self.codec.get('key'))
@@ -0,0 +1,109 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#******************************************************************************
+#
+# This file is part of the lizard_waterbalance Django app.
+#
+# The lizard_waterbalance app is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the lizard_waterbalance app.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2012 Nelen & Schuurmans
+#
+#******************************************************************************
+
+"""Implement a lock that is shared by all processes that use the same cache.
+
+The lock relies on the atomicity of the add method of the Django cache, which
+only stores a value when the key is not present yet. The memcached backend
+implements that method atomically.
+
+"""
+
+import logging
+import os
+import socket
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# maximum number of seconds a process holds a lock, after that period the lock
+# expires so a crashed process cannot block other processes indefinitely
+LOCK_TIMEOUT = getattr(settings, 'WATERBALANCE_LOCK_TIMEOUT', 10 * 60)
+
+# number of seconds between two attempts to acquire a lock
+POLL_INTERVAL = 0.25
+
+
+class CacheLock(object):
+    """Implements a reentrant lock that is stored in a Django cache.
+
+    Instance variables:
+      *cache*
+        the Django cache to store the lock in
+      *key*
+        the key under which the lock is stored
+      *timeout*
+        maximum number of seconds the lock is held and waited for
+
+    The lock is reentrant: when the current CacheLock already holds the lock,
+    it can acquire it again without waiting. Each acquire should be matched by
+    a release.
+
+    """
+    def __init__(self, cache, key, timeout=LOCK_TIMEOUT,
+                 poll_interval=POLL_INTERVAL, sleep=time.sleep):
+        self.cache = cache
+        self.key = key
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.sleep = sleep
+        self.token = '%s:%d:%d' % (socket.gethostname(), os.getpid(), id(self))
+        self.depth = 0
+
+    def acquire(self, on_wait=None):
+        """Acquire the lock and return True when that succeeded.
+
+        When another process holds the lock, this method waits until that
+        process releases it. Each time it has waited, it calls the optional
+        callable on_wait and when that callable returns True, this method
+        stops waiting and returns False. This method also returns False when
+        it has waited longer than the timeout.
+
+        """
+        if self.depth > 0:
+            self.depth += 1
+            return True
+        waited = 0.0
+        while not self.cache.add(self.key, self.token, self.timeout):
+            if waited == 0.0:
+                logger.debug("wait for lock %s", self.key)
+            if waited >= self.timeout:
+                logger.warning("unable to acquire lock %s within %d seconds",
+                               self.key, self.timeout)
+                return False
+            self.sleep(self.poll_interval)
+            waited += self.poll_interval
+            if on_wait is not None and on_wait():
+                return False
+        self.depth = 1
+        return True
+
+    def release(self):
+        """Release the lock, if the current CacheLock still holds it."""
+        if self.depth == 0:
+            return
+        self.depth -= 1
+        if self.depth == 0 and self.cache.get(self.key) == self.token:
+            self.cache.delete(self.key)
@@ -0,0 +1,74 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#******************************************************************************
+#
+# This file is part of the lizard_waterbalance Django app.
+#
+# The lizard_waterbalance app is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the lizard_waterbalance app.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2012 Nelen & Schuurmans
+#
+#******************************************************************************
+
+from unittest import TestCase
+
+from lizard_waterbalance.cache_codec_tests import DictCache
+from lizard_waterbalance.cache_lock import CacheLock
+
+
+class CacheLockTests(TestCase):
+
+    def setUp(self):
+        self.cache = DictCache()
+        self.sleeps = []
+        self.lock = self.create_lock()
+
+    def create_lock(self):
+        return CacheLock(self.cache, 'lock', timeout=1.0, poll_interval=0.25,
+                         sleep=self.sleeps.append)
+
+    def test_a(self):
+        """Test a free lock is acquired and released."""
+        self.assertTrue(self.lock.acquire())
+        self.assertTrue('lock' in self.cache.items)
+        self.lock.release()
+        self.assertFalse('lock' in self.cache.items)
+
+    def test_b(self):
+        """Test the lock is reentrant."""
+        self.assertTrue(self.lock.acquire())
+        self.assertTrue(self.lock.acquire())
+        self.lock.release()
+        self.assertTrue('lock' in self.cache.items)
+        self.lock.release()
+        self.assertFalse('lock' in self.cache.items)
+
+    def test_c(self):
+        """Test a lock held by another process is waited for until timeout."""
+        self.create_lock().acquire()
+        self.assertFalse(self.lock.acquire())
+        self.assertEqual([0.25] * 4, self.sleeps)
+
+    def test_d(self):
+        """Test the wait stops when the callback returns True."""
+        self.create_lock().acquire()
+        self.assertFalse(self.lock.acquire(on_wait=lambda: True))
+        self.assertEqual([0.25], self.sleeps)
+
+    def test_e(self):
+        """Test the lock is not released by a process that does not hold it."""
+        other_lock = self.create_lock()
+        other_lock.acquire()
+        self.lock.release()
+        self.assertEqual(other_lock.token, self.cache.items['lock'])
@@ -0,0 +1,426 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#******************************************************************************
+#
+# This file is part of the lizard_waterbalance Django app.
+#
+# The lizard_waterbalance app is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the lizard_waterbalance app.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2012 Nelen & Schuurmans
+#
+#******************************************************************************
+
+"""Serve the data of the waterbalance graphs as JSON.
+
+The graphs of the waterbalance are rendered as PNG images on the server. The
+views in this module return the data of these graphs instead, so the client
+can draw the graphs itself, for example to zoom in or to show the value of a
+bar on hover. Each graph is a dict with a title and a list of series, where
+each series is a dict with the following keys:
+
+  *name*
+    name of the series as shown in the legend
+  *color*
+    color of the series as used in the rendered graph
+  *type*
+    'bar', 'line' or 'points'
+  *axis*
+    1 for the left axis and 2 for the right axis
+  *stack*
+    name of the stack of a bar series, or None for the other series
+  *data*
+    list of [time, value] pairs, where the time is the number of
+    milliseconds since the epoch, and for a bar series list of [time, value,
+    bottom] triples
+
+The data of a daily graph for a period of several years contains thousands of
+points, which is more than a client can show. To limit the size of the
+response and the work of the client, each series is downsampled to the
+requested number of points.
+
+"""
+
+import logging
+from time import time
+
+from django.core.cache import cache
+from django.http import Http404
+from django.http import HttpResponse
+from django.utils import simplejson
+from django.utils.http import http_date
+from lizard_map.daterange import current_start_end_dates
+import numpy
+
+from dbmodel.models import Area
+from lizard_waterbalance.aggregation import TopHeight
+from lizard_waterbalance.aggregation import lttb_indices
+from lizard_waterbalance.aggregation import min_max_indices
+from lizard_waterbalance.aggregation import to_date_array
+from lizard_waterbalance.cache_codec import CacheCodec
+from lizard_waterbalance.models import Parameter
+from lizard_waterbalance.models import WaterbalanceConf
+from lizard_waterbalance.views import CacheKeyName
+from lizard_waterbalance.views import CachedWaterbalanceComputer
+from lizard_waterbalance.views import DataForCumulativeGraph
+from lizard_waterbalance.views import area_graph_bars
+from lizard_waterbalance.views import colors_list
+from lizard_waterbalance.views import computation_pending_response
+from lizard_waterbalance.views import cum_discharges_bars
+from lizard_waterbalance.views import cumulative_graph_period
+from lizard_waterbalance.views import date2datetime
+from lizard_waterbalance.views import fraction_bars
+from lizard_waterbalance.views import get_average_timeseries
+from lizard_waterbalance.views import get_cumulative_timeseries
+from lizard_waterbalance.views import get_raw_timeseries
+from lizard_waterbalance.views import get_water_level_timeseries
+from lizard_waterbalance.views import graph_cache_key
+from lizard_waterbalance.views import graph_etag
+from lizard_waterbalance.views import is_computed
+from lizard_waterbalance.views import is_not_modified
+from lizard_waterbalance.views import measured_concentrations
+from lizard_waterbalance.views import not_modified_response
+from lizard_waterbalance.views import phosphate_impact_bars
+from lizard_waterbalance.views import split_by_sign
+from lizard_waterbalance.views import water_level_lines
+
+logger = logging.getLogger(__name__)
+
+# the default number of points of each series
+DEFAULT_POINTS = 1000
+
+# the supported downsampling methods
+METHODS = ('lttb', 'minmax')
+
+# the minimum number of points of each series per downsampling method, where
+# min/max buckets need at least two buckets besides the first and last point
+MIN_POINTS = {'lttb': 3, 'minmax': 6}
+
+
+def to_milliseconds(times):
+    """Return the array of the milliseconds since the epoch of each time."""
+    return to_date_array(times).astype('datetime64[ms]').astype(numpy.int64)
+
+
+def downsample(x, y, points, method):
+    """Return the array of indices of the points to keep of the given line.
+
+    Parameter *method* is 'lttb' to keep the points that preserve the shape
+    of the line and 'minmax' to keep the minimum and maximum of each part of
+    the line.
+
+    """
+    if method == 'minmax':
+        return min_max_indices(y, (points - 2) // 2)
+    return lttb_indices(x, y, points)
+
+
+def create_series(name, color, series_type, data, axis=1, stack=None):
+    """Return the dict of the series with the given data."""
+    return {'name': name,
+            'color': color,
+            'type': series_type,
+            'axis': axis,
+            'stack': stack,
+            'data': data}
+
+
+def line_series(name, color, times, values, points, method, axis=1,
+                series_type='line'):
+    """Return the dict of the downsampled series of the given events."""
+    x = to_milliseconds(times)
+    y = numpy.asarray(values, dtype=float)
+    indices = downsample(x, y, points, method)
+    data = zip(x[indices].tolist(), y[indices].tolist())
+    return create_series(name, color, series_type, data, axis=axis)
+
+
+def stacked_series(bars, stack, points, method):
+    """Return the list of dicts of the downsampled series of stacked bars.
+
+    Each bar is a tuple of its name, color, times and values, where the first
+    bar is at the bottom of the stack. All bars are downsampled to the same
+    times so the bars remain stacked. These times are selected from the total
+    height of the stack.
+
+    """
+    top_height = TopHeight()
+    for name, color, times, values in bars:
+        top_height.stack_bars(times, values)
+    if top_height.keys is None:
+        keys = to_date_array([])
+    else:
+        indices = downsample(top_height.keys.astype(numpy.int64),
+                             top_height.heights, points, method)
+        keys = top_height.keys[indices]
+    x = keys.astype('datetime64[ms]').astype(numpy.int64).tolist()
+
+    series = []
+    bottom = numpy.zeros(len(keys))
+    for name, color, times, values in bars:
+        bar_height = TopHeight()
+        bar_height.stack_bars(times, values)
+        heights = bar_height.get_heights(keys)
+        data = zip(x, heights.tolist(), bottom.tolist())
+        series.append(create_series(name, color, 'bar', data, stack=stack))
+        bottom = bottom + heights
+    return series
+
+
+def area_graph_data(configuration, waterbalance_computer, start_date,
+                    end_date, period, reset_period, points, method):
+    """Return the data of the waterbalance graph."""
+    calc_start_datetime, calc_end_datetime = \
+        configuration.get_calc_period(date2datetime(end_date))
+    labels, incoming_bars, outgoing_bars, sluice_error = \
+        area_graph_bars(waterbalance_computer, calc_start_datetime,
+                        calc_end_datetime)
+
+    def average(timeseries):
+        return get_average_timeseries(timeseries, date2datetime(start_date),
+                                      date2datetime(end_date), period=period)
+
+    positive, negative = split_by_sign(*average(sluice_error))
+    sluice_error_label = labels['sluice_error']
+
+    stacks = []
+    for stack, bars, sluice_error_events in \
+            [('in', reversed(incoming_bars), positive),
+             ('out', outgoing_bars, negative)]:
+        bars = [(bar[0], bar[2].color) + tuple(average(bar[1]))
+                for bar in bars]
+        bars.append(("sluitfout t.o.v. gemaal", sluice_error_label.color) +
+                    tuple(sluice_error_events))
+        stacks += stacked_series(bars, stack, points, method)
+
+    return {'title': "Waterbalans [m3]", 'series': stacks}
+
+
+def water_level_data(configuration, waterbalance_computer, start_date,
+                     end_date, period, reset_period, points, method,
+                     with_sluice_error=False):
+    """Return the data of the water level graph."""
+    calc_start_datetime, calc_end_datetime = \
+        configuration.get_calc_period(date2datetime(end_date))
+    if with_sluice_error:
+        title = "Waterpeil met sluitfout [m NAP]"
+    else:
+        title = "Waterpeil [m NAP]"
+
+    period = cumulative_graph_period(period, reset_period)
+    lines = water_level_lines(configuration, waterbalance_computer,
+                              calc_start_datetime, calc_end_datetime,
+                              reset_period, with_sluice_error)
+    series = []
+    for line in lines:
+        times, values = get_water_level_timeseries(
+            line, start_date, end_date, calc_start_datetime,
+            calc_end_datetime, period)
+        series.append(line_series(line[2].name, line[2].color, times, values,
+                                  points, method))
+    return {'title': title, 'series': series}
+
+
+def cum_discharges_data(configuration, waterbalance_computer, start_date,
+                        end_date, period, reset_period, points, method):
+    """Return the data of the graph of the cumulative discharges."""
+    calc_start_datetime, calc_end_datetime = \
+        configuration.get_calc_period(date2datetime(end_date))
+    period = cumulative_graph_period(period, reset_period)
+    bars_in, bars_out, line_in, line_out = cum_discharges_bars(
+        waterbalance_computer, calc_start_datetime, calc_end_datetime)
+
+    series = []
+    for stack, bars in [('in', bars_in), ('out', bars_out)]:
+        bars = [(bar[0], bar[3]) + tuple(get_cumulative_timeseries(
+                    bar[1], calc_start_datetime, calc_end_datetime,
+                    period=period, reset_period=reset_period, multiply=-1))
+                for bar in bars]
+        series += stacked_series(bars, stack, points, method)
+
+    for line in line_out + line_in:
+        times, values = get_cumulative_timeseries(
+            line[1], calc_start_datetime, calc_end_datetime, period=period,
+            reset_period=reset_period)
+        data = DataForCumulativeGraph(times, values)
+        times, values = data.retrieve_for_drawing(period, reset_period)
+        series.append(line_series(line[0], line[3], times, values, points,
+                                  method))
+    return {'title': "Cumulatieve debieten", 'series': series}
+
+
+def fraction_distribution_data(configuration, waterbalance_computer,
+                               start_date, end_date, period, reset_period,
+                               points, method,
+                               concentration=Parameter.PARAMETER_CHLORIDE):
+    """Return the data of the fraction distribution graph."""
+    calc_start_datetime, calc_end_datetime = \
+        configuration.get_calc_period(date2datetime(end_date))
+    if concentration == Parameter.PARAMETER_CHLORIDE:
+        substance = "chloride"
+    else:
+        substance = "fosfaat"
+    start_datetime = date2datetime(start_date)
+    end_datetime = date2datetime(end_date)
+
+    bars = fraction_bars(waterbalance_computer, calc_start_datetime,
+                         calc_end_datetime)
+    bars = [(bar[0], bar[2].color) + tuple(get_average_timeseries(
+                bar[1], start_datetime, end_datetime, period=period))
+            for bar in reversed(bars)]
+    series = stacked_series(bars, 'fractions', points, method)
+
+    substance_timeseries = waterbalance_computer.get_concentration_timeseries(
+        calc_start_datetime, calc_end_datetime)
+    times, values = get_average_timeseries(
+        substance_timeseries, start_datetime, end_datetime, period=period)
+    series.append(line_series(substance + " berekend", 'black', times,
+                              values, points, method, axis=2))
+
+    references = measured_concentrations(configuration, concentration)
+    for tijdserie, color in zip(references, colors_list):
+        times, values = get_raw_timeseries(tijdserie.get_timeseries(),
+                                           start_datetime, end_datetime)
+        series.append(line_series(tijdserie.name + " gemeten", color, times,
+                                  values, points, method, axis=2,
+                                  series_type='points'))
+
+    return {'title': "Fractieverdeling en %s" % substance, 'series': series}
+
+
+def phosphate_impact_data(configuration, waterbalance_computer, start_date,
+                          end_date, period, reset_period, points, method):
+    """Return the data of the phosphate impact graph."""
+    calc_start_datetime, calc_end_datetime = \
+        configuration.get_calc_period(date2datetime(end_date))
+    bars_minimum, bars_increment, legend = phosphate_impact_bars(
+        waterbalance_computer, calc_start_datetime, calc_end_datetime)
+
+    bars = [(bar[0], bar[3]) + tuple(get_average_timeseries(
+                bar[1], date2datetime(start_date), date2datetime(end_date),
+                period=period))
+            for bar in bars_minimum + bars_increment]
+    series = stacked_series(bars, 'impact', points, method)
+    return {'title': "Fosfaatbelasting [mg/m2/dag]", 'series': series}
+
+
+# the graph types of the rendered graphs and the keyword arguments of the
+# function that returns the data of each graph
+GRAPH_DATA = {
+    'waterbalans': (area_graph_data, {}),
+    'waterpeil': (water_level_data, {}),
+    'waterpeil_met_sluitfout': (water_level_data, {'with_sluice_error': True}),
+    'fracties_chloride': (fraction_distribution_data, {}),
+    'cumulatief_debiet': (cum_discharges_data, {}),
+    'fosfaatbelasting': (phosphate_impact_data, {}),
+    }
+
+
+def graph_data(configuration, waterbalance_computer, graph_type, start_date,
+               end_date, period, reset_period, points, method):
+    """Return the data of the given graph.
+
+    The graph types are the graph types of the rendered graphs, see
+    GRAPH_DATA. This function raises a KeyError for any other graph type.
+
+    """
+    function, keyword_arguments = GRAPH_DATA[graph_type]
+    return function(configuration, waterbalance_computer, start_date,
+                    end_date, period, reset_period, points, method,
+                    **keyword_arguments)
+
+
+def waterbalance_area_graph_data(request,
+                                 area_slug,
+                                 scenario_slug,
+                                 graph_type=None):
+    """Return the data of the given area graph as JSON.
+
+    The request supports the parameters of the rendered graph, except for
+    its width and height, and the following parameters:
+
+      *points*
+        maximum number of points of each series, by default 1000 and at least
+        3, or 6 for method minmax
+      *method*
+        downsampling method, either 'lttb' or 'minmax'
+
+    The JSON is stored in the cache and revalidated in the same way as the
+    rendered graph. As for the rendered graph, the response has status 202
+    when the waterbalance still has to be computed. An unknown graph type
+    results in a 404.
+
+    """
+    if graph_type not in GRAPH_DATA:
+        raise Http404("unknown graph type '%s'" % graph_type)
+    configuration = WaterbalanceConf.objects.select_related(
+        'waterbalance_area', 'waterbalance_scenario').get(
+        waterbalance_area__slug=area_slug,
+        waterbalance_scenario__slug=scenario_slug)
+
+    period = request.GET.get('period', 'month')
+    reset_period = request.GET.get('reset_period', 'year')
+    start_date, end_date = current_start_end_dates(request)
+    method = request.GET.get('method', 'lttb')
+    if method not in METHODS:
+        method = 'lttb'
+    try:
+        points = int(request.GET.get('points', DEFAULT_POINTS))
+    except ValueError:
+        points = DEFAULT_POINTS
+    points = max(MIN_POINTS[method], points)
+
+    parameters = {'period': period,
+                  'reset_period': reset_period,
+                  'start_date': start_date,
+                  'end_date': end_date,
+                  'points': points,
+                  'method': method}
+    data_type = 'data::' + graph_type
+
+    cache_key_name = CacheKeyName.from_cache(configuration)
+    if cache_key_name is not None:
+        etag = graph_etag(cache_key_name, data_type, parameters)
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+    else:
+        cache_key_name = CacheKeyName(configuration)
+
+    key_name = graph_cache_key(cache_key_name, data_type, parameters)
+    etag = graph_etag(cache_key_name, data_type, parameters)
+    cache_codec = CacheCodec(cache)
+    cached = cache_codec.get(key_name)
+    if cached is None:
+        if not is_computed(configuration, cache_key_name):
+            return computation_pending_response(configuration)
+        t1 = time()
+        area = Area(configuration)
+        waterbalance_computer = \
+            CachedWaterbalanceComputer(cache_key_name, configuration, area)
+        data = graph_data(configuration, waterbalance_computer,
+                          graph_type, start_date, end_date, period,
+                          reset_period, points, method)
+        json = simplejson.dumps(data)
+        logger.debug("Grabbing all graph data took %s seconds.",
+                     time() - t1)
+        cached = (time(), json)
+        cache_codec.set(key_name, cached)
+    last_modified, json = cached
+    if is_not_modified(request, etag, last_modified):
+        response = not_modified_response(etag)
+    else:
+        response = HttpResponse(json, mimetype='application/json')
+        response['ETag'] = '"%s"' % etag
+        response['Cache-Control'] = 'max-age=600'
+    response['Last-Modified'] = http_date(last_modified)
+    return response
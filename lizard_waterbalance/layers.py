@@ -2,28 +2,30 @@ import datetime
 import logging
 import mapnik
 from django.conf import settings
-from django.contrib.gis.geos import Point
 
 from lizard_map.adapter import Graph
 from lizard_map.animation import AnimationSettings
 from lizard_map.coordinates import google_to_wgs84
 from lizard_map.coordinates import WGS84
 from lizard_map.workspace import WorkspaceItemAdapter
+from lizard_waterbalance.map_cache import map_cache
 from lizard_waterbalance.models import Parameter
 from lizard_waterbalance.models import WaterbalanceArea
 from lizard_waterbalance.models import WaterbalanceConf
 from lizard_waterbalance.models import WaterbalanceTimeserie
-from lizard_waterbalance.models import TimeseriesEvent
 
 logger = logging.getLogger(__name__)
 
+STYLE_NAME = 'waterbalance_style'
+
 
 class AdapterWaterbalance(WorkspaceItemAdapter):
     """Adapter for module LizardWaterbalance.
 
     Registered as adapter_waterbalance.
 
-    Uses default database table "waterbalance_shape" as geo database.
+    Uses default database table "waterbalance_shape" as geo database and
+    the monthly values in AreaMonthValue as the values to show.
     """
 
     is_animatable = True
@@ -108,40 +110,35 @@ class AdapterWaterbalance(WorkspaceItemAdapter):
             return wb_ts[0].get_timeseries()
         return None
 
-    def layer(self, layer_ids=None, request=None):
-        """Return layer and styles for a parameter.
+    def _create_layer(self, month):
+        """Return the layer and style of the given month.
 
-        Requires request.
-        request contains the animation settings.
-
-        Set self.selected_date
+        The monthly values are copied to table AreaMonthValue when they are
+        stored, so each tile only needs the values of the selected month.
         """
-        layers = []
-        styles = {}
-
-        if not request:
-            return layers, styles
-
-        # Note: timeseries must be of local type. timestep=MONTH.
-        # TODO: time format is hardcoded. Must work for oracle as well.
-        # TODO: add scenario
+        # The value of an area is the value of the configuration whose
+        # scenario comes first, see AreaMonthValue.map_values.
         table_view = (
-            '(select area.geom, area.name, tsevent.value as value from '
+            '(select shape.geom, area.name, monthvalue.value as value from '
+            '%s as shape, '
             'lizard_waterbalance_waterbalancearea as area, '
+            '(select distinct on (areamonthvalue.area_id) '
+            'areamonthvalue.area_id, areamonthvalue.value '
+            'from lizard_waterbalance_areamonthvalue as areamonthvalue, '
             'lizard_waterbalance_waterbalanceconf as conf, '
-            'lizard_waterbalance_waterbalancetimeserie as wbts, '
-            'lizard_waterbalance_timeseries as ts, '
-            'lizard_waterbalance_timeseriesevent as tsevent '
-            'where conf.waterbalance_area_id = area.id '
-            'and wbts.configuration_id = conf.id '
-            'and wbts.parameter_id = %d '
-            'and wbts.local_timeseries_id = ts.id '
-            'and wbts.timestep = 2 '  # MONTH
-            'and ts.id = tsevent.timeseries_id '
-            'and tsevent.time = \'%s\''
+            'lizard_waterbalance_waterbalancescenario as scenario '
+            'where areamonthvalue.parameter_id = %d '
+            'and areamonthvalue.month = \'%s\' '
+            'and areamonthvalue.configuration_id = conf.id '
+            'and conf.waterbalance_scenario_id = scenario.id '
+            'order by areamonthvalue.area_id, scenario."order", scenario.id'
+            ') as monthvalue '
+            'where monthvalue.area_id = area.id '
+            'and shape.area_id = area.id'
             ') '
             'result_view' % (
-                self.parameter_id, self.selected_date.strftime('%Y-%m-01')))
+                self.shape_tablename, self.parameter_id,
+                month.strftime('%Y-%m-01')))
 
         mapnik_style = self._mapnik_style()
 
@@ -155,11 +152,27 @@ class AdapterWaterbalance(WorkspaceItemAdapter):
             password=db_settings['PASSWORD'],
             dbname=db_settings['NAME'],
             table=str(BUFFERED_TABLE))
-        style_name = 'waterbalance_style'
-        lyr.styles.append(style_name)
+        lyr.styles.append(STYLE_NAME)
+        return lyr, mapnik_style
+
+    def layer(self, layer_ids=None, request=None):
+        """Return layer and styles for a parameter.
+
+        Requires request.
+        request contains the animation settings.
+
+        Set self.selected_date
+        """
+        layers = []
+        styles = {}
+
+        if not request:
+            return layers, styles
+
+        lyr, mapnik_style = self._create_layer(self.selected_date)
 
         layers.append(lyr)
-        styles[style_name] = mapnik_style
+        styles[STYLE_NAME] = mapnik_style
 
         return layers, styles
 
@@ -171,40 +184,27 @@ class AdapterWaterbalance(WorkspaceItemAdapter):
         parameter + config (area) + (scenario) + timestep
 
         if self.selected_date is present: display value.
+
+        The areas and their monthly values are looked up in the MapCache of
+        the current process.
         """
         if self.selected_date is None:
             logger.error('There is no self.selected_date.')
             return []
         wgs84_x, wgs84_y = google_to_wgs84(x, y)
 
-        # Is always 0 or 1
-        areas = WaterbalanceArea.objects.filter(
-            geom__contains=Point(wgs84_x, wgs84_y))
-
-        if not areas:
+        map_cache.validate()
+        area = map_cache.find_area(wgs84_x, wgs84_y)
+        if area is None:
             return []
 
-        area = areas[0]
-
         # Add value to the name
-
-        # Find corresponding timeseries for areas, parameter
-        ts = self._timeseries(area)
-
-        # Look up value
-        if ts:
-            selected_date_rounded = datetime.date(
-                self.selected_date.year,
-                self.selected_date.month, 1)
-            try:
-                ts_event = (
-                    ts.timeseries_events.get(
-                        time=selected_date_rounded))
-                name = '%s - %s=%.2f' % (
-                    area.name, self.parameter, ts_event.value)
-            except TimeseriesEvent.DoesNotExist:
-                # No value found - do nothing
-                return []
+        value = map_cache.get_month_value(
+            self.parameter_id, area.id, self.selected_date)
+        if value is None:
+            # No value found - do nothing
+            return []
+        name = '%s - %s=%.2f' % (area.name, self.parameter, value)
 
         # We can only arrive here when the corresponding area has data.
         return [
@@ -22,22 +22,249 @@
 # this package.  If not, see <http://www.gnu.org/licenses/>.
 
 from datetime import datetime
+from optparse import make_option
+import logging
+import os
+import time
 
-from django.core.cache import cache
 from django.core.management.base import BaseCommand
 
 from dbmodel.models import Area
 from lizard_waterbalance.models import WaterbalanceConf
+from lizard_waterbalance.parallel import imap_unordered
 from lizard_waterbalance.views import CacheKeyName
 from lizard_waterbalance.views import CachedWaterbalanceComputer
+from lizard_wbcomputation.columnar import write_columnar_file
+from lizard_wbcomputation.load_computer import LoadForIntake
+from lizard_wbcomputation.profiling import profiled
+from lizard_wbcomputation.timeseries_spec import Units
+from lizard_wbcomputation.timeseries_spec import spec_columns
 from timeseries.timeseriesstub import write_to_pi_file
 
+logger = logging.getLogger(__name__)
+
+# the kinds of export that can be passed to option --exports
+EXPORT_WATERBALANCE = 'waterbalance'
+EXPORT_IMPACT_ALL = 'impact-all'
+EXPORT_IMPACT_OPEN_WATER = 'impact-open-water'
+EXPORT_COLUMNAR = 'columnar'
+EXPORTS = (EXPORT_WATERBALANCE, EXPORT_IMPACT_ALL, EXPORT_IMPACT_OPEN_WATER,
+           EXPORT_COLUMNAR)
+
+# the location of the time series of the area, as in the PI XML files
+LOCATION_ID = "SAP"
+
+# the period for which the exports are computed
+START, END = datetime(2000, 1, 1), datetime(2000,12, 31)
+
 def replace_pumping_station_keys(mapping2series, name):
     pumping_stations2series = [name]
     del mapping2series[name]
     for pumping_station, series in pumping_stations2series.iteritems():
             mapping2series[pumping_station.name] = series
 
+def create_computer(configuration):
+    cache_key_name = CacheKeyName(configuration)
+    cache_key_name.invalidate()
+    area = Area(configuration)
+    return CachedWaterbalanceComputer(cache_key_name, configuration, area)
+
+def export_waterbalance(computer, start, end, directory=''):
+    """Export the waterbalance computed by the given computer."""
+
+    series = computer.calc_sluice_error_timeseries(start, end)
+    write_to_pi_file(location_id = "SAP", parameter_id="sluice-error",
+                     filename=os.path.join(directory, "sluice-error.xml"),
+                     timeseries=series)
+
+    # the computer returns the dicts it keeps in its cache, so copy each dict
+    # before its keys are replaced
+    incoming = dict(computer.get_open_water_incoming_flows(start, end))
+    if len(incoming['intake_wl_control'].values()) > 0:
+        incoming['intake_wl_control'] = incoming['intake_wl_control'].values()[0]
+    incoming_pumping_stations = incoming['defined_input']
+    del incoming['defined_input']
+    for pumping_station, series in incoming_pumping_stations.iteritems():
+        incoming[pumping_station.name] = series
+    write_to_pi_file(location_id = "SAP",
+                     filename=os.path.join(directory, "open-water-incoming-flows.xml"),
+                     timeseries=incoming)
+
+    outgoing = dict(computer.get_open_water_outgoing_flows(start, end))
+    if len(outgoing['outtake_wl_control'].values()) > 0:
+        outgoing['outtake_wl_control'] = outgoing['outtake_wl_control'].values()[0]
+    outgoing_pumping_stations = outgoing['defined_output']
+    del outgoing['defined_output']
+    for pumping_station, series in outgoing_pumping_stations.iteritems():
+        outgoing[pumping_station.name] = series
+    write_to_pi_file(location_id = "SAP",
+                     filename=os.path.join(directory, "open-water-outgoing-flows.xml"),
+                     timeseries=outgoing)
+
+    level_control = computer.get_level_control_timeseries(start, end)
+    write_to_pi_file(location_id = "SAP",
+                     filename=os.path.join(directory, "level-control-timeseries.xml"),
+                     timeseries=level_control)
+
+    reference = {}
+    intakes, outtakes = computer.get_reference_timeseries(start, end)
+    for pumping_station, series in intakes.iteritems():
+        reference[pumping_station.name] = series
+    for pumping_station, series in outtakes.iteritems():
+        reference[pumping_station.name] = series
+    write_to_pi_file(location_id = "SAP",
+                     filename=os.path.join(directory, "reference.xml"),
+                     timeseries=reference)
+
+    pair = computer.get_waterlevel_with_sluice_error(start, end)
+    series = { "water_level": pair[0], "sluice_error": pair[1] }
+    write_to_pi_file(location_id = "SAP",
+                     filename=os.path.join(directory, "water-level-sluice-error.xml"),
+                     timeseries=series)
+
+    fractions = dict(computer.get_fraction_timeseries(start, end))
+    fractions_pumping_stations = fractions['intakes']
+    del fractions['intakes']
+    for pumping_station, series in fractions_pumping_stations.iteritems():
+        fractions[pumping_station.name] = series
+    write_to_pi_file(location_id = "SAP",
+                     filename=os.path.join(directory, "fractions.xml"),
+                     timeseries=fractions)
+
+    series = computer.get_concentration_timeseries(start, end)
+    write_to_pi_file(location_id = "SAP", parameter_id = "concentration",
+                     filename=os.path.join(directory, "concentration.xml"),
+                     timeseries=series)
+
+def export_impact(computer, start, end, directory=''):
+    """Export the impacts computed by the given computer."""
+    impact = {}
+    loads, loads_incremental = computer.get_impact_timeseries(start, end)
+    for load in loads:
+        impact[load.name] = load.timeseries
+    write_to_pi_file(location_id = "SAP",
+                     filename=os.path.join(directory, "impact.xml"),
+                     timeseries=impact)
+    for load in loads_incremental:
+        impact[load.name] = load.timeseries
+    write_to_pi_file(location_id = "SAP",
+                     filename=os.path.join(directory, "impact-incremental.xml"),
+                     timeseries=impact)
+
+def export_impact_open_water(computer, start, end, directory=''):
+    """Export the impacts on the open water computed by the given computer."""
+    impact = {}
+    loads, loads_incremental = computer.get_impact_timeseries(start, end)
+    for load in loads:
+        if load.on_open_water_flow():
+            impact[load.name] = load.timeseries
+    write_to_pi_file(location_id = "SAP",
+                     filename=os.path.join(directory, "impact-open-water.xml"),
+                     timeseries=impact)
+    for load in loads_incremental:
+        if load.on_open_water_flow():
+            impact[load.name] = load.timeseries
+    write_to_pi_file(location_id = "SAP",
+                     filename=os.path.join(directory, "impact-incremental-open-water.xml"),
+                     timeseries=impact)
+
+def columnar_columns(computer, start, end):
+    """Return the dict of column key to time series computed by the computer.
+
+    Each column key is the triple of location id, parameter id and units,
+    which are the same as those of the time series written by wbcompute, see
+    function spec_columns. The location of a time series of a pumping station
+    is its name.
+
+    """
+    data_cols = {}
+
+    def station_name(station):
+        return LOCATION_ID if station is None else station.name
+
+    def add_columns(mapping2timeseries):
+        for location_id, parameter_id, units, timeseries in \
+                spec_columns(mapping2timeseries, LOCATION_ID, station_name):
+            data_cols[(location_id, parameter_id, units)] = timeseries
+
+    add_columns(computer.get_open_water_incoming_flows(start, end))
+    add_columns(computer.get_open_water_outgoing_flows(start, end))
+
+    result = computer.get_waterlevel_with_sluice_error(start, end)
+    add_columns(dict(zip(['water_level', 'sluice_error',
+                          'sluice_error_inlet'], result)))
+
+    loads, loads_incremental = computer.get_impact_timeseries(start, end)
+    for prefix, impacts in [('min', loads), ('incr', loads_incremental)]:
+        for impact in impacts:
+            if type(impact) == LoadForIntake:
+                if impact.label.is_computed:
+                    name = 'level_control'
+                else:
+                    name = 'discharge'
+                label = '%s_impact_phosphate_%s' % (prefix, name)
+                add_columns({'intakes': (label,
+                                         {impact.label: impact.timeseries})})
+            else:
+                add_columns({'%s_impact_phosphate_%s' % (prefix, impact.label):
+                             impact.timeseries})
+
+    add_columns({'concentrations':
+                 computer.get_concentration_timeseries(start, end)})
+
+    fractions = computer.get_fraction_timeseries(start, end)
+    for label, timeseries in fractions.iteritems():
+        if label == 'intakes':
+            for intake, intake_timeseries in timeseries.iteritems():
+                if intake.is_computed:
+                    parameter_id = 'fraction_water_level_control'
+                else:
+                    parameter_id = 'fraction_water_discharge'
+                data_cols[(intake.name, parameter_id, Units.fraction)] = \
+                    intake_timeseries
+        else:
+            add_columns({'fraction_' + label: timeseries})
+
+    return data_cols
+
+def export_columnar(computer, start, end, directory=''):
+    """Export the time series computed by the computer to a columnar file."""
+    write_columnar_file(os.path.join(directory, "timeseries.npz"),
+                        columnar_columns(computer, start, end), start, end)
+
+EXPORT_FUNCTIONS = {EXPORT_WATERBALANCE: export_waterbalance,
+                    EXPORT_IMPACT_ALL: export_impact,
+                    EXPORT_IMPACT_OPEN_WATER: export_impact_open_water,
+                    EXPORT_COLUMNAR: export_columnar}
+
+def export_configuration(arguments):
+    """Compute the waterbalance of a configuration and write its exports.
+
+    Parameter *arguments* is the tuple of the configuration id, the list of
+    export kinds and the directory to write the exports to. The waterbalance
+    is computed once and each export retrieves its time series from that
+    computation. This function returns the tuple of the configuration id, the
+    number of seconds the computation and export took and an error message,
+    which is None when the export succeeded.
+
+    """
+    configuration_id, exports, directory = arguments
+    start = time.time()
+    try:
+        configuration = WaterbalanceConf.objects.get(pk=configuration_id)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        computer = create_computer(configuration)
+        computer.compute(START, END)
+        for export in exports:
+            EXPORT_FUNCTIONS[export](computer, START, END, directory)
+    except Exception as e:
+        logger.exception("export of configuration %d failed",
+                         configuration_id)
+        return (configuration_id, time.time() - start,
+                str(e) or e.__class__.__name__)
+    return configuration_id, time.time() - start, None
+
 class Command(BaseCommand):
     """Implements a management command to compute and export a waterbalance.
 
@@ -46,19 +273,65 @@ class Command(BaseCommand):
     identify the WaterbalanceConf for which it has to compute and export the
     waterbalance.
 
+    Instead of a single pair of slugs, the client can specify multiple
+    configurations with option --configuration or all configurations with
+    option --all. The command then computes each configuration once, writes
+    the exports specified by option --exports to a directory per
+    configuration and distributes the configurations over the number of
+    processes specified by option --jobs.
+
     """
     args = "area-slug scenario-slug ['export-impact-all'|'export-impact-open-water']"
     help = "Computes the waterbalance of the given configuration and exports " \
            "the resulting time series to PI XML files in the current " \
            "directory."
 
+    option_list = BaseCommand.option_list + (
+        make_option("--configuration",
+                    action="append",
+                    dest="configurations",
+                    default=[],
+                    metavar="AREA-SLUG:SCENARIO-SLUG",
+                    help="export the given configuration, this option can be "
+                         "specified multiple times"),
+        make_option("--all",
+                    action="store_true",
+                    dest="all",
+                    default=False,
+                    help="export all configurations"),
+        make_option("--exports",
+                    dest="exports",
+                    default=",".join(EXPORTS),
+                    help="comma-separated list of the exports to write, by "
+                         "default %s" % ",".join(EXPORTS)),
+        make_option("--jobs",
+                    type="int",
+                    dest="jobs",
+                    default=1,
+                    help="number of processes that export the "
+                         "configurations, 1 by default"),
+        make_option("--output-dir",
+                    dest="output_dir",
+                    default=".",
+                    help="directory in which the command creates the "
+                         "directory of the exports of each configuration, "
+                         "the current directory by default"),
+        make_option("--profile",
+                    dest="profile",
+                    default=None,
+                    help="write a cProfile profile of the command to the "
+                         "given file"),)
+
     def __init__(self, *args, **kwargs):
         """Call __init__ of the parent class and pass the given parameters."""
         super(Command, self).__init__(*args, **kwargs)
 
+    @profiled
     def handle(self, *args, **options):
         """Parse the parameters and delegate the work specified by them."""
-        if len(args) >= 2:
+        if options.get("all") or options.get("configurations"):
+            self.export_configurations(**options)
+        elif len(args) >= 2:
             area_slug, scenario_slug = tuple(args[0:2])
             if len(args) == 3:
                 export_impact = args[2]
@@ -80,104 +353,60 @@ class Command(BaseCommand):
             self.print_help("compute_export")
 
     def create_computer(self, configuration):
-        cache_key_name = CacheKeyName(configuration)
-        names = [ "sluice_error", "total_outtakes", "incoming", "outgoing",
-            "outcome", "pair", "ref_in", "ref_out", "sluice_error_waterlevel",
-            "fractions_1", "fractions_2", "concentrations", "impact",
-            "impact_incremental" ]
-        key_names = [cache_key_name.get(name) for name in names]
-        cache.delete_many(key_names)
-        area = Area(configuration)
-        return CachedWaterbalanceComputer(cache_key_name, configuration, area)
+        return create_computer(configuration)
 
     def compute_export(self, computer):
         """Compute and export the waterbalance using the given computer."""
-
-        start, end = datetime(2000, 1, 1), datetime(2000,12, 31)
-        computer.compute(start, end)
-
-        series = computer.calc_sluice_error_timeseries(start, end)
-        write_to_pi_file(location_id = "SAP", parameter_id="sluice-error",
-                         filename="sluice-error.xml", timeseries=series)
-
-        incoming = computer.get_open_water_incoming_flows(start, end)
-        if len(incoming['intake_wl_control'].values()) > 0:
-            incoming['intake_wl_control'] = incoming['intake_wl_control'].values()[0]
-        incoming_pumping_stations = incoming['defined_input']
-        del incoming['defined_input']
-        for pumping_station, series in incoming_pumping_stations.iteritems():
-            incoming[pumping_station.name] = series
-        write_to_pi_file(location_id = "SAP",
-                         filename="open-water-incoming-flows.xml", timeseries=incoming)
-
-        outgoing = computer.get_open_water_outgoing_flows(start, end)
-        if len(outgoing['outtake_wl_control'].values()) > 0:
-            outgoing['outtake_wl_control'] = outgoing['outtake_wl_control'].values()[0]
-        outgoing_pumping_stations = outgoing['defined_output']
-        del outgoing['defined_output']
-        for pumping_station, series in outgoing_pumping_stations.iteritems():
-            outgoing[pumping_station.name] = series
-        write_to_pi_file(location_id = "SAP",
-                         filename="open-water-outgoing-flows.xml", timeseries=outgoing)
-
-        level_control = computer.get_level_control_timeseries(start, end)
-        write_to_pi_file(location_id = "SAP",
-                         filename="level-control-timeseries.xml", timeseries=level_control)
-
-        reference = {}
-        intakes, outtakes = computer.get_reference_timeseries(start, end)
-        for pumping_station, series in intakes.iteritems():
-            reference[pumping_station.name] = series
-        for pumping_station, series in outtakes.iteritems():
-            reference[pumping_station.name] = series
-        write_to_pi_file(location_id = "SAP",
-                         filename="reference.xml", timeseries=reference)
-
-        pair = computer.get_waterlevel_with_sluice_error(start, end)
-        series = { "water_level": pair[0], "sluice_error": pair[1] }
-        write_to_pi_file(location_id = "SAP",
-                         filename="water-level-sluice-error.xml", timeseries=series)
-
-        fractions = computer.get_fraction_timeseries(start, end)
-        fractions_pumping_stations = fractions['intakes']
-        del fractions['intakes']
-        for pumping_station, series in fractions_pumping_stations.iteritems():
-            fractions[pumping_station.name] = series
-        write_to_pi_file(location_id = "SAP",
-                         filename="fractions.xml", timeseries=fractions)
-
-        series = computer.get_concentration_timeseries(start, end)
-        write_to_pi_file(location_id = "SAP", parameter_id = "concentration",
-                         filename="concentration.xml", timeseries=series)
+        computer.compute(START, END)
+        export_waterbalance(computer, START, END)
 
     def export_impact(self, computer):
-        start, end = datetime(2000, 1, 1), datetime(2000,12, 31)
-        computer.compute(start, end)
-
-        impact = {}
-        loads, loads_incremental = computer.get_impact_timeseries(start, end)
-        for load in loads:
-            impact[load.name] = load.timeseries
-        write_to_pi_file(location_id = "SAP",
-                         filename="impact.xml", timeseries=impact)
-        for load in loads_incremental:
-            impact[load.name] = load.timeseries
-        write_to_pi_file(location_id = "SAP",
-                         filename="impact-incremental.xml", timeseries=impact)
+        computer.compute(START, END)
+        export_impact(computer, START, END)
 
     def export_impact_open_water(self, computer):
-        start, end = datetime(2000, 1, 1), datetime(2000,12, 31)
-        computer.compute(start, end)
-
-        impact = {}
-        loads, loads_incremental = computer.get_impact_timeseries(start, end)
-        for load in loads:
-            if load.on_open_water_flow():
-                impact[load.name] = load.timeseries
-        write_to_pi_file(location_id = "SAP",
-                         filename="impact-open-water.xml", timeseries=impact)
-        for load in loads_incremental:
-            if load.on_open_water_flow():
-                impact[load.name] = load.timeseries
-        write_to_pi_file(location_id = "SAP",
-                         filename="impact-incremental-open-water.xml", timeseries=impact)
+        computer.compute(START, END)
+        export_impact_open_water(computer, START, END)
+
+    def export_configurations(self, **options):
+        """Compute and export the configurations specified by the options."""
+        exports = [export.strip() for export in options["exports"].split(",")]
+        unknown = [export for export in exports if export not in EXPORTS]
+        if unknown:
+            logger.error("unknown export(s) %s, choose from %s",
+                         ", ".join(unknown), ", ".join(EXPORTS))
+            return
+
+        configurations = WaterbalanceConf.objects.select_related(
+            'waterbalance_area', 'waterbalance_scenario')
+        if not options["all"]:
+            selection = []
+            for slugs in options["configurations"]:
+                area_slug, scenario_slug = slugs.split(":", 1)
+                selection.append(configurations.get(
+                    waterbalance_area__slug=area_slug,
+                    waterbalance_scenario__slug=scenario_slug))
+            configurations = selection
+
+        names = {}
+        todo = []
+        for configuration in configurations:
+            name = "%s-%s" % (configuration.waterbalance_area.slug,
+                              configuration.waterbalance_scenario.slug)
+            names[configuration.id] = name
+            directory = os.path.join(options["output_dir"], name)
+            todo.append((configuration.id, exports, directory))
+
+        results = imap_unordered(export_configuration, todo, options["jobs"])
+        failed = 0
+        for index, (configuration_id, seconds, error) in enumerate(results):
+            if error is None:
+                logger.info("%d/%d: exported %s in %.1f seconds", index + 1,
+                            len(todo), names[configuration_id], seconds)
+            else:
+                failed += 1
+                logger.error("%d/%d: export of %s failed after %.1f "
+                             "seconds: %s", index + 1, len(todo),
+                             names[configuration_id], seconds, error)
+        logger.info("exported %d configurations, %d failed",
+                    len(todo) - failed, failed)
@@ -1,21 +1,175 @@
 import datetime
 import logging
+import os
+import time
+
+from optparse import make_option
 
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import simplejson
+
+from dbmodel.models import Area
 from lizard_waterbalance.models import IncompleteData
+from lizard_waterbalance.models import Parameter
+from lizard_waterbalance.models import Timeseries
 from lizard_waterbalance.models import WaterbalanceConf
 from lizard_waterbalance.models import WaterbalanceTimeserie
+from lizard_waterbalance.models import insert_events
+from lizard_waterbalance.models import invalidates_map
+from lizard_waterbalance.parallel import imap_unordered
+from lizard_waterbalance.rollups import find_rollup
 from lizard_wbcomputation.compute import WaterbalanceComputer2
+from lizard_wbcomputation.profiling import profiled
+from timeseries.timeseriesstub import add_timeseries
 
 
 logger = logging.getLogger(__name__)
 
+# name of the Parameter of the stored sluice errors
+SLUICE_ERROR_PARAMETER = 'sluitfout'
+
+# status of a configuration in the state file
+STATUS_DONE = 'done'
+STATUS_SKIPPED = 'skipped'
+STATUS_FAILED = 'failed'
+
+
+def store_sluice_error_timeseries(configuration, start_date, end_date):
+    """Compute and store the monthly sluice error of the given configuration.
+
+    The sluice error is stored in the monthly WaterbalanceTimeserie of the
+    configuration with Parameter 'sluitfout', which is shown on the map, see
+    function store_monthly_events.
+
+    """
+    waterbalance_computer = WaterbalanceComputer2(configuration,
+                                                  Area(configuration))
+    outlet, inlet = waterbalance_computer.calc_sluice_error_timeseries(
+        start_date, end_date)
+    rollup = find_rollup(add_timeseries(outlet, inlet), 'month')
+    store_monthly_events(configuration, SLUICE_ERROR_PARAMETER, rollup)
+
+
+@invalidates_map
+@transaction.commit_on_success
+def store_monthly_events(configuration, parameter_name, rollup):
+    """Replace the events of the monthly WaterbalanceTimeserie.
+
+    The WaterbalanceTimeserie is the monthly time series of the given
+    configuration and the Parameter with the given name. Its events are
+    replaced by the events of the given Rollup in a single transaction, so
+    the map never shows a time series without events. Saving the
+    WaterbalanceTimeserie refreshes its monthly values of the map.
+
+    """
+    parameter, new = Parameter.objects.get_or_create(name=parameter_name)
+    wb_timeserie, new = WaterbalanceTimeserie.objects.get_or_create(
+        name="%s: %s" % (configuration.__unicode__()[:30], parameter_name),
+        parameter=parameter,
+        configuration=configuration,
+        timestep=WaterbalanceTimeserie.TIMESTEP_MONTH)
+    timeseries = wb_timeserie.local_timeseries
+    if timeseries is None:
+        timeseries = Timeseries(name=wb_timeserie.name[:64])
+        timeseries.save()
+        wb_timeserie.local_timeseries = timeseries
+    else:
+        timeseries.timeseries_events.all().delete()
+    insert_events(timeseries, zip(rollup.dates, rollup.values))
+    if rollup.dates:
+        wb_timeserie.hint_datetime_start = rollup.dates[0]
+        wb_timeserie.hint_datetime_end = rollup.dates[-1]
+    wb_timeserie.save()
+
+
+def compute_configuration(arguments):
+    """Compute and store the time series of a single configuration.
+
+    Parameter *arguments* is the tuple of the configuration id and the start
+    and end date of the computation. This function returns the tuple of the
+    configuration id, its status, the number of seconds the computation took
+    and a message.
+
+    """
+    configuration_id, start_date, end_date = arguments
+    start = time.time()
+    configuration = WaterbalanceConf.objects.get(pk=configuration_id)
+    logger.info('Processing %s...' % configuration)
+    try:
+        logger.info('Computing sluice errors...')
+        store_sluice_error_timeseries(configuration, start_date, end_date)
+    except IncompleteData as e:
+        logger.info('Skipped because of incomplete data.')
+        return configuration_id, STATUS_SKIPPED, time.time() - start, str(e)
+    except Exception as e:
+        logger.exception('Computation of %s failed.' % configuration)
+        return (configuration_id, STATUS_FAILED, time.time() - start,
+                str(e) or e.__class__.__name__)
+    return configuration_id, STATUS_DONE, time.time() - start, ''
+
+
+def load_state(state_file):
+    """Return the dict of configuration id to its result in the state file.
+
+    Each result is a dict with the status, seconds and message of the
+    computation of a configuration. When the state file does not exist, this
+    function returns an empty dict.
+
+    """
+    if state_file is None or not os.path.exists(state_file):
+        return {}
+    with open(state_file) as stream:
+        state = simplejson.load(stream)
+    return dict((int(key), value) for key, value in state.items())
+
+
+def save_state(state_file, state):
+    """Write the given state to the given state file.
+
+    The state is written to a temporary file that replaces the state file, so
+    an interrupted run never leaves an incomplete state file behind.
+
+    """
+    if state_file is None:
+        return
+    temporary_file = state_file + '.tmp'
+    with open(temporary_file, 'w') as stream:
+        simplejson.dump(state, stream, indent=2)
+    os.rename(temporary_file, state_file)
+
 
 class Command(BaseCommand):
     args = ""
     help = ("Compute timeseries which are visible "
             "in the geographical environment.")
 
+    option_list = BaseCommand.option_list + (
+        make_option("--jobs",
+                    type="int",
+                    dest="jobs",
+                    default=1,
+                    help="number of worker processes that compute the "
+                         "configurations, 1 by default"),
+        make_option("--state",
+                    dest="state",
+                    default=None,
+                    help="file that records the configurations that have been "
+                         "computed; when the file exists, the command skips "
+                         "these configurations"),
+        make_option("--retry-failed",
+                    action="store_true",
+                    dest="retry_failed",
+                    default=False,
+                    help="compute the configurations that failed in a "
+                         "previous run again"),
+        make_option("--profile",
+                    dest="profile",
+                    default=None,
+                    help="write a cProfile profile of the command to the "
+                         "given file"),)
+
+    @profiled
     def handle(self, *args, **options):
         logger.info('Start computing timeseries.')
 
@@ -23,23 +177,54 @@ class Command(BaseCommand):
         end_date_calc = (datetime.datetime.now() +
                          datetime.timedelta(days=31))
 
-        done_list = []
-
-        # Loop all configurations, try to calculate sluice errors.
-        for configuration in WaterbalanceConf.objects.all():
-            logger.info('Processing %s...' % configuration)
-            waterbalance_computer = WaterbalanceComputer2(configuration)
-
-            try:
-                logger.info('Computing sluice errors...')
-                waterbalance_computer.calc_and_store_sluice_error_timeseries(
-                    start_date_calc, end_date_calc,
-                    timestep=WaterbalanceTimeserie.TIMESTEP_MONTH)
-                done_list.append(configuration)
-            except IncompleteData:
-                logger.info('Skipped because of incomplete data.')
-
-        logger.info('*****************')
-        logger.info('Succesfully done:')
-        for d in done_list:
-            logger.info(d)
+        state_file = options["state"]
+        state = load_state(state_file)
+        finished = [STATUS_DONE, STATUS_SKIPPED]
+        if not options["retry_failed"]:
+            finished.append(STATUS_FAILED)
+
+        configuration_ids = WaterbalanceConf.objects.values_list('id',
+                                                                 flat=True)
+        todo = [(configuration_id, start_date_calc, end_date_calc)
+                for configuration_id in configuration_ids
+                if state.get(configuration_id, {}).get('status')
+                not in finished]
+        logger.info('%d configurations to compute, %d already computed.',
+                    len(todo), len(configuration_ids) - len(todo))
+
+        # the state file contains the configurations that have been computed,
+        # so when the run is interrupted, a next run resumes with the other
+        # configurations
+        results = imap_unordered(compute_configuration, todo, options["jobs"])
+        for index, result in enumerate(results):
+            configuration_id, status, seconds, message = result
+            state[configuration_id] = {'status': status,
+                                       'seconds': seconds,
+                                       'message': message}
+            save_state(state_file, state)
+            logger.info('%d/%d: configuration %d %s in %.1f seconds.',
+                        index + 1, len(todo), configuration_id, status,
+                        seconds)
+
+        self.report(state)
+
+    def report(self, state):
+        """Log the status and duration of each configuration."""
+        names = dict((configuration.id, configuration.__unicode__())
+                     for configuration in WaterbalanceConf.objects.all())
+        results = sorted(state.items(), key=lambda item: -item[1]['seconds'])
+        for status in [STATUS_DONE, STATUS_SKIPPED, STATUS_FAILED]:
+            selection = [(configuration_id, result)
+                         for configuration_id, result in results
+                         if result['status'] == status]
+            logger.info('*****************')
+            logger.info('%s: %d configurations', status, len(selection))
+            for configuration_id, result in selection:
+                name = names.get(configuration_id, configuration_id)
+                if result['message']:
+                    logger.info('%s: %.1f seconds (%s)', name,
+                                result['seconds'], result['message'])
+                else:
+                    logger.info('%s: %.1f seconds', name, result['seconds'])
+        total = sum(result['seconds'] for result in state.values())
+        logger.info('Total computation time: %.1f seconds.', total)
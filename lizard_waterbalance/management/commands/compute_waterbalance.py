@@ -36,6 +36,7 @@ from django.core.management.base import BaseCommand
 from lizard_waterbalance.models import WaterbalanceArea
 from lizard_waterbalance.models import WaterbalanceConf
 from lizard_wbcomputation.compute import WaterbalanceComputer2
+from lizard_wbcomputation.profiling import profiled
 #from lizard_waterbalance.timeseriesretriever import TimeseriesRetriever
 from timeseries.timeseriesstub import enumerate_events
 from timeseries.timeseriesstub import split_timeseries
@@ -219,8 +220,14 @@ class Command(BaseCommand):
                     action = "store_false",
                     dest="export_table",
                     default=True,
-                    help="store the results in multiple CSV files"),)
-
+                    help="store the results in multiple CSV files"),
+        make_option("--profile",
+                    dest="profile",
+                    default=None,
+                    help="write a cProfile profile of the command to the "
+                         "given file"),)
+
+    @profiled
     def handle(self, *args, **options):
 
         parser = OptionParser(option_list=self.option_list)
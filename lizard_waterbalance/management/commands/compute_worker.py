@@ -0,0 +1,117 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""Implements a management command to process the queued computation jobs."""
+
+# This package implements the management commands for lizard-waterbalance Django
+# app.
+#
+# Copyright (C) 2012 Nelen & Schuurmans
+#
+# This package is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this package.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import time
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from dbmodel.models import Area
+from lizard_waterbalance.models import ComputationJob
+from lizard_waterbalance.views import CacheKeyName
+from lizard_waterbalance.views import CachedWaterbalanceComputer
+
+logger = logging.getLogger(__name__)
+
+
+def run_job(job):
+    """Compute the waterbalance of the given job and store it in the cache.
+
+    Next to the results of the computation itself, the worker caches each
+    item the graphs read and then stores the marker that the configuration is
+    computed, see function is_computed.
+
+    The computer holds the computation lock of the configuration during the
+    whole computation, so graph requests for the same configuration wait for
+    the results of this job instead of starting a computation on their own.
+
+    """
+    configuration = job.configuration
+    computer = CachedWaterbalanceComputer(CacheKeyName(configuration),
+                                          configuration,
+                                          Area(configuration))
+    start_date, end_date = configuration.get_calc_period()
+    locked = computer.computation_lock.acquire()
+    try:
+        computer.compute(start_date, end_date)
+        computer.get_open_water_incoming_flows(start_date, end_date)
+        computer.get_open_water_outgoing_flows(start_date, end_date)
+        computer.get_level_control_pumping_stations()
+        computer.get_waterlevel_with_sluice_error(start_date, end_date)
+        computer.mark_computed()
+    finally:
+        if locked:
+            computer.computation_lock.release()
+
+
+class Command(BaseCommand):
+    """Implements a management command to process the queued computation jobs.
+
+    The views of the waterbalance enqueue a ComputationJob when the results of
+    a configuration have to be (re)computed. This command claims these jobs one
+    by one and computes their waterbalance. Multiple workers can run at the
+    same time as each job is claimed by a single worker.
+
+    """
+    help = "Computes the waterbalance of the queued computation jobs and " \
+           "stores the results in the cache."
+
+    option_list = BaseCommand.option_list + (
+        make_option("--once",
+                    action="store_true",
+                    dest="once",
+                    default=False,
+                    help="stop when there are no queued jobs left instead " \
+                         "of waiting for new jobs"),
+        make_option("--poll-interval",
+                    type="float",
+                    dest="poll_interval",
+                    default=5.0,
+                    help="number of seconds to wait before looking for new " \
+                         "jobs when the queue is empty"),)
+
+    def handle(self, *args, **options):
+        """Process the queued jobs until the queue is empty or forever."""
+        while True:
+            stale_jobs = ComputationJob.fail_stale()
+            if stale_jobs:
+                logger.warning("marked %d stale computation job(s) as failed",
+                               stale_jobs)
+            job = ComputationJob.claim_next()
+            if job is None:
+                if options["once"]:
+                    break
+                time.sleep(options["poll_interval"])
+                continue
+            logger.info("start computation job %d of %s", job.pk,
+                        job.configuration)
+            try:
+                run_job(job)
+            except Exception as e:
+                logger.exception("computation job %d failed", job.pk)
+                job.finish(message=unicode(e) or e.__class__.__name__)
+            else:
+                logger.info("finished computation job %d", job.pk)
+                job.finish()
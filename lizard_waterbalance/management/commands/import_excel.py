@@ -28,11 +28,15 @@
 from datetime import datetime
 from os.path import join
 import glob
+import numpy
 import xlrd
 
 
 from django.core.management.base import BaseCommand
+from django.db import transaction
 
+from lizard_waterbalance.aggregation import DATE_TYPE
+from lizard_waterbalance.aggregation import to_datetimes
 from lizard_waterbalance.models import Bucket
 from lizard_waterbalance.models import Concentration
 from lizard_waterbalance.models import Label
@@ -45,71 +49,125 @@ from lizard_waterbalance.models import WaterbalanceArea
 from lizard_waterbalance.models import WaterbalanceConf
 from lizard_waterbalance.models import WaterbalanceScenario
 from lizard_waterbalance.models import WaterbalanceTimeserie
+from lizard_waterbalance.models import insert_events
+from lizard_waterbalance.models import invalidates_map
 
 from lizard_wbcomputation.bucket_types import BucketTypes
 
-from timeseries.timeseriesstub import TimeseriesStub
-
 NAME_INTAKE_LEVEL_CONTROL = "inlaat peilhandhaving"
 COORDS_MAX_DISCHARGE_INTAKE_LEVEL_CONTROL = [69, 1]
 COORDS_NAME_PUMPLINE_INTAKE_LEVEL_CONTROL = [72, 8]
 
-def save_timeserie_into_database(wb_timeserie, sheet, row, date_col, value_col, stick_to_last_value=False):
+# day 0 of the Excel dates in the 1900 date system, which takes the
+# non-existing 1900-02-29 into account for all dates from 1900-03-01
+EXCEL_EPOCH = numpy.datetime64('1899-12-30', 'D')
 
-    #set timeserie settings
-    timeserie_stub = TimeseriesStub()
-    wb_timeserie.use_fews = False
+# the first Excel date that is not ambiguous, viz. 1900-03-01
+FIRST_EXCEL_DATE = 61
 
-    try:
-        for rownr in range(row,row+10000):
-            try:
-                date = xlrd.xldate_as_tuple(sheet.cell(rownr,date_col).value,0)
-                value = float(sheet.cell(rownr,value_col).value)
-                timeserie_stub.add_value(datetime(date[0],date[1],date[2]), value)
-            except ValueError:
-                #skip timestamp
-                pass
-
-    except IndexError:
-       pass
+def to_floats(cell_values):
+    """Return the array of the given cell values as floats.
 
-    if wb_timeserie.local_timeseries:
-        timeseries = wb_timeserie.local_timeseries
-        timeseries.stick_to_last_value=stick_to_last_value
-        timeseries.timeseries_events.all().delete()
-    else:
-        timeseries = Timeseries.objects.create(name = wb_timeserie.name,  stick_to_last_value=stick_to_last_value)
-        wb_timeserie.local_timeseries = timeseries
+    The value of a cell that cannot be converted to a float is NaN.
 
-    print 'start save timeserie %s'%datetime.now()
-    timeseries.save_timeserie_stub(timeserie_stub)
-    print 'finish save timeserie %s'%datetime.now()
-    wb_timeserie.save()
+    """
+    floats = numpy.empty(len(cell_values))
+    for index, cell_value in enumerate(cell_values):
+        try:
+            floats[index] = float(cell_value)
+        except (TypeError, ValueError):
+            floats[index] = numpy.nan
+    return floats
 
-def create_save_yearly_timeserie_into_database(wb_timeserie, array_date_value, start_year=1996, end_year=2015, stick_to_last_value=True):
+def column_events(date_cells, value_cells):
+    """Return the pair of date and value arrays of the given cell values.
 
-    #set timeserie settings
-    timeserie_stub = TimeseriesStub()
-    wb_timeserie.use_fews = False
+    The date of each event is the day of the Excel date in the given date
+    cells. Rows whose date cell does not contain a date or whose value cell
+    does not contain a number, are skipped.
 
+    """
+    excel_dates = to_floats(date_cells)
+    values = to_floats(value_cells)
+    valid = ~numpy.isnan(values) & ~numpy.isnan(excel_dates)
+    valid[valid] = excel_dates[valid] >= FIRST_EXCEL_DATE
+    days = numpy.floor(excel_dates[valid]).astype(numpy.int64)
+    dates = (EXCEL_EPOCH + days).astype(DATE_TYPE)
+    return dates, values[valid]
+
+def read_column_events(sheet, row, date_col, value_col):
+    """Return the pair of date and value arrays of the given sheet columns.
 
-    for year in range(start_year, end_year):
-        for month, day, value in array_date_value:
-            timeserie_stub.add_value(datetime(year, month, day), value)
+    The events start at the given row and end at the last row of the sheet.
+
+    """
+    return column_events(sheet.col_values(date_col, row, sheet.nrows),
+                         sheet.col_values(value_col, row, sheet.nrows))
+
+def yearly_events(array_date_value, start_year, end_year):
+    """Return the pair of date and value arrays of a yearly pattern.
+
+    Parameter *array_date_value* is the sequence of (month, day, value)
+    triples that specifies the pattern, which is repeated for each year from
+    start_year up to but not including end_year. A day that does not exist in
+    a year, such as 29 February in a year that is not a leap year, is
+    skipped. This function raises a ValueError for a day that does not exist
+    in any year.
+
+    """
+    for month, day, value in array_date_value:
+        # 2000 is a leap year, so each day that exists in some year exists
+        # in 2000
+        datetime(2000, int(month), int(day))
+    years = numpy.arange(start_year, end_year)
+    months = numpy.array([month for month, day, value in array_date_value],
+                         dtype=int)
+    days = numpy.array([day for month, day, value in array_date_value],
+                       dtype=int)
+    pattern = numpy.array([value for month, day, value in array_date_value],
+                          dtype=float)
+    month_keys = (years[:, numpy.newaxis] - 1970) * 12 + (months - 1)
+    dates = month_keys.astype('datetime64[M]').astype('datetime64[D]') + \
+        (days - 1)
+    # a day that does not exist rolls over into the next month
+    exists = dates.astype('datetime64[M]') == month_keys.astype('datetime64[M]')
+    values = numpy.tile(pattern, len(years))
+    return dates[exists].astype(DATE_TYPE), values[exists.ravel()]
+
+def store_events(wb_timeserie, dates, values, stick_to_last_value):
+    """Replace the events of the local time series of the WaterbalanceTimeserie.
+
+    The events are inserted in batches, see function insert_events. This
+    function does not manage the transaction itself, so all time series of a
+    workbook are stored in the transaction of that workbook. Saving the
+    WaterbalanceTimeserie refreshes its monthly values of the map.
+
+    """
+    wb_timeserie.use_fews = False
 
     if wb_timeserie.local_timeseries:
         timeseries = wb_timeserie.local_timeseries
-        timeseries.stick_to_last_value=True
+        timeseries.stick_to_last_value = stick_to_last_value
+        timeseries.save()
         timeseries.timeseries_events.all().delete()
     else:
-        timeseries = Timeseries.objects.create(name = wb_timeserie.name, stick_to_last_value=True)
+        timeseries = Timeseries.objects.create(name = wb_timeserie.name,  stick_to_last_value=stick_to_last_value)
         wb_timeserie.local_timeseries = timeseries
 
-    print 'start save timeserie %s'%datetime.now()
-    timeseries.save_timeserie_stub(timeserie_stub)
-    print 'finish save timeserie %s'%datetime.now()
+    count = insert_events(timeseries, zip(to_datetimes(dates), values.tolist()))
+    print 'saved %d events of timeserie %s' % (count, wb_timeserie.name)
     wb_timeserie.save()
 
+def save_timeserie_into_database(wb_timeserie, sheet, row, date_col, value_col, stick_to_last_value=False):
+
+    dates, values = read_column_events(sheet, row, date_col, value_col)
+    store_events(wb_timeserie, dates, values, stick_to_last_value)
+
+def create_save_yearly_timeserie_into_database(wb_timeserie, array_date_value, start_year=1996, end_year=2015, stick_to_last_value=True):
+
+    dates, values = yearly_events(array_date_value, start_year, end_year)
+    store_events(wb_timeserie, dates, values, True)
+
 
 def retrieve_pumping_station_for_level_control(sheet, open_water, label):
     """Return the single PumpingStation for level control.
@@ -202,15 +260,29 @@ def retrieve_intake_for_level_control(open_water, labels, sheet, pars):
 
         pump_line.save()
 
+@invalidates_map
+@transaction.commit_on_success
 def upload_settings_from_excelfile(xls_file_name, load_excel_reference_results=False):
     """load settings from the waternet excelfile format
 
+    The workbook is imported in a single transaction, so a workbook that
+    cannot be imported leaves the database unchanged. The map data is
+    invalidated after the transaction has been committed. Only the sheet with
+    the settings is loaded from the workbook.
+
     """
 
     print 'start import file %s'%xls_file_name
 
-    xls = xlrd.open_workbook(xls_file_name)
-    sheet = xls.sheet_by_name('uitgangspunten')
+    xls = xlrd.open_workbook(xls_file_name, on_demand=True)
+    try:
+        sheet = xls.sheet_by_name('uitgangspunten')
+        upload_settings_from_sheet(sheet)
+    finally:
+        xls.release_resources()
+
+def upload_settings_from_sheet(sheet):
+    """load settings from the given sheet of a waternet excelfile"""
 
     wb_area_name = sheet.cell(0,0).value
 
@@ -0,0 +1,67 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""Implements tests for the command to import waterbalance Excel files."""
+
+# This package implements the management commands for lizard-waterbalance Django
+# app.
+#
+# Copyright (C) 2012 Nelen & Schuurmans
+#
+# This package is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this package.  If not, see <http://www.gnu.org/licenses/>.
+
+from datetime import datetime
+import unittest
+
+from lizard_waterbalance.aggregation import to_datetimes
+from lizard_waterbalance.management.commands.import_excel import column_events
+from lizard_waterbalance.management.commands.import_excel import yearly_events
+
+class ColumnEventsTests(unittest.TestCase):
+
+    def test_a(self):
+        """Test the Excel dates are converted to days."""
+        dates, values = column_events([35065.0, 35066.75], [1.0, 2.0])
+        self.assertEqual([datetime(1996, 1, 1), datetime(1996, 1, 2)],
+                         to_datetimes(dates))
+        self.assertEqual([1.0, 2.0], values.tolist())
+
+    def test_b(self):
+        """Test rows without a date or without a number are skipped."""
+        dates, values = column_events(['', 35065.0, 35066.0, 0.0],
+                                      [1.0, u'', 3.0, 4.0])
+        self.assertEqual([datetime(1996, 1, 2)], to_datetimes(dates))
+        self.assertEqual([3.0], values.tolist())
+
+class YearlyEventsTests(unittest.TestCase):
+
+    def test_a(self):
+        """Test the pattern is repeated for each year."""
+        dates, values = yearly_events([[1, 1, 0.5], [4, 15, 1.5]], 1996, 1998)
+        self.assertEqual([datetime(1996, 1, 1), datetime(1996, 4, 15),
+                          datetime(1997, 1, 1), datetime(1997, 4, 15)],
+                         to_datetimes(dates))
+        self.assertEqual([0.5, 1.5, 0.5, 1.5], values.tolist())
+
+    def test_b(self):
+        """Test a leap day is skipped in the years that are not leap years."""
+        dates, values = yearly_events([[2, 29, 0.5], [3, 1, 1.5]], 1996, 1998)
+        self.assertEqual([datetime(1996, 2, 29), datetime(1996, 3, 1),
+                          datetime(1997, 3, 1)], to_datetimes(dates))
+        self.assertEqual([0.5, 1.5, 1.5], values.tolist())
+
+    def test_c(self):
+        """Test a day that does not exist in any year is rejected."""
+        self.assertRaises(ValueError, yearly_events, [[4, 31, 0.5]], 1996,
+                          1998)
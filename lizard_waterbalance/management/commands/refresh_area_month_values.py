@@ -0,0 +1,56 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""Implements a management command to refresh the monthly values of the map."""
+
+# This package implements the management commands for lizard-waterbalance Django
+# app.
+#
+# Copyright (C) 2012 Nelen & Schuurmans
+#
+# This package is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this package.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from lizard_waterbalance.models import AreaMonthValue
+from lizard_waterbalance.models import WaterbalanceTimeserie
+from lizard_waterbalance.models import invalidates_map
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    """Implements a management command to refresh the monthly map values.
+
+    The monthly values of the map are refreshed each time a monthly time
+    series is stored. This command refreshes the values of all monthly time
+    series, for example to fill table AreaMonthValue after it has been
+    created.
+
+    """
+    help = "Copies the values of the monthly waterbalance time series to " \
+           "the table that is shown on the map."
+
+    @invalidates_map
+    @transaction.commit_on_success
+    def handle(self, *args, **options):
+        wb_timeseries = WaterbalanceTimeserie.objects.filter(
+            timestep=WaterbalanceTimeserie.TIMESTEP_MONTH,
+            configuration__isnull=False)
+        for wb_timeserie in wb_timeseries.select_related('configuration'):
+            count = AreaMonthValue.refresh(wb_timeserie)
+            logger.info("copied %d monthly values of %s", count, wb_timeserie)
@@ -0,0 +1,154 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#******************************************************************************
+#
+# This file is part of the lizard_waterbalance Django app.
+#
+# The lizard_waterbalance app is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the lizard_waterbalance app.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2012 Nelen & Schuurmans
+#
+#******************************************************************************
+
+"""Cache the data of the waterbalance map layer in the current process.
+
+Each mouse move over the map searches the area and its value at the mouse
+position. A MapCache keeps the geometries of the areas and the monthly values
+of each area in memory, so subsequent mouse moves do not have to go to the
+database.
+
+The monthly values and the geometries change when results or shapes are
+stored. As each process has its own MapCache, the MapCache checks a
+generation stamp in the Django cache and drops its data when another process
+has changed the data, see function invalidate.
+
+"""
+
+import datetime
+import logging
+import threading
+from time import time
+
+from django.conf import settings
+from django.contrib.gis.geos import Point
+from django.core.cache import cache
+
+from lizard_waterbalance.cache_codec import TIMEOUT
+from lizard_waterbalance.models import AreaMonthValue
+from lizard_waterbalance.models import WaterbalanceShape
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'lizard_waterbalance.map_cache.generation'
+
+# the maximum number of areas with monthly values in a MapCache
+MAX_ENTRIES = getattr(settings, 'WATERBALANCE_MAP_CACHE_ENTRIES', 1000)
+
+
+def get_generation():
+    """Return the current generation stamp of the data of the map layer."""
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        cache.add(GENERATION_KEY, time(), TIMEOUT)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def invalidate():
+    """Mark the data of the map layer in each MapCache as outdated.
+
+    Call this function after the changes of the data have been committed,
+    otherwise another process can reload the data before the changes are
+    visible to it.
+
+    """
+    cache.set(GENERATION_KEY, time(), TIMEOUT)
+
+
+def first_of_month(date):
+    """Return the first day of the month of the given date."""
+    return datetime.date(date.year, date.month, 1)
+
+
+class MapCache(object):
+    """Caches the shapes and monthly values of the map layer.
+
+    Instance variables:
+      *shapes*
+        list of the pair of WaterbalanceArea and its prepared geometry, or
+        None when the shapes have not been loaded
+      *month_values*
+        dict of the pair of parameter id and area id to the dict of month to
+        value
+
+    """
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.generation = None
+        self.shapes = None
+        self.month_values = {}
+
+    def validate(self):
+        """Drop the shapes and monthly values when they are outdated."""
+        generation = get_generation()
+        if generation != self.generation:
+            self.lock.acquire()
+            try:
+                self.shapes = None
+                self.month_values = {}
+                self.generation = generation
+            finally:
+                self.lock.release()
+
+    def _store(self, entries, key, value):
+        self.lock.acquire()
+        try:
+            if len(entries) >= self.max_entries:
+                entries.clear()
+            entries[key] = value
+        finally:
+            self.lock.release()
+
+    def find_area(self, x, y):
+        """Return the WaterbalanceArea at the given WGS84 location or None."""
+        shapes = self.shapes
+        if shapes is None:
+            shapes = [(shape.area, shape.geom.prepared) for shape in
+                      WaterbalanceShape.objects.select_related('area')]
+            self.shapes = shapes
+        point = Point(x, y)
+        for area, geom in shapes:
+            if geom.contains(point):
+                return area
+        return None
+
+    def get_month_value(self, parameter_id, area_id, month):
+        """Return the value of the given parameter, area and month or None.
+
+        The first time the value of an area is requested, this method loads
+        the values of all months of that area, so the value remains available
+        when the user animates the map.
+
+        """
+        key = (parameter_id, area_id)
+        values = self.month_values.get(key)
+        if values is None:
+            values = AreaMonthValue.map_values(parameter_id, area_id)
+            self._store(self.month_values, key, values)
+        return values.get(first_of_month(month))
+
+
+# the MapCache of the current process
+map_cache = MapCache()
@@ -4,47 +4,111 @@
 divideVerticalSpaceEqually, reloadGraphs, show_popup, nothingFoundPopup */
 
 
+// Number of times the status of a computation is polled while it remains
+// queued before the page assumes that no worker is running.
+var MAX_QUEUED_POLLS = 30;
+
+
+function show_graphs(graphs) {
+    var div;
+    $('div#evenly-spaced-vertical .vertical-item').remove();
+    $.each(graphs, function (index, val) {
+        // console.log(val);
+        div = $("<div/>").addClass('vertical-item').addClass('img-use-my-size');
+        div.append($("<a/>").addClass('replace-with-image').attr('href', val).attr(
+            'data-errormsg', 'Waarschijnlijk is niet alle data ingevuld'));
+        // $('div#evenly-spaced-vertical').append(div);
+        div.insertBefore('#adjustment-form');
+    });
+    restretchExistingElements();
+}
+
+
+function report_unfinished_computation(status) {
+    if (status.status === "failed") {
+        window.alert("Het berekenen is mislukt: " + status.message);
+    }
+    else if (status.status === "queued") {
+        window.alert("Het berekenen is nog niet gestart, " +
+                     "probeer het later opnieuw.");
+    }
+}
+
+
+function poll_computation_status(status_url, on_finished, queued_polls) {
+    // Poll the status of the computation until it is no longer pending or
+    // until it has been queued for too long, which means that no worker
+    // picks it up.
+    queued_polls = queued_polls || 0;
+    $.getJSON(status_url, function (data) {
+        if (data.status === "queued") {
+            queued_polls += 1;
+        }
+        if (data.status === "running" ||
+            (data.status === "queued" && queued_polls < MAX_QUEUED_POLLS)) {
+            window.setTimeout(function () {
+                poll_computation_status(status_url, on_finished, queued_polls);
+            }, 2000);
+        }
+        else {
+            on_finished(data);
+        }
+    });
+}
+
+
 function graph_type_select(event) {
-    var $form, url, div;
+    var $form, url, $button, original_text, restore_button, request_graphs;
     event.preventDefault();
     $form = $(this).parents("#graphtype-select-form");
     url = $form.attr("action");
-    
+
     $button = $("#graph-type-select-submit");
     original_text = $button.attr("value");
     $button.attr("value", "Aan het berekenen...");
     $button.attr("disabled", "true");
     $button.effect("pulsate", {"times": 2}, 2000);
-    
-    $.ajax({
-        url: url,
-        data: $form.serialize(),
-        type: "POST",
-        success: function (data, textStatus, xhr) {
-            $button.attr("value", original_text);
-            $button.removeAttr("disabled");
-            $('div#evenly-spaced-vertical .vertical-item').remove();
-            $.each(data, function (index, val) {
-                // console.log(val);
-                div = $("<div/>").addClass('vertical-item').addClass('img-use-my-size');
-                div.append($("<a/>").addClass('replace-with-image').attr('href', val).attr(
-                    'data-errormsg', 'Waarschijnlijk is niet alle data ingevuld'));
-                // $('div#evenly-spaced-vertical').append(div);
-                div.insertBefore('#adjustment-form');
-            });
-            restretchExistingElements();
-        },
-        error: function (data, textStatus, xhr) {
-            $button.attr("value", original_text);
-            $button.removeAttr("disabled");
-            $('div#evenly-spaced-vertical .vertical-item').remove();
-        }
-    });
+    restore_button = function () {
+        $button.attr("value", original_text);
+        $button.removeAttr("disabled");
+    };
+
+    // The view only returns the urls of the graphs when the waterbalance has
+    // been computed, otherwise it queues the computation and we wait for it.
+    request_graphs = function () {
+        $.ajax({
+            url: url,
+            data: $form.serialize(),
+            type: "POST",
+            success: function (data, textStatus, xhr) {
+                if (data.computed) {
+                    restore_button();
+                    show_graphs(data.graphs);
+                    return;
+                }
+                poll_computation_status($form.attr("data-status-url"),
+                                        function (status) {
+                    if (status.computed) {
+                        request_graphs();
+                    }
+                    else {
+                        restore_button();
+                        report_unfinished_computation(status);
+                    }
+                });
+            },
+            error: function (data, textStatus, xhr) {
+                restore_button();
+                $('div#evenly-spaced-vertical .vertical-item').remove();
+            }
+        });
+    };
+    request_graphs();
 }
 
 
 function recalculate_action(event) {
-    var $form, url, $button, original_text;
+    var $form, url, $button, original_text, restore_button;
     event.preventDefault();
     $form = $("#recalculate-form");
     $button = $("#recalculate-submit");
@@ -53,14 +117,26 @@ function recalculate_action(event) {
     $button.attr("value", "Aan het berekenen...");
     $button.attr("disabled", "true");
     $button.effect("pulsate", {"times": 2}, 2000);
+    restore_button = function () {
+        $button.attr("value", original_text);
+        $button.removeAttr("disabled");
+    };
     $.ajax({
         url: url,
         data: $form.serialize(),
         type: "POST",
+        dataType: "json",
         success: function (data, textStatus, xhr) {
-            $button.attr("value", original_text);
-            $button.removeAttr("disabled");
-            restretchExistingElements();
+            poll_computation_status($form.attr("data-status-url"),
+                                    function (status) {
+                restore_button();
+                report_unfinished_computation(status);
+                reloadGraphs();
+                restretchExistingElements();
+            });
+        },
+        error: function (data, textStatus, xhr) {
+            restore_button();
         }
     });
 }
@@ -25,17 +25,30 @@
 #
 #******************************************************************************
 
+import hashlib
+import itertools
 import logging
 import datetime
+import operator
 
+from functools import wraps
+from StringIO import StringIO
+
+import numpy
+
+from django.conf import settings
 from django.contrib.gis.db import models as gis_models
 from django.contrib.gis.db import models
+from django.db import connections
+from django.db import router
 from django.db import transaction
 from django.db.models import Max
 from django.db.models import Min
+from django.db.models import Sum
 from django.utils.translation import ugettext as _
 from django.template.defaultfilters import slugify
 from django.db.models.signals import pre_save
+from django.db.models.signals import post_delete
 from django.db.models.signals import post_save
 
 from lizard_fewsunblobbed.models import Filter as FewsFilter
@@ -43,9 +56,11 @@ from lizard_fewsunblobbed.models import Location as FewsLocation
 from lizard_fewsunblobbed.models import Parameter as FewsParameter
 from lizard_fewsunblobbed.models import Timeserie as FewsTimeserie
 from lizard_map.models import ColorField
+from lizard_waterbalance.aggregation import DATE_TYPE
+from lizard_waterbalance.aggregation import fill_daily_gaps
+from lizard_waterbalance.aggregation import to_datetimes
+from lizard_waterbalance.cache_lock import LOCK_TIMEOUT
 from lizard_wbcomputation.bucket_types import BucketTypes
-from timeseries.timeseriesstub import daily_events
-from timeseries.timeseriesstub import daily_sticky_events
 from timeseries.timeseriesstub import TimeseriesWithMemoryStub
 from timeseries.timeseriesstub import TimeseriesRestrictedStub
 
@@ -56,8 +71,20 @@ MAXLENGTH_OPENWATER_NAME = 64
 
 logger = logging.getLogger(__name__)
 
-def generate_events(events, default_value, sticky, start_date, end_date):
-    """Return a generator to iterate over all the given events.
+# The following constant specifies the number of events that function
+# insert_events sends to the database in a single statement
+INSERT_BATCH_SIZE = getattr(settings, 'WATERBALANCE_INSERT_BATCH_SIZE', 1000)
+
+# The following constant specifies the number of events that function
+# event_arrays fetches from the database at a time
+EVENT_CHUNK_SIZE = getattr(settings, 'WATERBALANCE_EVENT_CHUNK_SIZE', 10000)
+
+_cursor_names = itertools.count()
+
+
+def generate_events(dates, values, default_value, sticky, start_date,
+                    end_date):
+    """Return an iterator to iterate over the events of the given arrays.
 
     If sticky holds, this method returns values for each day between the
     specified start and end, assuming start and end are not None. This means
@@ -66,28 +93,89 @@ def generate_events(events, default_value, sticky, start_date, end_date):
     exists, this method returns the value of the last event or if not present,
     the default value.
 
+    The gaps are filled in on the arrays, see function
+    lizard_waterbalance.aggregation.fill_daily_gaps.
+
     """
-    if sticky:
-        if start_date is None or end_date is None:
-            date_before_first_event = False
-        else:
-            date_before_first_event = True
-            date = start_date
-        value = default_value
-        for event_date, event_value in daily_sticky_events(events):
-            while date_before_first_event and date < event_date:
-                yield date, default_value
-                date = date + datetime.timedelta(1)
-            yield event_date, event_value
-            date_before_first_event = False
-            date = event_date + datetime.timedelta(1)
-            value = event_value
-        while end_date is not None and date <= end_date:
-            yield date, value
-            date = date + datetime.timedelta(1)
-    else:
-        for date, value in daily_events(events, default_value=default_value):
-            yield date, value
+    dates, values = fill_daily_gaps(dates, values, default_value, sticky,
+                                    start_date, end_date)
+    return itertools.izip(to_datetimes(dates), values.tolist())
+
+
+def event_arrays(events, date_field, value_field, start_date, end_date,
+                 chunk_size=None):
+    """Return the pair of the date array and value array of the given events.
+
+    Parameter *events* is the QuerySet of the events and parameters
+    *date_field* and *value_field* are the names of the fields that contain
+    the date and the value of an event. The arrays only contain the events
+    between the given start and end, where a start or end of None means that
+    there is no restriction, ordered by date. A missing value is NaN.
+
+    The (date, value) rows are fetched in chunks of chunk_size rows, by default
+    EVENT_CHUNK_SIZE. On PostgreSQL, the chunks come from a server-side
+    cursor, so the rows are never all in memory as Python tuples.
+
+    """
+    if chunk_size is None:
+        chunk_size = EVENT_CHUNK_SIZE
+    events = events.order_by(date_field)
+    if not start_date is None:
+        events = events.filter(**{'%s__gte' % date_field: start_date})
+    if not end_date is None:
+        events = events.filter(**{'%s__lte' % date_field: end_date})
+    events = events.values_list(date_field, value_field)
+    sql, params = events.query.get_compiler(using=events.db).as_sql()
+
+    connection = connections[events.db]
+    cursor = connection.cursor()
+    if 'postg' in connection.settings_dict['ENGINE']:
+        # the named cursor has to return the same datetimes as the cursors
+        # that Django creates
+        tzinfo_factory = getattr(cursor, 'cursor', cursor).tzinfo_factory
+        cursor = connection.connection.cursor('event_arrays_%d' %
+                                              _cursor_names.next())
+        cursor.tzinfo_factory = tzinfo_factory
+
+    date_chunks = [numpy.zeros(0, dtype=DATE_TYPE)]
+    value_chunks = [numpy.zeros(0)]
+    try:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            dates, values = zip(*rows)
+            date_chunks.append(numpy.array(dates, dtype=DATE_TYPE))
+            value_chunks.append(numpy.array(values, dtype=float))
+    finally:
+        cursor.close()
+    return numpy.concatenate(date_chunks), numpy.concatenate(value_chunks)
+
+
+def model_state(instance):
+    """Return the list of (field name, value) pairs of the given model instance.
+
+    """
+    return [(field.attname, getattr(instance, field.attname))
+            for field in instance._meta.fields]
+
+
+def invalidates_map(function):
+    """Decorate the function to invalidate the map data when it returns.
+
+    Apply this decorator around the decorator that commits the transaction
+    of the function, so other processes only reload the data of the map
+    after the changes have been committed, see map_cache.invalidate.
+
+    """
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        result = function(*args, **kwargs)
+        from lizard_waterbalance.map_cache import invalidate
+        invalidate()
+        return result
+    return wrapper
 
 
 class IncompleteData(Exception):
@@ -128,21 +216,18 @@ class Timeseries(models.Model):
         verbose_name_plural = _("7a Tijdreeksen")
 
     def raw_events(self, start_date=None, end_date=None):
-        """Return a generator to iterate over all events.
+        """Return an iterator to iterate over all events.
 
-        The generator iterates over the events in the order they were added. If
+        The iterator iterates over the events in the order they were added. If
         dates are missing in between two successive events, this function does
         not fill in the missing dates with value.
 
         """
-        events = self.timeseries_events.filter().order_by('time')
-        if start_date:
-            events = events.filter(time__gte=start_date)
-        if end_date:
-            events = events.filter(time__lte=end_date)
-
-        for event in events:
-            yield event.time, event.value
+        # a start or end date that evaluates to False means no restriction
+        dates, values = event_arrays(self.timeseries_events.all(),
+                                     'time', 'value',
+                                     start_date or None, end_date or None)
+        return itertools.izip(to_datetimes(dates), values.tolist())
 
     def get_last_event(self):
         """return event with latest datetime"""
@@ -159,14 +244,13 @@ class Timeseries(models.Model):
 
 
     def events(self, start_date=None, end_date=None):
-        """Return a generator to iterate over all daily events.
+        """Return an iterator to iterate over all daily events.
 
-        The generator iterates over the events in the order they were added. If
+        The iterator iterates over the events in the order they were added. If
         dates are missing in between two successive events, this function fills
         in the missing dates. Which value is inserted depends on the values of
         self.stick_to_last_value and self.default, for details also see the doc
-        string of functions timeseries.daily_events and
-        timeseries.daily_sticky_events.
+        string of function generate_events.
 
         If self.stick_to_last_value holds, this method returns values for each
         day between the specified start and end, assuming start and end are not
@@ -180,30 +264,31 @@ class Timeseries(models.Model):
            for method TimeseriesFews.events.
 
         """
-        ts_events = self.timeseries_events.filter().order_by('time')
-        if not start_date is None:
-            ts_events = ts_events.filter(time__gte=start_date)
-        if not end_date is None:
-            ts_events = ts_events.filter(time__lte=end_date)
-
-        events = ((event.time, event.value) for event in ts_events)
-        for date, value in generate_events(events, self.default_value,
-                                           self.stick_to_last_value,
-                                           start_date, end_date):
-            yield date, value
+        dates, values = event_arrays(self.timeseries_events.all(),
+                                     'time', 'value', start_date, end_date)
+        return generate_events(dates, values, self.default_value,
+                               self.stick_to_last_value, start_date, end_date)
 
+    @invalidates_map
     @transaction.commit_manually
-    def save_timeserie_stub(self,timeserie_stub):
+    def save_timeserie_stub(self, timeserie_stub, batch_size=None):
         """Save a timeserie_stub into the database
 
-        We need some performance boost on this function
+        The events are inserted in batches, see function insert_events. The
+        monthly values of the map are refreshed in the same transaction, see
+        AreaMonthValue.refresh, and the map data is invalidated after the
+        commit.
         #first clear?
         """
-        for date, value in timeserie_stub.raw_events():
-            ts = TimeseriesEvent(time=date, value=value, timeseries=self)
-            ts.save()
-
-        transaction.commit()
+        try:
+            insert_events(self, timeserie_stub.raw_events(), batch_size)
+            for wb_timeserie in self.wb_local.all():
+                AreaMonthValue.refresh(wb_timeserie)
+        except:
+            transaction.rollback()
+            raise
+        else:
+            transaction.commit()
 
     def times_values(self, start_date, end_date):
         """
@@ -247,6 +332,83 @@ class TimeseriesEvent(models.Model):
         return u'Event %s: (%s, %s)' % (self.timeseries, self.time, self.value)
 
 
+def insert_events(timeseries, events, batch_size=None):
+    """Insert the given events as TimeseriesEvent(s) of the given Timeseries.
+
+    Parameters:
+    * timeseries -- Timeseries to which the events belong
+    * events -- iterable of (date time, value) pairs
+    * batch_size -- maximum number of events to send to the database in a
+      single statement, by default INSERT_BATCH_SIZE
+
+    On PostgreSQL, this function streams the events to the database using
+    COPY. On other databases, it inserts each batch of events using a single
+    executemany.
+
+    Within a managed transaction, the caller is responsible for the commit.
+    Outside of one, this function commits the inserted events. This function
+    returns the number of inserted events.
+
+    """
+    if batch_size is None:
+        batch_size = INSERT_BATCH_SIZE
+    using = router.db_for_write(TimeseriesEvent)
+    connection = connections[using]
+    cursor = connection.cursor()
+
+    meta = TimeseriesEvent._meta
+    table = meta.db_table
+    columns = [meta.get_field(name).column
+               for name in ('time', 'value', 'timeseries')]
+
+    if 'postg' in connection.settings_dict['ENGINE']:
+        write_batch = lambda batch: _copy_events(cursor, table, columns, batch)
+    else:
+        sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+            connection.ops.quote_name(table),
+            ', '.join(connection.ops.quote_name(column) for column in columns),
+            ', '.join(['%s'] * len(columns)))
+        write_batch = lambda batch: cursor.executemany(sql, batch)
+
+    count = 0
+    batch = []
+    for date, value in events:
+        batch.append((date, value, timeseries.pk))
+        if len(batch) == batch_size:
+            write_batch(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        write_batch(batch)
+        count += len(batch)
+
+    if transaction.is_managed(using=using):
+        transaction.set_dirty(using=using)
+    else:
+        transaction.commit_unless_managed(using=using)
+    logger.debug('inserted %d events for timeseries %s', count, timeseries.pk)
+    return count
+
+
+def _copy_events(cursor, table, columns, rows):
+    """Send the given rows to the given table using PostgreSQL COPY."""
+    stream = StringIO()
+    for row in rows:
+        stream.write('\t'.join(_copy_value(value) for value in row))
+        stream.write('\n')
+    stream.seek(0)
+    cursor.copy_from(stream, table, columns=columns)
+
+
+def _copy_value(value):
+    """Return the text representation of the given value for COPY."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(' ')
+    return repr(value)
+
+
 class TimeseriesFews(models.Model):
     """Specifies a time series in a Fews unblobbed database.
 
@@ -341,23 +503,36 @@ class TimeseriesFews(models.Model):
 
         return fews_timeseries
 
+    def event_state(self):
+        """Return a summary of the current state of the events.
+
+        The summary consists of the settings of the current TimeseriesFews and
+        the date and time of the last event. When no Fews time series exists,
+        the summary only contains the settings.
+
+        """
+        state = model_state(self)
+        try:
+            fews_timeseries = self._get_fews_timeserie_object()
+        except IncompleteData:
+            return state
+        # only the maximum, which the index on the time answers without
+        # visiting all events
+        events = fews_timeseries.timeseriedata.all().order_by()
+        return state + sorted(events.aggregate(Max('tsd_time')).items())
+
     def raw_events(self, start_date=None, end_date=None):
-        """Return a generator to iterate over all events.
+        """Return an iterator to iterate over all events.
 
         If dates are missing in between two successive events, this function
         does not fill in the missing dates with a value.
 
         """
         fews_timeseries = self._get_fews_timeserie_object()
-
-        ts_events = fews_timeseries.timeseriedata.filter().order_by('tsd_time')
-        if not start_date is None:
-            ts_events = ts_events.filter(tsd_time__gte=start_date)
-        if not end_date is None:
-            ts_events = ts_events.filter(tsd_time__lte=end_date)
-
-        for event in ts_events:
-            yield event.tsd_time, event.tsd_value
+        dates, values = event_arrays(fews_timeseries.timeseriedata.all(),
+                                     'tsd_time', 'tsd_value',
+                                     start_date, end_date)
+        return itertools.izip(to_datetimes(dates), values.tolist())
 
     def events(self, start_date=None, end_date=None):
         """Return a generator to iterate over all daily events.
@@ -369,18 +544,13 @@ class TimeseriesFews(models.Model):
 
         """
         fews_timeseries = self._get_fews_timeserie_object()
-
-        ts_events = fews_timeseries.timeseriedata.filter().order_by('tsd_time')
-        if not start_date is None:
-            ts_events = ts_events.filter(tsd_time__gte=start_date)
-        if not end_date is None:
-            ts_events = ts_events.filter(tsd_time__lte=end_date)
-
-        events = ((event.tsd_time, event.tsd_value) for event in ts_events)
-        for date, value in generate_events(events, self.default_value,
+        dates, values = event_arrays(fews_timeseries.timeseriedata.all(),
+                                     'tsd_time', 'tsd_value',
+                                     start_date, end_date)
+        for date, value in generate_events(dates, values, self.default_value,
                                            self.stick_to_last_value,
                                            start_date, end_date):
-            if date is not None and value is not None:
+            if not numpy.isnan(value):
                 yield date, value
 
 
@@ -451,6 +621,69 @@ class Parameter(models.Model):
         self.slug = slugify(self.name)
         super(Parameter, self).save(*args, **kwargs)
 
+def sum_abs_events(timeseries_list):
+    """Return the daily sum of the absolute values of the given time series.
+
+    Each time series should be a Timeseries or TimeseriesFews that is not
+    sticky and whose default value is 0. The database computes the sums of the
+    time series in the same database in a single aggregate query per sign.
+    Just as method events of such a time series, this function inserts a 0
+    value for each missing day between the first and last event of each time
+    series.
+
+    This function returns the list of (date, value) pairs ordered by date.
+
+    """
+    sums = {}
+    local = [ts for ts in timeseries_list if isinstance(ts, Timeseries)]
+    if local:
+        events = TimeseriesEvent.objects.filter(timeseries__in=local)
+        _add_abs_sums(sums, events, 'time', 'value')
+        ranges = events.order_by().values('timeseries').annotate(
+            Min('time'), Max('time'))
+        for dt_range in ranges:
+            _fill_daily_range(sums, dt_range['time__min'],
+                              dt_range['time__max'])
+    fews = [ts._get_fews_timeserie_object() for ts in timeseries_list
+            if isinstance(ts, TimeseriesFews)]
+    if fews:
+        events = reduce(operator.or_,
+                        [fews_ts.timeseriedata.all() for fews_ts in fews])
+        _add_abs_sums(sums, events, 'tsd_time', 'tsd_value')
+        for fews_ts in fews:
+            dt_range = fews_ts.timeseriedata.aggregate(
+                Min('tsd_time'), Max('tsd_time'))
+            _fill_daily_range(sums, dt_range['tsd_time__min'],
+                              dt_range['tsd_time__max'])
+    return sorted(sums.items())
+
+
+def _add_abs_sums(sums, events, date_field, value_field):
+    """Add the absolute values of the given events to the given dict.
+
+    The positive and the negative values are summed per date by the database
+    in two separate queries.
+
+    """
+    events = events.order_by()
+    for sign, lookup in ((1.0, '%s__gt'), (-1.0, '%s__lt')):
+        totals = events.filter(**{lookup % value_field: 0}).values(
+            date_field).annotate(total=Sum(value_field))
+        for total in totals:
+            date = total[date_field]
+            sums[date] = sums.get(date, 0.0) + sign * total['total']
+
+
+def _fill_daily_range(sums, first, last):
+    """Add a 0 value for each day from first to last that has no value."""
+    if first is None:
+        return
+    date = first
+    while date <= last:
+        sums.setdefault(date, 0.0)
+        date += datetime.timedelta(1)
+
+
 class WaterbalanceTimeserie(models.Model):
     """Implements a time series.
 
@@ -582,10 +815,12 @@ class WaterbalanceTimeserie(models.Model):
         return dt >= dt_min and dt <= dt_max
 
     @classmethod
+    @invalidates_map
     @transaction.commit_on_success()
     def create(cls, name, parameter, timeseries,
                configuration=None, timestep=None,
-               hint_datetime_start=None, hint_datetime_end=None):
+               hint_datetime_start=None, hint_datetime_end=None,
+               batch_size=None):
         """
         Create a local timeserie.
 
@@ -593,6 +828,9 @@ class WaterbalanceTimeserie(models.Model):
         configuration and timestep.
 
         timeserie is a dict with key=datetime, value=value
+
+        The events are inserted in batches of batch_size events, see
+        function insert_events.
         """
         existing_timeseries = WaterbalanceTimeserie.objects.filter(
             name=name,
@@ -612,16 +850,7 @@ class WaterbalanceTimeserie(models.Model):
         ts_name = '%s (%s)' % (name, configuration)
         local_timeseries = Timeseries(name=ts_name[:64])
         local_timeseries.save()
-        counter = 0
-        counter_report = 1000
-        for key, value in timeseries.items():
-            local_timeseries.timeseries_events.create(
-                time=key,
-                value=value)
-            counter += 1
-            if counter % counter_report == 0:
-                logger.debug('record %d' % counter)
-                counter_report = min(counter * 2, 10000)
+        insert_events(local_timeseries, timeseries.iteritems(), batch_size)
         wb_ts = WaterbalanceTimeserie(
             name=name,
             parameter=parameter,
@@ -1242,6 +1471,32 @@ class WaterbalanceArea(gis_models.Model):
         return unicode(self.name)
 
 
+class WaterbalanceShape(gis_models.Model):
+    """Specifies the geometry of a WaterbalanceArea on the map.
+
+    The geometries are stored in a table of their own, which has a spatial
+    index, so the map layer of the waterbalance finds the area at a location
+    with a single indexed read.
+
+    Instance variables:
+    * area -- WaterbalanceArea of the geometry
+    * geom -- geometry of the area in WGS84
+
+    """
+    class Meta:
+        db_table = 'waterbalance_shape'
+        verbose_name = _("Waterbalans gebied geometrie")
+        verbose_name_plural = _("Waterbalans gebied geometrieen")
+
+    area = models.OneToOneField(WaterbalanceArea, related_name='shape')
+    geom = gis_models.MultiPolygonField(srid=4326, spatial_index=True)
+
+    objects = gis_models.GeoManager()
+
+    def __unicode__(self):
+        return unicode(self.area)
+
+
 def load_shapefile(shapefile_name, name_field, source_epsg):
      """ Load shapefile into waterbalance areas and update geometry if name exist
      Instance variables:
@@ -1255,6 +1510,7 @@ def load_shapefile(shapefile_name, name_field, source_epsg):
      """
      from osgeo import ogr  #, osr
      from django.contrib.gis.geos import GEOSGeometry, MultiPolygon
+     from lizard_waterbalance.map_cache import invalidate
 
      #original SRS
      oSRS=ogr.osr.SpatialReference()
@@ -1290,14 +1546,16 @@ def load_shapefile(shapefile_name, name_field, source_epsg):
              geometry = GEOSGeometry(geom.ExportToWkt(), srid=4326)
              if geometry.geom_type == 'Polygon':
                  geometry = MultiPolygon(geometry)
-             wb_area, new = WaterbalanceArea.objects.get_or_create(name=name, defaults={'geom':geometry})
-             if not new:
-
-                 #update geometry
-                 wb_area.geom = geometry
-             else:
+             wb_area, new = WaterbalanceArea.objects.get_or_create(name=name)
+             if new:
                  logger.debug('new area: %s'%name)
-             wb_area.save()
+             #update geometry
+             shape, new = WaterbalanceShape.objects.get_or_create(
+                 area=wb_area, defaults={'geom': geometry})
+             if not new:
+                 shape.geom = geometry
+                 shape.save()
+     invalidate()
 
 
 class WaterbalanceConf(models.Model):
@@ -1413,6 +1671,57 @@ class WaterbalanceConf(models.Model):
         open_water = self._retrieve_open_water()
         return open_water.sobekbuckets.all()
 
+    def fingerprint(self):
+        """Return a hash of the input of the computation of this configuration.
+
+        The hash changes when one of the settings of the configuration, its
+        open water, buckets, pumping stations, pump lines or concentrations
+        changes. It also changes when the events of one of its local input
+        time series are stored again, as they get new ids, or when the date of
+        the last event of one of its FEWS input time series changes.
+
+        """
+        instances = [self]
+        if self.open_water is not None:
+            instances.append(self.open_water)
+            instances.extend(self.open_water.buckets.all())
+            stations = list(self.open_water.pumping_stations.all())
+            instances.extend(stations)
+            instances.extend(
+                PumpLine.objects.filter(pumping_station__in=stations))
+        instances.extend(self.config_concentrations.all())
+
+        digest = hashlib.md5()
+        timeseries_ids = set(self.references.values_list('pk', flat=True))
+        for instance in instances:
+            digest.update(repr((instance.__class__.__name__,
+                                model_state(instance))))
+            for field in instance._meta.fields:
+                if isinstance(field, models.ForeignKey) and \
+                       field.rel.to is WaterbalanceTimeserie:
+                    timeseries_id = getattr(instance, field.attname)
+                    if timeseries_id is not None:
+                        timeseries_ids.add(timeseries_id)
+
+        local_ids = []
+        wb_timeseries = WaterbalanceTimeserie.objects.filter(
+            pk__in=timeseries_ids).order_by('pk')
+        for wb_ts in wb_timeseries.select_related('fews_timeseries'):
+            digest.update(repr(model_state(wb_ts)))
+            if wb_ts.use_fews:
+                digest.update(repr(wb_ts.fews_timeseries.event_state()))
+            elif wb_ts.local_timeseries_id is not None:
+                local_ids.append(wb_ts.local_timeseries_id)
+        local_timeseries = Timeseries.objects.filter(pk__in=local_ids)
+        for timeseries in local_timeseries.order_by('pk'):
+            digest.update(repr(model_state(timeseries)))
+        # the ids increase, so the maximum id changes whenever events are
+        # added and the primary key index answers it without counting
+        last_event = TimeseriesEvent.objects.filter(
+            timeseries__in=local_ids).order_by().aggregate(Max('id'))
+        digest.update(repr(last_event['id__max']))
+        return digest.hexdigest()
+
 
 class Label(models.Model):
     """Specifies the labels of a water balance and their color.
@@ -1524,6 +1833,262 @@ class Concentration(models.Model):
     def __unicode__(self):
         return "%s - %s" % (self.configuration.__unicode__(), self.label.name)
 
+
+class ComputationJob(models.Model):
+    """Specifies a request to compute the waterbalance of a configuration.
+
+    The views enqueue a job instead of computing the waterbalance themselves.
+    A worker process, see management command compute_worker, claims the
+    queued jobs one by one and stores the computed results in the cache.
+
+    Instance variables:
+    * configuration -- WaterbalanceConf to compute
+    * status -- queued, running, done or failed
+    * created -- date and time the job was enqueued
+    * started -- date and time a worker claimed the job
+    * finished -- date and time the worker finished the job
+    * message -- error message when the job has failed
+
+    """
+
+    class Meta:
+        verbose_name = _("Computation job")
+        verbose_name_plural = _("Computation jobs")
+        ordering = ('created', 'id')
+
+    STATUS_QUEUED = 0
+    STATUS_RUNNING = 1
+    STATUS_DONE = 2
+    STATUS_FAILED = 3
+
+    STATUSES = ((STATUS_QUEUED, 'queued'),
+                (STATUS_RUNNING, 'running'),
+                (STATUS_DONE, 'done'),
+                (STATUS_FAILED, 'failed'))
+
+    configuration = models.ForeignKey(WaterbalanceConf,
+                                      related_name='computation_jobs')
+    status = models.IntegerField(choices=STATUSES, default=STATUS_QUEUED)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    message = models.TextField(blank=True, default='')
+
+    def __unicode__(self):
+        return "%s - %s" % (self.configuration.__unicode__(),
+                            self.get_status_display())
+
+    @classmethod
+    def enqueue(cls, configuration):
+        """Return the queued job for the given configuration.
+
+        When the configuration already has a job that is queued, this method
+        returns that job so a configuration is never queued twice.
+
+        """
+        jobs = cls.objects.filter(configuration=configuration,
+                                  status=cls.STATUS_QUEUED)
+        try:
+            return jobs[0]
+        except IndexError:
+            return cls.objects.create(configuration=configuration)
+
+    @classmethod
+    def latest(cls, configuration):
+        """Return the most recent job of the given configuration or None."""
+        jobs = cls.objects.filter(configuration=configuration)
+        try:
+            return jobs.order_by('-created', '-id')[0]
+        except IndexError:
+            return None
+
+    @classmethod
+    def claim_next(cls):
+        """Claim the oldest queued job and return it, or None if there is none.
+
+        A job is claimed by a single update that only succeeds when the job is
+        still queued, so multiple workers never claim the same job.
+
+        """
+        for job in cls.objects.filter(status=cls.STATUS_QUEUED):
+            started = datetime.datetime.now()
+            claimed = cls.objects.filter(pk=job.pk, status=cls.STATUS_QUEUED)
+            if claimed.update(status=cls.STATUS_RUNNING, started=started):
+                job.status = cls.STATUS_RUNNING
+                job.started = started
+                return job
+        return None
+
+    def finish(self, message=None):
+        """Mark the job as done or, when a message is given, as failed."""
+        if message is None:
+            self.status = self.STATUS_DONE
+        else:
+            self.status = self.STATUS_FAILED
+            self.message = message
+        self.finished = datetime.datetime.now()
+        self.save()
+
+    def is_pending(self):
+        return self.status in (self.STATUS_QUEUED, self.STATUS_RUNNING)
+
+    @classmethod
+    def fail_stale(cls):
+        """Mark the jobs that have been running for too long as failed.
+
+        A worker that crashes leaves its job running. The worker holds the
+        computation lock of the configuration during the job, so a job that
+        has been running longer than that lock can be held, LOCK_TIMEOUT, is
+        considered lost. This method returns the number of these jobs.
+
+        """
+        now = datetime.datetime.now()
+        limit = now - datetime.timedelta(seconds=LOCK_TIMEOUT)
+        stale_jobs = cls.objects.filter(status=cls.STATUS_RUNNING,
+                                        started__lt=limit)
+        return stale_jobs.update(
+            status=cls.STATUS_FAILED, finished=now,
+            message="the worker did not finish the job within %d seconds" %
+            LOCK_TIMEOUT)
+
+
+class AreaMonthValue(models.Model):
+    """Specifies the value of a parameter of a configuration for a single month.
+
+    The map layer of the waterbalance colors each area by the value of the
+    selected parameter in the selected month. These values are copied from the
+    monthly WaterbalanceTimeserie(s) of each configuration to this table, so
+    the map layer reads them with a single indexed query instead of joining
+    the configurations, time series and events for each tile. The copy is
+    refreshed each time a monthly WaterbalanceTimeserie or its events are
+    saved, see method refresh, and the copied values are removed when the
+    WaterbalanceTimeserie is deleted. Code that replaces the events of a
+    monthly WaterbalanceTimeserie saves that time series afterwards, which
+    refreshes its values.
+
+    Each configuration has its own values. When an area has multiple
+    configurations with a value for the same month, the map shows the value
+    of the configuration whose scenario comes first, see method map_values.
+
+    Instance variables:
+    * configuration -- WaterbalanceConf of the value
+    * area -- WaterbalanceArea of the configuration
+    * parameter -- Parameter of the value
+    * month -- first day of the month of the value
+    * value -- value of the parameter in that month
+
+    """
+    class Meta:
+        verbose_name = _("Maandwaarde van gebied")
+        verbose_name_plural = _("Maandwaarden van gebieden")
+        unique_together = (('parameter', 'month', 'configuration'),)
+
+    configuration = models.ForeignKey(WaterbalanceConf,
+                                      related_name='month_values')
+    area = models.ForeignKey(WaterbalanceArea, related_name='month_values')
+    parameter = models.ForeignKey(Parameter)
+    month = models.DateField()
+    value = models.FloatField()
+
+    def __unicode__(self):
+        return u'%s - %s (%s): %s' % (self.configuration, self.parameter,
+                                      self.month, self.value)
+
+    @classmethod
+    def map_values(cls, parameter_id, area_id):
+        """Return the dict of month to value of the given parameter and area.
+
+        The value of each month is the value of the configuration whose
+        scenario comes first in the ordering of the scenarios.
+
+        """
+        rows = cls.objects.filter(parameter=parameter_id, area=area_id). \
+               order_by('configuration__waterbalance_scenario__order',
+                        'configuration__waterbalance_scenario__id'). \
+               values_list('month', 'value')
+        values = {}
+        for month, value in rows:
+            values.setdefault(month, value)
+        return values
+
+    @classmethod
+    def refresh(cls, wb_timeserie):
+        """Copy the monthly values of the given WaterbalanceTimeserie.
+
+        This method replaces the values of the configuration and parameter of
+        the given time series. It only copies the values of a
+        WaterbalanceTimeserie that belongs to a configuration and that has a
+        monthly time step, as these are the time series shown on the map. It
+        returns the number of copied values.
+
+        When the caller manages the transaction, it is responsible to commit
+        it and to invalidate the map data after the commit, for example with
+        decorator invalidates_map. Otherwise this method commits the changes
+        and invalidates the map data itself.
+
+        """
+        if not cls.is_shown(wb_timeserie):
+            return 0
+        configuration = wb_timeserie.configuration
+        parameter_id = wb_timeserie.parameter_id
+        cls.objects.filter(configuration=configuration.id,
+                           parameter=parameter_id).delete()
+
+        timeseries = wb_timeserie.get_timeseries()
+        rows = []
+        if timeseries is not None:
+            values = {}
+            for date, value in timeseries.raw_events():
+                values[datetime.date(date.year, date.month, 1)] = value
+            rows = [(configuration.id, configuration.waterbalance_area_id,
+                     parameter_id, month, value)
+                    for month, value in sorted(values.items())]
+
+        using = router.db_for_write(cls)
+        if rows:
+            connection = connections[using]
+            meta = cls._meta
+            columns = [meta.get_field(name).column for name in
+                       ('configuration', 'area', 'parameter', 'month',
+                        'value')]
+            sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+                connection.ops.quote_name(meta.db_table),
+                ', '.join(connection.ops.quote_name(column)
+                          for column in columns),
+                ', '.join(['%s'] * len(columns)))
+            connection.cursor().executemany(sql, rows)
+        cls._commit(using)
+        return len(rows)
+
+    @classmethod
+    def remove(cls, wb_timeserie):
+        """Remove the copied values of the given WaterbalanceTimeserie.
+
+        As method refresh, this method commits the changes itself when the
+        caller does not manage the transaction.
+
+        """
+        if not cls.is_shown(wb_timeserie):
+            return
+        cls.objects.filter(configuration=wb_timeserie.configuration_id,
+                           parameter=wb_timeserie.parameter_id).delete()
+        cls._commit(router.db_for_write(cls))
+
+    @staticmethod
+    def is_shown(wb_timeserie):
+        """Return True iff the WaterbalanceTimeserie is shown on the map."""
+        return wb_timeserie.timestep == WaterbalanceTimeserie.TIMESTEP_MONTH \
+               and wb_timeserie.configuration_id is not None
+
+    @staticmethod
+    def _commit(using):
+        if transaction.is_managed(using=using):
+            transaction.set_dirty(using=using)
+        else:
+            transaction.commit_unless_managed(using=using)
+            from lizard_waterbalance.map_cache import invalidate
+            invalidate()
+
 #@receiver(pre_save, sender=Parameter) #werkt pas vanaf versie 1.3
 def pre_save_slug(*args, **kwargs):
     logger.debug('created slug for %s'%str(kwargs['instance'].name))
@@ -1586,8 +2151,21 @@ def post_save_configuration(*args, **kwargs):
         except Label.DoesNotExist:
             pass
 
+def post_save_waterbalance_timeserie(*args, **kwargs):
+    """Refresh the monthly values of the saved WaterbalanceTimeserie."""
+    AreaMonthValue.refresh(kwargs['instance'])
+
+def post_delete_waterbalance_timeserie(*args, **kwargs):
+    """Remove the monthly values of the deleted WaterbalanceTimeserie."""
+    AreaMonthValue.remove(kwargs['instance'])
+
+
 pre_save.connect(pre_save_slug, sender=Parameter)
 pre_save.connect(pre_save_slug, sender=WaterbalanceArea)
 pre_save.connect(pre_save_slug, sender=WaterbalanceScenario)
 pre_save.connect(pre_save_configuration, sender=WaterbalanceConf)
 post_save.connect(post_save_configuration, sender=WaterbalanceConf)
+post_save.connect(post_save_waterbalance_timeserie,
+                  sender=WaterbalanceTimeserie)
+post_delete.connect(post_delete_waterbalance_timeserie,
+                    sender=WaterbalanceTimeserie)
@@ -25,11 +25,27 @@
 #
 #******************************************************************************
 
+from datetime import date
 from datetime import datetime
+from datetime import timedelta
 from unittest import TestCase
 
+from timeseries.timeseriesstub import SparseTimeseriesStub
+
+from lizard_waterbalance.aggregation import to_datetimes
+from lizard_waterbalance.cache_lock import LOCK_TIMEOUT
+from lizard_waterbalance.models import AreaMonthValue
+from lizard_waterbalance.models import ComputationJob
+from lizard_waterbalance.models import Parameter
 from lizard_waterbalance.models import Timeseries
 from lizard_waterbalance.models import TimeseriesEvent
+from lizard_waterbalance.models import WaterbalanceArea
+from lizard_waterbalance.models import WaterbalanceConf
+from lizard_waterbalance.models import WaterbalanceScenario
+from lizard_waterbalance.models import WaterbalanceTimeserie
+from lizard_waterbalance.models import event_arrays
+from lizard_waterbalance.models import insert_events
+from lizard_waterbalance.models import sum_abs_events
 
 
 class TimeseriesTests(TestCase):
@@ -122,3 +138,219 @@ class TimeseriesTests(TestCase):
                            (datetime(2011, 4, 9), 10.0)]
         self.assertEqual(expected_events, list(events))
 
+    def test_f(self):
+        """Test a sticky Timeseries fills a gap with the previous value."""
+        timeseries = Timeseries()
+        timeseries.stick_to_last_value = True
+        timeseries.save()
+        insert_events(timeseries, [(datetime(2011, 4, 5), 1.0),
+                                   (datetime(2011, 4, 8), 2.0)])
+        expected_events = [(datetime(2011, 4, 5), 1.0),
+                           (datetime(2011, 4, 6), 1.0),
+                           (datetime(2011, 4, 7), 1.0),
+                           (datetime(2011, 4, 8), 2.0)]
+        self.assertEqual(expected_events, list(timeseries.events()))
+
+    def test_g(self):
+        """Test the events are the same when fetched in small chunks."""
+        timeseries = self.setup_timeseries()
+        dates, values = event_arrays(timeseries.timeseries_events.all(),
+                                     'time', 'value', datetime(2011, 4, 6),
+                                     None, chunk_size=2)
+        self.assertEqual([datetime(2011, 4, day) for day in range(6, 10)],
+                         to_datetimes(dates))
+        self.assertEqual([10.0] * 4, values.tolist())
+
+
+
+class InsertEventsTests(TestCase):
+
+    def setUp(self):
+        self.timeseries = Timeseries()
+        self.timeseries.save()
+        self.events = [(datetime(2011, 4, day), float(day))
+                       for day in range(5, 10)]
+
+    def test_a(self):
+        """Test insert_events stores all events in several batches."""
+        count = insert_events(self.timeseries, self.events, batch_size=2)
+        self.assertEqual(5, count)
+        self.assertEqual(self.events, list(self.timeseries.events()))
+
+    def test_b(self):
+        """Test insert_events stores nothing when there are no events."""
+        self.assertEqual(0, insert_events(self.timeseries, []))
+        self.assertEqual([], list(self.timeseries.events()))
+
+
+class SumAbsEventsTests(TestCase):
+
+    def setup_timeseries(self, events):
+        timeseries = Timeseries()
+        timeseries.save()
+        insert_events(timeseries, events)
+        return timeseries
+
+    def test_a(self):
+        """Test sum_abs_events sums the absolute values per date."""
+        first = self.setup_timeseries([(datetime(2011, 4, 5), 2.0),
+                                       (datetime(2011, 4, 6), -3.0)])
+        second = self.setup_timeseries([(datetime(2011, 4, 6), -1.0),
+                                        (datetime(2011, 4, 7), 4.0)])
+        expected_events = [(datetime(2011, 4, 5), 2.0),
+                           (datetime(2011, 4, 6), 4.0),
+                           (datetime(2011, 4, 7), 4.0)]
+        self.assertEqual(expected_events, sum_abs_events([first, second]))
+
+    def test_b(self):
+        """Test sum_abs_events fills in the missing days with 0."""
+        timeseries = self.setup_timeseries([(datetime(2011, 4, 5), 2.0),
+                                            (datetime(2011, 4, 7), 1.0)])
+        expected_events = [(datetime(2011, 4, 5), 2.0),
+                           (datetime(2011, 4, 6), 0.0),
+                           (datetime(2011, 4, 7), 1.0)]
+        self.assertEqual(expected_events, sum_abs_events([timeseries]))
+
+
+class ComputationJobTests(TestCase):
+
+    def setUp(self):
+        area = WaterbalanceArea()
+        area.name = "WaterbalanceArea for ComputationJobTests"
+        area.save()
+        scenario = WaterbalanceScenario()
+        scenario.name = "WaterbalanceScenario for ComputationJobTests"
+        scenario.save()
+        self.configuration = WaterbalanceConf()
+        self.configuration.waterbalance_area = area
+        self.configuration.waterbalance_scenario = scenario
+        self.configuration.save()
+
+    def test_a(self):
+        """Test a configuration that is already queued is not queued again."""
+        job = ComputationJob.enqueue(self.configuration)
+        self.assertEqual(job, ComputationJob.enqueue(self.configuration))
+        self.assertEqual(1, self.configuration.computation_jobs.count())
+
+    def test_b(self):
+        """Test a queued job is claimed only once."""
+        job = ComputationJob.enqueue(self.configuration)
+        claimed_job = ComputationJob.claim_next()
+        self.assertEqual(job, claimed_job)
+        self.assertEqual(ComputationJob.STATUS_RUNNING, claimed_job.status)
+        self.assertEqual(None, ComputationJob.claim_next())
+
+    def test_c(self):
+        """Test a job with a message is marked as failed."""
+        ComputationJob.enqueue(self.configuration)
+        job = ComputationJob.claim_next()
+        job.finish(message="no data")
+        job = ComputationJob.latest(self.configuration)
+        self.assertEqual(ComputationJob.STATUS_FAILED, job.status)
+        self.assertEqual("no data", job.message)
+        self.assertFalse(job.is_pending())
+
+    def test_d(self):
+        """Test a job that has been running for too long is marked as failed."""
+        ComputationJob.enqueue(self.configuration)
+        job = ComputationJob.claim_next()
+        self.assertEqual(0, ComputationJob.fail_stale())
+        job.started -= timedelta(seconds=LOCK_TIMEOUT + 1)
+        job.save()
+        self.assertEqual(1, ComputationJob.fail_stale())
+        job = ComputationJob.latest(self.configuration)
+        self.assertEqual(ComputationJob.STATUS_FAILED, job.status)
+        self.assertFalse(job.is_pending())
+
+
+class AreaMonthValueTests(TestCase):
+
+    def setUp(self):
+        self.area = WaterbalanceArea()
+        self.area.name = "WaterbalanceArea for AreaMonthValueTests"
+        self.area.save()
+        scenario = WaterbalanceScenario()
+        scenario.name = "WaterbalanceScenario for AreaMonthValueTests"
+        scenario.save()
+        configuration = WaterbalanceConf()
+        configuration.waterbalance_area = self.area
+        configuration.waterbalance_scenario = scenario
+        configuration.save()
+        self.parameter = Parameter()
+        self.parameter.name = "Parameter for AreaMonthValueTests"
+        self.parameter.save()
+        self.wb_timeserie = WaterbalanceTimeserie()
+        self.wb_timeserie.name = "WaterbalanceTimeserie for AreaMonthValueTests"
+        self.wb_timeserie.parameter = self.parameter
+        self.wb_timeserie.configuration = configuration
+        self.wb_timeserie.timestep = WaterbalanceTimeserie.TIMESTEP_MONTH
+        self.wb_timeserie.local_timeseries = Timeseries()
+        self.wb_timeserie.local_timeseries.save()
+        self.wb_timeserie.save()
+
+    def store_events(self, events):
+        timeseries = SparseTimeseriesStub()
+        for date_time, value in events:
+            timeseries.add_value(date_time, value)
+        self.wb_timeserie.local_timeseries.save_timeserie_stub(timeseries)
+
+    def month_values(self):
+        values = AreaMonthValue.objects.filter(area=self.area,
+                                               parameter=self.parameter)
+        return [(value.month, value.value) for value in values.order_by('month')]
+
+    def test_a(self):
+        """Test the stored monthly events are copied to the map values."""
+        self.store_events([(datetime(2011, 4, 1), 2.0),
+                           (datetime(2011, 5, 1), 3.0)])
+        self.assertEqual([(date(2011, 4, 1), 2.0), (date(2011, 5, 1), 3.0)],
+                         self.month_values())
+
+    def test_b(self):
+        """Test the map values are replaced when the events are stored again."""
+        self.store_events([(datetime(2011, 4, 1), 2.0)])
+        self.wb_timeserie.local_timeseries.timeseries_events.all().delete()
+        self.store_events([(datetime(2011, 6, 1), 5.0)])
+        self.assertEqual([(date(2011, 6, 1), 5.0)], self.month_values())
+
+    def test_c(self):
+        """Test the values of a daily time series are not copied."""
+        self.wb_timeserie.timestep = WaterbalanceTimeserie.TIMESTEP_DAY
+        self.wb_timeserie.save()
+        self.assertEqual(0, AreaMonthValue.refresh(self.wb_timeserie))
+
+    def test_d(self):
+        """Test the map values of another scenario are kept."""
+        self.store_events([(datetime(2011, 4, 1), 2.0)])
+        scenario = WaterbalanceScenario()
+        scenario.name = "Second WaterbalanceScenario for AreaMonthValueTests"
+        scenario.order = 1
+        scenario.save()
+        configuration = WaterbalanceConf()
+        configuration.waterbalance_area = self.area
+        configuration.waterbalance_scenario = scenario
+        configuration.save()
+        self.wb_timeserie = WaterbalanceTimeserie.objects.create(
+            name=self.wb_timeserie.name, parameter=self.parameter,
+            configuration=configuration,
+            timestep=WaterbalanceTimeserie.TIMESTEP_MONTH,
+            local_timeseries=Timeseries.objects.create())
+        self.store_events([(datetime(2011, 4, 1), 3.0)])
+        self.assertEqual([(date(2011, 4, 1), 2.0), (date(2011, 4, 1), 3.0)],
+                         sorted(self.month_values()))
+        self.assertEqual({date(2011, 4, 1): 2.0},
+                         AreaMonthValue.map_values(self.parameter.id,
+                                                   self.area.id))
+
+    def test_e(self):
+        """Test the map values are removed with the time series."""
+        self.store_events([(datetime(2011, 4, 1), 2.0)])
+        self.wb_timeserie.delete()
+        self.assertEqual([], self.month_values())
+
+    def test_f(self):
+        """Test the map values are removed with the local time series."""
+        self.store_events([(datetime(2011, 4, 1), 2.0),
+                           (datetime(2011, 5, 1), 3.0)])
+        self.wb_timeserie.local_timeseries.delete()
+        self.assertEqual([], self.month_values())
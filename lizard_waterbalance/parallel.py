@@ -0,0 +1,71 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#******************************************************************************
+#
+# This file is part of the lizard_waterbalance Django app.
+#
+# The lizard_waterbalance app is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the lizard_waterbalance app.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2012 Nelen & Schuurmans
+#
+#******************************************************************************
+
+"""Distribute the computation of configurations over multiple processes.
+
+The management commands that compute or export many configurations call a
+function for each configuration. Function imap_unordered calls that function
+in the given number of worker processes. Each worker process opens its own
+database connection, as a connection cannot be shared between processes.
+
+"""
+
+from multiprocessing import Pool
+
+from django.db import connection
+
+
+def close_connection():
+    """Close the database connection inherited from the parent process."""
+    connection.close()
+
+
+def imap_unordered(function, arguments_list, jobs):
+    """Yield the result of the function for each of the given arguments.
+
+    When the number of jobs is larger than 1, this function calls the given
+    function in that number of worker processes and yields the results in
+    the order in which they finish. Otherwise it calls the given function in
+    the current process and yields the results in the order of the
+    arguments.
+
+    When the caller stops the iteration, for example because it raised an
+    exception, the worker processes are terminated.
+
+    """
+    if jobs <= 1:
+        for arguments in arguments_list:
+            yield function(arguments)
+        return
+
+    # each worker has to open its own database connection
+    close_connection()
+    pool = Pool(jobs, close_connection)
+    try:
+        for result in pool.imap_unordered(function, arguments_list):
+            yield result
+    except:
+        pool.terminate()
+        raise
+    pool.close()
+    pool.join()
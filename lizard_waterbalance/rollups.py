@@ -0,0 +1,170 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#******************************************************************************
+#
+# This file is part of the lizard_waterbalance Django app.
+#
+# The lizard_waterbalance app is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the lizard_waterbalance app.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2012 Nelen & Schuurmans
+#
+#******************************************************************************
+
+"""Aggregate the daily results of a computation to the periods of the graphs.
+
+The graphs show the results of a computation per day, month, quarter or year
+and the cumulative graphs reset their values at the start of each month,
+quarter, year or hydrological year. A Rollups object contains these
+aggregations for a single time series, so the graphs only have to select the
+aggregated events between their start and end date.
+
+The CachedWaterbalanceComputer attaches the Rollups of each time series to
+that time series before it stores the time series in the cache.
+
+"""
+
+from bisect import bisect_left
+from datetime import timedelta
+
+from lizard_waterbalance.aggregation import aggregate
+from lizard_waterbalance.aggregation import aggregate_cumulative
+from lizard_waterbalance.aggregation import events_to_arrays
+from lizard_waterbalance.aggregation import to_datetimes
+
+# the periods to which the events are aggregated in advance, the daily
+# aggregations are computed on demand as the events are already daily
+PERIODS = ('month', 'quarter', 'year')
+
+# the periods at the start of which a cumulative aggregation restarts
+RESET_PERIODS = ('month', 'quarter', 'year', 'hydro_year')
+
+
+class Rollup(object):
+    """Contains the events of a time series aggregated to a period.
+
+    Instance variables:
+      *dates*
+        list of the first date of each period in non-descending order
+      *values*
+        list of the aggregated value of each period
+
+    """
+    def __init__(self, dates, values):
+        self.dates = dates
+        self.values = values
+
+    def slice(self, start, end, multiply=1, time_shift=0):
+        """Return the pair of dates and values from start up to end.
+
+        The values are multiplied by the given factor and the dates are
+        shifted by the given number of days. The start and end apply to the
+        shifted dates.
+
+        """
+        shift = timedelta(time_shift)
+        first = bisect_left(self.dates, start - shift)
+        last = bisect_left(self.dates, end - shift)
+        dates = self.dates[first:last]
+        values = self.values[first:last]
+        if time_shift != 0:
+            dates = [date + shift for date in dates]
+        if multiply != 1:
+            values = [value * multiply for value in values]
+        return dates, values
+
+
+def create_rollup(dates, values):
+    """Return the Rollup of the given date and value arrays."""
+    return Rollup(to_datetimes(dates), values.tolist())
+
+
+class Rollups(object):
+    """Contains the aggregations of a time series for each period.
+
+    Instance variables:
+      *sums*
+        dict of period to the Rollup of the sum of the events of each period
+      *averages*
+        dict of period to the Rollup of the average of the events of each
+        period
+      *cumulatives*
+        dict of the pair of period and reset period to the Rollup of the
+        cumulative sum of the events at the end of each period
+
+    The aggregations have the same values as the functions grouped_event_values
+    and cumulative_event_values of the timeseries library. There are no
+    aggregations per day, see function find_rollup.
+
+    """
+    def __init__(self, timeseries):
+        dates, values = events_to_arrays(timeseries.events())
+        self.sums = {}
+        self.averages = {}
+        self.cumulatives = {}
+        for period in PERIODS:
+            self.sums[period] = \
+                create_rollup(*aggregate(dates, values, period))
+            self.averages[period] = \
+                create_rollup(*aggregate(dates, values, period, average=True))
+            for reset_period in RESET_PERIODS:
+                self.cumulatives[(period, reset_period)] = create_rollup(
+                    *aggregate_cumulative(dates, values, period, reset_period))
+
+
+def find_rollup(timeseries, period, reset_period=None, average=False):
+    """Return the Rollup of the given time series for the given period.
+
+    When a reset period is specified, this function returns the Rollup of the
+    cumulative sums and otherwise the Rollup of the sums, or the averages, of
+    each period. The Rollup comes from the Rollups that are attached to the
+    time series. When the time series does not have Rollups or when the
+    period is a day, this function aggregates the events of the time series.
+
+    """
+    rollups = getattr(timeseries, 'rollups', None)
+    if rollups is not None and period in PERIODS:
+        if reset_period is not None:
+            return rollups.cumulatives[(period, reset_period)]
+        elif average:
+            return rollups.averages[period]
+        return rollups.sums[period]
+    dates, values = events_to_arrays(timeseries.events())
+    if reset_period is not None:
+        return create_rollup(*aggregate_cumulative(dates, values, period,
+                                                   reset_period))
+    return create_rollup(*aggregate(dates, values, period, average=average))
+
+
+def attach_rollups(result):
+    """Attach the Rollups to each time series in the given result.
+
+    The result can be a time series, an object that holds a time series such
+    as a Load, or any combination of dicts, lists and tuples of these. The
+    Rollups of a time series is available as its attribute 'rollups'.
+
+    """
+    if hasattr(result, 'events'):
+        if getattr(result, 'rollups', None) is None:
+            result.rollups = Rollups(result)
+        return
+    if isinstance(result, dict):
+        values = result.values()
+    elif isinstance(result, (list, tuple)):
+        values = result
+    elif hasattr(result, 'timeseries'):
+        values = [result.timeseries]
+    else:
+        values = []
+    for value in values:
+        attach_rollups(value)
@@ -0,0 +1,123 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#******************************************************************************
+#
+# This file is part of the lizard_waterbalance Django app.
+#
+# The lizard_waterbalance app is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the lizard_waterbalance app.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2012 Nelen & Schuurmans
+#
+#******************************************************************************
+
+from datetime import datetime
+from datetime import timedelta
+from unittest import TestCase
+
+from timeseries.timeseriesstub import SparseTimeseriesStub
+
+from lizard_waterbalance.rollups import Rollups
+from lizard_waterbalance.rollups import attach_rollups
+from lizard_waterbalance.rollups import find_rollup
+
+
+def create_timeseries(start, days, value=1.0):
+    timeseries = SparseTimeseriesStub()
+    for day in range(days):
+        timeseries.add_value(start + timedelta(day), value)
+    return timeseries
+
+
+class RollupsTests(TestCase):
+
+    def setUp(self):
+        # daily values of 1.0 from 2000-09-30 up to and including 2000-11-01
+        self.rollups = Rollups(create_timeseries(datetime(2000, 9, 30), 33))
+
+    def test_a(self):
+        """Test the sum of each month."""
+        rollup = self.rollups.sums['month']
+        self.assertEqual([datetime(2000, 9, 1), datetime(2000, 10, 1),
+                          datetime(2000, 11, 1)], rollup.dates)
+        self.assertEqual([1.0, 31.0, 1.0], rollup.values)
+
+    def test_b(self):
+        """Test the average of each quarter."""
+        rollup = self.rollups.averages['quarter']
+        self.assertEqual([datetime(2000, 7, 1), datetime(2000, 10, 1)],
+                         rollup.dates)
+        self.assertEqual([1.0, 1.0], rollup.values)
+
+    def test_c(self):
+        """Test the cumulative sum restarts at the start of the hydro year."""
+        rollup = self.rollups.cumulatives[('month', 'hydro_year')]
+        self.assertEqual([datetime(2000, 9, 1), datetime(2000, 10, 1),
+                          datetime(2000, 11, 1)], rollup.dates)
+        self.assertEqual([1.0, 31.0, 32.0], rollup.values)
+
+    def test_d(self):
+        """Test the cumulative sum restarts at the start of each month."""
+        rollup = self.rollups.cumulatives[('month', 'month')]
+        self.assertEqual([1.0, 31.0, 1.0], rollup.values)
+
+    def test_e(self):
+        """Test the slice only contains the periods from start up to end."""
+        rollup = self.rollups.sums['month']
+        dates, values = rollup.slice(datetime(2000, 10, 1),
+                                     datetime(2000, 11, 1))
+        self.assertEqual([datetime(2000, 10, 1)], dates)
+        self.assertEqual([31.0], values)
+
+    def test_f(self):
+        """Test the slice applies the multiplication and time shift."""
+        rollup = self.rollups.sums['month']
+        dates, values = rollup.slice(datetime(2000, 10, 2),
+                                     datetime(2000, 11, 2),
+                                     multiply=-1, time_shift=1)
+        self.assertEqual([datetime(2000, 10, 2)], dates)
+        self.assertEqual([-31.0], values)
+
+    def test_g(self):
+        """Test the Rollups of an empty time series are empty."""
+        rollups = Rollups(SparseTimeseriesStub())
+        self.assertEqual([], rollups.sums['month'].dates)
+        self.assertEqual([], rollups.cumulatives[('month', 'year')].values)
+
+    def test_h(self):
+        """Test the Rollups do not store the aggregations per day."""
+        self.assertFalse('day' in self.rollups.sums)
+        self.assertFalse(('day', 'month') in self.rollups.cumulatives)
+
+
+class AttachRollupsTests(TestCase):
+
+    def test_a(self):
+        """Test the Rollups are attached to each time series in a result."""
+        first = create_timeseries(datetime(2000, 1, 1), 2)
+        second = create_timeseries(datetime(2000, 1, 1), 3)
+        attach_rollups(({'first': first}, [second]))
+        self.assertEqual([2.0], first.rollups.sums['year'].values)
+        self.assertEqual([3.0], second.rollups.sums['year'].values)
+
+
+class FindRollupTests(TestCase):
+
+    def test_a(self):
+        """Test the daily cumulative sum is computed from the events."""
+        timeseries = create_timeseries(datetime(2000, 9, 30), 33)
+        attach_rollups(timeseries)
+        rollup = find_rollup(timeseries, 'day', reset_period='month')
+        self.assertEqual(1.0, rollup.values[0])
+        self.assertEqual(31.0, rollup.values[31])
+        self.assertEqual(1.0, rollup.values[32])
@@ -93,6 +93,16 @@ urlpatterns = patterns(
      'lizard_waterbalance.views.recalculate_graph_data',
      {},
      "waterbalance_graph_recalculate_data"),
+    (r'^summary/(?P<area_slug>.*)/scenario/(?P<scenario_slug>.*)'
+     '/computation_status/$',
+     'lizard_waterbalance.views.computation_status',
+     {},
+     "waterbalance_computation_status"),
+    (r'^summary/(?P<area_slug>.*)/scenario/(?P<scenario_slug>.*)'
+     '/graph_data/(?P<graph_type>[^/]+)/$',
+     'lizard_waterbalance.graph_data.waterbalance_area_graph_data',
+     {},
+     'waterbalance_area_graph_data'),
     (r'^summary/(?P<area_slug>.*)/scenario/(?P<scenario_slug>.*)'
      '/graph/(?P<graph_type>.*)/$',
      'lizard_waterbalance.views.waterbalance_area_graphs',
@@ -3,27 +3,31 @@
 # Create your views here.
 
 from datetime import datetime
-from datetime import time as datetime_time
-from datetime import timedelta
+import hashlib
 import logging
 from time import gmtime
 from time import strftime
 from time import time
 
+from django.conf import settings
 from django.contrib import messages
 from django.core.urlresolvers import reverse
 from django.core.cache import cache
 from django.http import HttpResponse
 from django.http import HttpResponseRedirect
 from django.http import HttpResponseForbidden
+from django.http import HttpResponseNotModified
 from django.shortcuts import get_object_or_404
 from django.shortcuts import render_to_response
 from django.template import RequestContext
 from django.template.defaultfilters import slugify
 from django.utils import simplejson
+from django.utils.http import http_date
+from django.views.static import was_modified_since
 from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
 from matplotlib.lines import Line2D
 import mapnik
+import numpy
 
 from dbmodel.models import Area
 from dbmodel.models import PumpingStation
@@ -33,18 +37,27 @@ from lizard_map.adapter import Graph
 from lizard_map.daterange import current_start_end_dates
 from lizard_map.models import Workspace
 from lizard_wbcomputation.compute import WaterbalanceComputer2
+from lizard_waterbalance.aggregation import TopHeight
+from lizard_waterbalance.aggregation import end_of_period
+from lizard_waterbalance.aggregation import insert_resets
+from lizard_waterbalance.aggregation import to_date_array
+from lizard_waterbalance.aggregation import to_datetimes
+from lizard_waterbalance.cache_codec import CacheCodec
+from lizard_waterbalance.cache_codec import TIMEOUT as CACHE_TIMEOUT
+from lizard_waterbalance.cache_lock import CacheLock
 from lizard_waterbalance.forms import WaterbalanceConfEditForm
 from lizard_waterbalance.forms import OpenWaterEditForm
 from lizard_waterbalance.forms import PumpingStationEditForm
 from lizard_waterbalance.forms import create_location_label
+from lizard_waterbalance.models import ComputationJob
 from lizard_waterbalance.models import WaterbalanceArea
 from lizard_waterbalance.models import WaterbalanceConf
 from lizard_waterbalance.models import Label
 from lizard_waterbalance.models import Parameter
+from lizard_waterbalance.rollups import attach_rollups
+from lizard_waterbalance.rollups import find_rollup
 from timeseries.timeseriesstub import TimeseriesStub
 from timeseries.timeseriesstub import add_timeseries
-from timeseries.timeseriesstub import cumulative_event_values
-from timeseries.timeseriesstub import grouped_event_values
 from timeseries.timeseriesstub import write_to_pi_file
 
 import hotshot
@@ -178,49 +191,6 @@ TRUE_FALSE_EXCEPTIONS = {
 logger = logging.getLogger(__name__)
 
 
-class TopHeight:
-    """Maintains the height of the top of each bar in a stacked bar chart.
-
-    Instance variable:
-    * key_to_height -- dictionary that maps each bar to its total height
-
-    Each bar is identified by a key, which often is its horizontal position in
-    the chart. Let key be such an identifier, then key_to_height[key] specifies
-    the total height of the bar.
-
-    """
-    def __init__(self):
-        self.key_to_height = {}
-
-    def stack_bars(self, keys, heights):
-        """Sets or update the heights for the given bars.
-
-        Parameters:
-        * keys -- list of bar keys
-        * heights -- list of additional bar heights
-
-        """
-        for key, height in zip(keys, heights):
-            self.key_to_height.setdefault(key, 0)
-            self.key_to_height[key] += height
-
-    def get_heights(self, keys):
-        """Return the list of heights for the given bars.
-
-        Parameters:
-        * keys -- list of bar keys
-
-        When a specified key is not present, this method returns 0 for that
-        key.
-
-        """
-        heights = []
-        for key in keys:
-            heights.append(self.key_to_height.get(key, 0))
-
-        return heights
-
-
 def indicator_graph(request,
                     area=None,
                     id=None):
@@ -285,34 +255,7 @@ class DataForCumulativeGraph:
         each copy is moved to the last second of the period.
 
         """
-        last_time = datetime_time(23, 59, 59)
-        if period == 'day':
-            result = [datetime.combine(date, last_time) for date in dates]
-        elif period == 'month':
-            result = []
-            for date in dates:
-                new_month = date.month + 1
-                month = (new_month - 1) % 12 + 1
-                year = date.year + (new_month - 1) / 12
-                new_date = datetime(year, month, date.day) - \
-                           timedelta(1)
-                result.append(datetime.combine(new_date, last_time))
-        elif period == 'quarter':
-            result = []
-            for date in dates:
-                new_month = date.month + 3
-                month = (new_month - 1) % 12 + 1
-                year = date.year + (new_month - 1) / 12
-                new_date = datetime(year, month, date.day) - \
-                           timedelta(1)
-                result.append(datetime.combine(new_date, last_time))
-        elif period == 'year' or period == 'hydro_year':
-            result = []
-            for date in dates:
-                new_date = datetime(date.year + 1, date.month, date.day) - \
-                           timedelta(1)
-                result.append(datetime.combine(new_date, last_time))
-        return result
+        return to_datetimes(end_of_period(to_date_array(dates), period))
 
     def insert_restart(self, dates, values, reset_period):
         """Return the pair of copied dates and values with an additional reset.
@@ -322,33 +265,12 @@ class DataForCumulativeGraph:
         reset at the start of each reset period.
 
         """
-        new_dates, new_values = [], []
-        previous_date = None
-        for date, value in zip(dates, values):
-            if not previous_date is None:
-                first_date = self.first_date(date, reset_period)
-                if previous_date < first_date and first_date <= date:
-                    new_dates.append(first_date)
-                    new_values.append(0.0)
-            new_dates.append(date)
-            new_values.append(value)
-            previous_date = date
-        return new_dates, new_values
-
-    def first_date(self, date, reset_period):
-        if reset_period == 'month':
-            date = datetime(date.year, date.month, 1)
-        elif reset_period == 'quarter':
-            month = 1 + ((date.month - 1) / 3 * 3)
-            date = datetime(date.year, month, 1)
-        elif reset_period == 'hydro_year':
-            if date.month > 9:
-                date = datetime(date.year, 10, 1)
-            else:
-                date = datetime(date.year - 1, 10, 1)
-        elif reset_period == 'year':
-            date = datetime(date.year, 1, 1)
-        return date
+        length = min(len(dates), len(values))
+        dates, values = insert_resets(to_date_array(dates[:length]),
+                                      numpy.array(values[:length], dtype=float),
+                                      reset_period)
+        return to_datetimes(dates), values.tolist()
+
 
 def raw_add_timeseries(timeserie_a, timeserie_b):
     if next(timeserie_a.raw_events(), None) is None:
@@ -497,8 +419,7 @@ def get_timeseries(timeseries, start, end, period='month'):
     * period -- 'year', 'month' or 'day'
 
     """
-    return zip(*(e for e in grouped_event_values(timeseries, period)
-                 if e[0] >= start and e[0] < end))
+    return find_rollup(timeseries, period).slice(start, end)
 
 
 def split_date_value(timeseries):
@@ -548,17 +469,8 @@ def get_cumulative_timeseries(timeseries, start, end,
     * period -- 'year', 'month' or 'day'
 
     """
-    result = zip(*(e for e in cumulative_event_values(timeseries,
-                                                      reset_period=reset_period,
-                                                      period=period,
-                                                      multiply=multiply,
-                                                      time_shift=time_shift)
-                   if e[0] >= start and e[0] < end))
-    if len(result) == 0:
-        # no cumulative events are present but the caller expects two lists, so
-        # we return two empty lists
-        result = [], []
-    return result
+    rollup = find_rollup(timeseries, period, reset_period=reset_period)
+    return rollup.slice(start, end, multiply=multiply, time_shift=time_shift)
 
 
 def get_average_timeseries(timeseries, start, end, period='month'):
@@ -571,15 +483,7 @@ def get_average_timeseries(timeseries, start, end, period='month'):
     * period -- 'year', 'month' or 'day'
 
     """
-    result = zip(*(e for e in grouped_event_values(timeseries,
-                                                   period,
-                                                   average=True)
-                   if e[0] >= start and e[0] < end))
-    if len(result) == 0:
-        # no average events are present but the caller expects two lists, so we
-        # return two empty lists
-        result = [], []
-    return result
+    return find_rollup(timeseries, period, average=True).slice(start, end)
 
 
 def get_timeseries_label(name):
@@ -620,37 +524,107 @@ def retrieve_horizon(request):
                                      59)
     return start_datetime, end_datetime
 
+
+# number of seconds that the fingerprint of a configuration remains in the
+# cache, so a change of the input of the computation can take that long to
+# show up in the graphs
+FINGERPRINT_TIMEOUT = getattr(settings, 'WATERBALANCE_FINGERPRINT_TIMEOUT', 60)
+
+# name of the cache item that marks that all results of a configuration are
+# cached
+COMPUTED_MARKER = "computed"
+
+
 class CacheKeyName(object):
     """Implements the creation of key names for data in the cache.
 
     The key name of specific data in the cache, for example the sluice error
     time series, should be different for different configurations, otherwise
     the view code would retrieve the same data from the cache for those
-    configurations.
+    configurations. It should also be different when the input of the
+    computation changes, otherwise the view code would retrieve outdated data
+    from the cache.
 
     Instance variables:
       * configuration_slug *
-        the string that will be appended to each cache key name
+        the string that identifies the configuration in each cache key name
+      * fingerprint *
+        the string that identifies the input of the computation in each cache
+        key name
+
+    The fingerprint consists of the fingerprint of the configuration and a
+    generation number that is stored in the cache. Method invalidate
+    increments that number, which makes sure that the data that is already in
+    the cache is not used anymore.
 
-    The configuration slug is used to create cache key names that differ for
-    different configurations.
+    The fingerprint of the configuration requires several queries, so it is
+    kept in the cache for FINGERPRINT_TIMEOUT seconds. A change of the input
+    is therefore noticed within that time.
 
     """
 
-    def __init__(self, configuration):
-        """Set the configuration_slug instance variable.
+    def __init__(self, configuration, compute=True):
+        """Set the configuration_slug and fingerprint instance variables.
 
         The configuration_slug is created from the return value of a call to
-        the __unicode__ method of the configuration.
+        the __unicode__ method of the configuration. When compute does not
+        hold and the fingerprint of the configuration is not in the cache, the
+        fingerprint is None.
 
         """
         self.configuration_slug = slugify(configuration.__unicode__())
+        self.configuration_fingerprint = \
+            self._get_configuration_fingerprint(configuration, compute)
+        if self.configuration_fingerprint is None:
+            self.fingerprint = None
+        else:
+            self.fingerprint = \
+                self._create_fingerprint(self._get_generation())
+
+    @classmethod
+    def from_cache(cls, configuration):
+        """Return the CacheKeyName of the configuration or None.
+
+        Contrary to the constructor, this method does not compute the
+        fingerprint of the configuration but returns None when it is not in
+        the cache. A view that can answer from the cache uses it to avoid the
+        queries of the fingerprint.
+
+        """
+        cache_key_name = cls(configuration, compute=False)
+        if cache_key_name.fingerprint is None:
+            return None
+        return cache_key_name
+
+    def _get_configuration_fingerprint(self, configuration, compute):
+        key = "configuration_fingerprint::" + self.configuration_slug
+        fingerprint = cache.get(key)
+        if fingerprint is None and compute:
+            fingerprint = configuration.fingerprint()
+            cache.set(key, fingerprint, FINGERPRINT_TIMEOUT)
+        return fingerprint
+
+    def _generation_key(self):
+        return "generation::" + self.configuration_slug
+
+    def _get_generation(self):
+        return cache.get(self._generation_key()) or 0
+
+    def _create_fingerprint(self, generation):
+        return "%s.%d" % (self.configuration_fingerprint, generation)
+
+    def invalidate(self):
+        """Make sure the data already in the cache is not used anymore."""
+        generation = self._get_generation() + 1
+        cache.set(self._generation_key(), generation, CACHE_TIMEOUT)
+        self.fingerprint = self._create_fingerprint(generation)
 
     def get(self, name):
         """Return a key name for one configuration based on the given name.
 
         """
-        return name + "::" + self.configuration_slug
+        return name + "::" + self.configuration_slug + "::" + self.fingerprint
+
 
 class CachedWaterbalanceComputer(WaterbalanceComputer2):
     """Wraps subclasses given WaterbalanceComputer and caches its results.
@@ -663,16 +637,16 @@ class CachedWaterbalanceComputer(WaterbalanceComputer2):
     each reimplemented method calls the parent method, stores the results in
     the cache and then returns them to the caller.
 
-    This class takes some care to be able to use memcached as a backend. By
-    default, memcached can only store objects that are up to 1 MB in size. For
-    our test case this meant that the results of the call to
-    WaterbalanceComputer.get_fraction_timeseries did not fit in the
-    cache. Therefore, the reimplementation of this method stores the results in
-    two separate objects.
+    The results are stored by a CacheCodec, which compresses them and splits
+    them in several cache items when they do not fit in a single item. This
+    allows us to use memcached as a backend, which by default can only store
+    objects that are up to 1 MB in size.
 
-    Note that if specific data cannot be stored in the cache, the view still
-    functions but it will take longer to display the graphs. The data not in
-    the cache will have to be recalculated each time it is requested.
+    The browser requests several graphs of the same configuration at the same
+    time. To avoid that each of these requests computes the same results, a
+    computer only calls the parent method when it holds the computation lock
+    of the configuration. The other computers wait until the results are in
+    the cache or the lock is released.
 
     Instance variables:
       *cache_key_name*
@@ -687,6 +661,9 @@ class CachedWaterbalanceComputer(WaterbalanceComputer2):
         """
         assert len(args) > 1
         self.cache_key_name = args[0]
+        self.cache_codec = CacheCodec(cache)
+        self.computation_lock = \
+            CacheLock(cache, self.cache_key_name.get("computation_lock"))
 
         super(CachedWaterbalanceComputer, self).__init__(*args[1:], **kwargs)
 
@@ -698,195 +675,144 @@ class CachedWaterbalanceComputer(WaterbalanceComputer2):
 
         """
         key_name = self.cache_key_name.get(name)
-        return cache.get(key_name)
+        return self.cache_codec.get(key_name)
 
     def set_cached_data(self, name, data):
         """Store the data in the cache using a key based on the given name.
 
         This method uses self.cache_key_name to retrieve the right key for
-        the current configuration.
+        the current configuration. Before the data is stored, this method
+        attaches the Rollups to each time series in the data, so the graphs
+        do not have to aggregate the time series themselves.
 
         """
         key_name = self.cache_key_name.get(name)
-        cache.set(key_name, data, 24 * 60 * 60)
+        attach_rollups(data)
+        self.cache_codec.set(key_name, data)
 
-    def calc_sluice_error_timeseries(self, start_date, end_date):
+    def mark_computed(self):
+        """Store the marker that all results of the configuration are cached.
 
-        sluice_error = self.get_cached_data("sluice_error")
-        if sluice_error is None:
+        The computation worker calls this method after it has computed and
+        cached each item the graphs read, see function is_computed.
 
-            parent = super(CachedWaterbalanceComputer, self)
-            sluice_error = \
-                parent.calc_sluice_error_timeseries(start_date,
-                                                    end_date)
+        """
+        key_name = self.cache_key_name.get(COMPUTED_MARKER)
+        cache.set(key_name, True, CACHE_TIMEOUT)
 
-            self.set_cached_data("sluice_error", sluice_error)
+    def get_or_compute(self, names, compute):
+        """Return the cached data of the given names or compute that data.
+
+        Parameter *compute* is the callable that returns the data when it is
+        not in the cache. When there is a single name, the callable should
+        return the data for that name and otherwise it should return the tuple
+        of the data for each name.
+
+        """
+        cached = [self.get_cached_data(name) for name in names]
+        if None not in cached:
+            return self._as_result(cached)
+
+        def is_cached():
+            cached[:] = [self.get_cached_data(name) for name in names]
+            return None not in cached
+
+        locked = self.computation_lock.acquire(on_wait=is_cached)
+        try:
+            if None not in cached or (locked and is_cached()):
+                return self._as_result(cached)
+            data = compute()
+            if len(names) == 1:
+                self.set_cached_data(names[0], data)
+            else:
+                assert len(data) == len(names)
+                for name, value in zip(names, data):
+                    self.set_cached_data(name, value)
+            return data
+        finally:
+            if locked:
+                self.computation_lock.release()
+
+    def _as_result(self, cached):
+        if len(cached) == 1:
+            return cached[0]
+        return tuple(cached)
 
-        return sluice_error
+    def calc_sluice_error_timeseries(self, start_date, end_date):
+        parent = super(CachedWaterbalanceComputer, self)
+        return self.get_or_compute(
+            ["sluice_error"],
+            lambda: parent.calc_sluice_error_timeseries(start_date, end_date))
 
     def get_open_water_incoming_flows(self,
                                       start_date,
                                       end_date):
-
-        incoming = self.get_cached_data("incoming")
-        if incoming is None:
-
-            parent = super(CachedWaterbalanceComputer, self)
-            incoming = parent.get_open_water_incoming_flows(start_date,
-                                                            end_date)
-            self.set_cached_data("incoming", incoming)
-
-        return incoming
+        parent = super(CachedWaterbalanceComputer, self)
+        return self.get_or_compute(
+            ["incoming"],
+            lambda: parent.get_open_water_incoming_flows(start_date, end_date))
 
     def get_open_water_outgoing_flows(self,
                                       start_date,
                                       end_date):
-
-        outgoing = self.get_cached_data("outgoing")
-        if outgoing is None:
-
-            parent = super(CachedWaterbalanceComputer, self)
-            outgoing = parent.get_open_water_outgoing_flows(start_date,
-                                                            end_date)
-            self.set_cached_data("outgoing", outgoing)
-
-        return outgoing
+        parent = super(CachedWaterbalanceComputer, self)
+        return self.get_or_compute(
+            ["outgoing"],
+            lambda: parent.get_open_water_outgoing_flows(start_date, end_date))
 
     def get_level_control_timeseries(self, start_date, end_date):
-
-        outcome = self.get_cached_data("outcome")
-        if outcome is None:
-
-            parent = super(CachedWaterbalanceComputer, self)
-            outcome = parent.get_level_control_timeseries(start_date,
-                                                          end_date)
-            self.set_cached_data("outcome", outcome)
-
-        return outcome
+        parent = super(CachedWaterbalanceComputer, self)
+        return self.get_or_compute(
+            ["outcome"],
+            lambda: parent.get_level_control_timeseries(start_date, end_date))
 
     def get_level_control_pumping_stations(self):
-
-        pair = self.get_cached_data("pair")
-        if pair is None:
-
-            parent = super(CachedWaterbalanceComputer, self)
-            pair = parent.get_level_control_pumping_stations()
-            self.set_cached_data("pair", pair)
-
-        return pair
+        parent = super(CachedWaterbalanceComputer, self)
+        return self.get_or_compute(
+            ["pair"], parent.get_level_control_pumping_stations)
 
     def get_reference_timeseries(self, start_date, end_date):
-
-        ref_in = self.get_cached_data("ref_in")
-        ref_out = self.get_cached_data("ref_out")
-        if ref_in is None or ref_out is None:
-
-            parent = super(CachedWaterbalanceComputer, self)
-            ref_in, ref_out = parent.get_reference_timeseries(start_date,
-                                                              end_date)
-            self.set_cached_data("ref_in", ref_in)
-            self.set_cached_data("ref_out", ref_out)
-
-        return ref_in, ref_out
+        parent = super(CachedWaterbalanceComputer, self)
+        return self.get_or_compute(
+            ["ref_in", "ref_out"],
+            lambda: parent.get_reference_timeseries(start_date, end_date))
 
     def get_waterlevel_with_sluice_error(self, start_date, end_date):
-
-        waterlevel = self.get_cached_data("waterlevel")
-        sluice_error = self.get_cached_data("sluice_error")
-        if waterlevel is None or sluice_error is None:
-            parent = super(CachedWaterbalanceComputer, self)
-            waterlevel, sluice_error = parent.get_waterlevel_with_sluice_error(
-                start_date, end_date)
-            self.set_cached_data("waterlevel", waterlevel)
-            self.set_cached_data("sluice_error", sluice_error)
-        return waterlevel, sluice_error
+        parent = super(CachedWaterbalanceComputer, self)
+        return self.get_or_compute(
+            ["waterlevel", "sluice_error_outlet", "sluice_error_inlet"],
+            lambda: parent.get_waterlevel_with_sluice_error(start_date,
+                                                            end_date))
 
     def get_fraction_timeseries(self, start_date, end_date):
-
-        fractions_1 = self.get_cached_data("fractions_1")
-        fractions_2 = self.get_cached_data("fractions_2")
-        if fractions_1 is None or fractions_2 is None:
-
-            parent = super(CachedWaterbalanceComputer, self)
-            fractions = parent.get_fraction_timeseries(start_date,
-                                                       end_date)
-
-            # When we use memcached as the backend, the default maximum size
-            # for a single object in the cache is 1 MB. It turned out that the
-            # fractions dictionary could easily exceed that limit. For that
-            # reason we partition the fractions in two dictionaries and store
-            # each part separately.
-            fractions_1 = {}
-            fractions_2 = {}
-            key_count = 0
-            for key, values in fractions.iteritems():
-                if key_count < 4:
-                    fractions_1[key] = values
-                else:
-                    fractions_2[key] = values
-                key_count = key_count + 1
-
-            self.set_cached_data("fractions_1", fractions_1)
-            self.set_cached_data("fractions_2", fractions_2)
-
-        fractions = fractions_1
-        for key, values in fractions_2.iteritems():
-            fractions[key] = values
-
-        return fractions
+        parent = super(CachedWaterbalanceComputer, self)
+        return self.get_or_compute(
+            ["fractions"],
+            lambda: parent.get_fraction_timeseries(start_date, end_date))
 
     def get_concentration_timeseries(self, start_date, end_date):
-
-        concentrations = self.get_cached_data("concentrations")
-        if concentrations is None:
-
-            parent = super(CachedWaterbalanceComputer, self)
-            concentrations = parent.get_concentration_timeseries(start_date,
-                                                                 end_date)
-            self.set_cached_data("concentrations", concentrations)
-
-        return concentrations
+        parent = super(CachedWaterbalanceComputer, self)
+        return self.get_or_compute(
+            ["concentrations"],
+            lambda: parent.get_concentration_timeseries(start_date, end_date))
 
     def get_impact_timeseries(self, start_date, end_date):
+        parent = super(CachedWaterbalanceComputer, self)
+        return self.get_or_compute(
+            ["impact", "impact_incremental"],
+            lambda: parent.get_impact_timeseries(start_date, end_date))
 
-        impact = self.get_cached_data("impact")
-        impact_incremental = self.get_cached_data("impact_incremental")
-        if impact is None or impact_incremental is None:
-
-            parent = super(CachedWaterbalanceComputer, self)
-            impact, impact_incremental = parent.get_impact_timeseries(
-                start_date, end_date)
-            self.set_cached_data("impact", impact)
-            self.set_cached_data("impact_incremental", impact_incremental)
 
-        return impact, impact_incremental
+def area_graph_bars(waterbalance_computer, calc_start_datetime,
+                    calc_end_datetime):
+    """Return the bars of the waterbalance graph.
 
+    This function returns the tuple of the dict of program name to Label, the
+    list of incoming bars, the list of outgoing bars and the sluice error.
+    Each bar is a tuple of its name, time series, Label and export name. The
+    bars are sorted in the order of the legend.
 
-# @profile("waterbalance_area_graph.prof")
-def waterbalance_area_graph(
-    configuration,
-    waterbalance_computer,
-    start_date,
-    end_date,
-    period,
-    width, height):
-    """Draw the graph for the given area and of the given type.
-
-    area_slug: i.e. artsveldsche-polder-oost
-    period: i.e. 'month'
-    start_date, end_date: start and end_date for graph
-    start_datetime, end_datetime: start and enddate for calculation
-    width, height: width and height of output image
     """
-    calc_start_datetime, calc_end_datetime = \
-        configuration.get_calc_period(date2datetime(end_date))
-
-    graph = Graph(start_date, end_date, width, height)
-    graph.suptitle("Waterbalans [m3]")
-    bar_width = BAR_WIDTH[period]
-
-    t1 = time()
-
     labels = dict([(label.program_name, label) for
                    label in Label.objects.all()])
 
@@ -926,6 +852,53 @@ def waterbalance_area_graph(
     incoming_bars = sorted(incoming_bars, key=lambda bar:-bar[2].order)
     outgoing_bars = sorted(outgoing_bars, key=lambda bar: bar[2].order)
 
+    return labels, incoming_bars, outgoing_bars, sluice_error
+
+
+def split_by_sign(times, values):
+    """Return the events with a positive value and the other events.
+
+    Each of the two sets of events is returned as the pair of times and
+    values. The waterbalance graph stacks a positive sluice error on top of
+    the incoming flows and the other sluice error below the outgoing flows.
+
+    """
+    values = numpy.asarray(values, dtype=float)
+    positive = values > 0
+    times = numpy.array(times, dtype=object)
+    return ((times[positive].tolist(), values[positive].tolist()),
+            (times[~positive].tolist(), values[~positive].tolist()))
+
+
+# @profile("waterbalance_area_graph.prof")
+def waterbalance_area_graph(
+    configuration,
+    waterbalance_computer,
+    start_date,
+    end_date,
+    period,
+    width, height):
+    """Draw the graph for the given area and of the given type.
+
+    area_slug: i.e. artsveldsche-polder-oost
+    period: i.e. 'month'
+    start_date, end_date: start and end_date for graph
+    start_datetime, end_datetime: start and enddate for calculation
+    width, height: width and height of output image
+    """
+    calc_start_datetime, calc_end_datetime = \
+        configuration.get_calc_period(date2datetime(end_date))
+
+    graph = Graph(start_date, end_date, width, height)
+    graph.suptitle("Waterbalans [m3]")
+    bar_width = BAR_WIDTH[period]
+
+    t1 = time()
+
+    labels, incoming_bars, outgoing_bars, sluice_error = \
+        area_graph_bars(waterbalance_computer, calc_start_datetime,
+                        calc_end_datetime)
+
     #define legend
     names = ["sluitfout t.o.v. gemaal"] + [abridged_legend_name(bar[0]) for bar in incoming_bars + outgoing_bars]
     colors = [labels['sluice_error'].color] + [bar[2].color for bar in incoming_bars + outgoing_bars]
@@ -966,18 +939,8 @@ def waterbalance_area_graph(
     # dict_series["sluice_error"] = sluice_error
     # write_to_pi_file(location_id = "SAP", filename="waterbalance-graph.xml", timeseries=dict_series)
 
-    positive_times = []
-    positive_sluice_error = []
-    negative_times = []
-    negative_sluice_error = []
-    for timestamp, value in zip(times, values):
-        # logger.debug("%s, %f", timestamp.isoformat(), value)
-        if value > 0:
-            positive_times.append(timestamp)
-            positive_sluice_error.append(value)
-        else:
-            negative_times.append(timestamp)
-            negative_sluice_error.append(value)
+    (positive_times, positive_sluice_error), \
+        (negative_times, negative_sluice_error) = split_by_sign(times, values)
 
     color = label.color
 
@@ -996,40 +959,9 @@ def waterbalance_area_graph(
     logger.debug("Grabbing all graph data took %s seconds.", time() - t1)
     return graph
 
-def waterbalance_water_level(configuration,
-                             waterbalance_computer,
-                             start_date,
-                             end_date,
-                             period,
-                             reset_period,
-                             width, height,
-                             with_sluice_error=False):
-    """Draw the graph for the given area en scenario and of the given type."""
-    calc_start_datetime, calc_end_datetime = \
-                         configuration.get_calc_period(date2datetime(end_date))
-
-    graph = Graph(start_date, end_date, width, height)
-    if with_sluice_error:
-        title = "Waterpeil met sluitfout [m NAP]"
-    else:
-        title = "Waterpeil [m NAP]"
-    graph.suptitle(title)
-
-    t1 = time()
-
-    labels = dict([(l.program_name, l) for l in Label.objects.all()])
-
-    #define bars
-    bars = []
-    #gemeten waterpeilen
-    for tijdserie in configuration.references.filter(parameter__sourcetype=Parameter.TYPE_MEASURED, parameter__parameter=Parameter.PARAMETER_WATERLEVEL):
-        bars.append((tijdserie.name, tijdserie.get_timeseries(), labels['meas_waterlevel']))
-
-    bars.append(("waterpeilen",
-                 waterbalance_computer.get_level_control_timeseries(calc_start_datetime,
-                                                                    calc_end_datetime)['water_level'],
-                labels['calc_waterlevel']))
 
+def cumulative_graph_period(period, reset_period):
+    """Return the period to use for a graph with the given reset period."""
     if reset_period == 'hydro_year' and period == 'year':
         # This is a really strange combination for which the rest of this
         # function is not suited. We fix that as follows.
@@ -1048,11 +980,35 @@ def waterbalance_water_level(configuration,
     keys = ['day', 'month', 'quarter', 'hydro_year', 'year']
     if keys.index(reset_period) < keys.index(period):
         period = reset_period
+    return period
+
+
+def water_level_lines(configuration, waterbalance_computer,
+                      calc_start_datetime, calc_end_datetime, reset_period,
+                      with_sluice_error=False):
+    """Return the lines of the water level graph.
+
+    Each line is a tuple of its name, time series and Label.
+
+    """
+    labels = dict([(l.program_name, l) for l in Label.objects.all()])
+
+    #define bars
+    bars = []
+    #gemeten waterpeilen
+    for tijdserie in configuration.references.filter(parameter__sourcetype=Parameter.TYPE_MEASURED, parameter__parameter=Parameter.PARAMETER_WATERLEVEL):
+        bars.append((tijdserie.name, tijdserie.get_timeseries(), labels['meas_waterlevel']))
+
+    bars.append(("waterpeilen",
+                 waterbalance_computer.get_level_control_timeseries(calc_start_datetime,
+                                                                    calc_end_datetime)['water_level'],
+                labels['calc_waterlevel']))
 
     # Add sluice error to bars.
     if with_sluice_error:
-        waterlevel, sluice_error = waterbalance_computer.get_waterlevel_with_sluice_error(calc_start_datetime,
-                                                                                          calc_end_datetime)
+        waterlevel, sluice_error, sluice_error_inlet = \
+            waterbalance_computer.get_waterlevel_with_sluice_error(
+                calc_start_datetime, calc_end_datetime)
 
         times, values = get_cumulative_timeseries(sluice_error,
                                                   calc_start_datetime,
@@ -1072,6 +1028,46 @@ def waterbalance_water_level(configuration,
 
         bars.append(("waterpeilen, met sluitfout", sluice_error_waterlevel,
                      labels['sluice_error']))
+    return bars
+
+
+def get_water_level_timeseries(line, start_date, end_date,
+                               calc_start_datetime, calc_end_datetime, period):
+    """Return the times and values of the given line of the water level graph.
+
+    """
+    if line[0] == "waterpeilen, met sluitfout":
+        return get_timeseries(line[1], calc_start_datetime, calc_end_datetime,
+                              period='day')
+    return get_average_timeseries(line[1], date2datetime(start_date),
+                                  date2datetime(end_date), period=period)
+
+
+def waterbalance_water_level(configuration,
+                             waterbalance_computer,
+                             start_date,
+                             end_date,
+                             period,
+                             reset_period,
+                             width, height,
+                             with_sluice_error=False):
+    """Draw the graph for the given area en scenario and of the given type."""
+    calc_start_datetime, calc_end_datetime = \
+                         configuration.get_calc_period(date2datetime(end_date))
+
+    graph = Graph(start_date, end_date, width, height)
+    if with_sluice_error:
+        title = "Waterpeil met sluitfout [m NAP]"
+    else:
+        title = "Waterpeil [m NAP]"
+    graph.suptitle(title)
+
+    t1 = time()
+
+    period = cumulative_graph_period(period, reset_period)
+    bars = water_level_lines(configuration, waterbalance_computer,
+                             calc_start_datetime, calc_end_datetime,
+                             reset_period, with_sluice_error)
 
     names = [abridged_legend_name(bar[2].name) for bar in bars]
     colors = [bar[2].color for bar in bars]
@@ -1082,15 +1078,9 @@ def waterbalance_water_level(configuration,
 
     for bar in bars:
         label = bar[2]
-        if bar[0] == "waterpeilen, met sluitfout":
-            times, values = get_timeseries(bar[1],
-                                           calc_start_datetime,
-                                           calc_end_datetime,
-                                           period='day')
-        else:
-            times, values = get_average_timeseries(
-                bar[1], date2datetime(start_date),
-                date2datetime(end_date), period=period)
+        times, values = get_water_level_timeseries(
+            bar, start_date, end_date, calc_start_datetime, calc_end_datetime,
+            period)
 
         color = label.color
         graph.axes.plot(times, values, color=color)
@@ -1098,21 +1088,18 @@ def waterbalance_water_level(configuration,
     logger.debug("Grabbing all graph data took %s seconds.", time() - t1)
     return graph
 
-def waterbalance_cum_discharges(configuration,
-                             waterbalance_computer,
-                             start_date,
-                             end_date,
-                             period,
-                             reset_period,
-                             width, height):
-    """Draw the graph for the given area en scenario and of the given type."""
-    calc_start_datetime, calc_end_datetime = configuration.get_calc_period(date2datetime(end_date))
 
-    graph = Graph(start_date, end_date, width, height)
-    graph.suptitle("Cumulatieve debieten")
+def cum_discharges_bars(waterbalance_computer, calc_start_datetime,
+                        calc_end_datetime):
+    """Return the bars and lines of the graph of the cumulative discharges.
 
-    t1 = time()
+    This function returns the tuple of the incoming bars, the outgoing bars,
+    the incoming lines and the outgoing lines. Each bar and line is a tuple of
+    its name, time series, Label and color. The bars are the measured
+    discharges of the pumping stations and the lines the computed discharges
+    for level control.
 
+    """
     labels = dict([(label.program_name, label) for label in Label.objects.all()])
 
     bars_in = []
@@ -1146,6 +1133,27 @@ def waterbalance_cum_discharges(configuration,
         for pump_line in structure.pump_lines.all():
             bars_in.append((pump_line.name, pump_line.retrieve_timeseries(), structure.label, colors_list[nr]))
             nr += 1
+    return bars_in, bars_out, line_in, line_out
+
+
+def waterbalance_cum_discharges(configuration,
+                             waterbalance_computer,
+                             start_date,
+                             end_date,
+                             period,
+                             reset_period,
+                             width, height):
+    """Draw the graph for the given area en scenario and of the given type."""
+    calc_start_datetime, calc_end_datetime = configuration.get_calc_period(date2datetime(end_date))
+
+    graph = Graph(start_date, end_date, width, height)
+    graph.suptitle("Cumulatieve debieten")
+
+    t1 = time()
+
+    period = cumulative_graph_period(period, reset_period)
+    bars_in, bars_out, line_in, line_out = cum_discharges_bars(
+        waterbalance_computer, calc_start_datetime, calc_end_datetime)
 
     names = [abridged_legend_name(bar[0]) for bar in bars_out + bars_in]
     colors = [bar[3] for bar in bars_out + bars_in ]
@@ -1158,27 +1166,6 @@ def waterbalance_cum_discharges(configuration,
     graph.legend_space()
     graph.legend(handles, names)
 
-    if reset_period == 'hydro_year' and period == 'year':
-        # This is a really strange combination for which the rest of this
-        # function is not suited. We fix that as follows.
-        period = 'hydro_year'
-
-    # When the reset period is smaller than the group period, it is possible
-    # that the grouper returns a date before the date of the resetter, for
-    # example when the reset period is a month and the group period a
-    # quarter. But to which cumulative time series should this lead?
-    #
-    # To "fix" this problem, we use the following rule:
-    #
-    #    When the reset period is smaller than the group period, use the reset
-    #    period also for the group period.
-    #
-    # In this way, the user always sees the reset.
-
-    keys = ['day', 'month', 'quarter', 'hydro_year', 'year']
-    if keys.index(reset_period) < keys.index(period):
-        period = reset_period
-
     bar_width = BAR_WIDTH[period]
 
     top_height_in = TopHeight()
@@ -1227,6 +1214,48 @@ def waterbalance_cum_discharges(configuration,
     logger.debug("Grabbing all graph data took %s seconds.", time() - t1)
     return graph
 
+
+def fraction_bars(waterbalance_computer, calc_start_datetime,
+                  calc_end_datetime):
+    """Return the bars of the fraction distribution graph.
+
+    Each bar is a tuple of its name, time series and Label. The bars are
+    sorted in the order of the legend, which is the reverse order in which
+    they are stacked.
+
+    """
+    labels = dict([(label.program_name, label) for label in Label.objects.all()])
+
+    fractions = waterbalance_computer.get_fraction_timeseries(
+        calc_start_datetime, calc_end_datetime)
+
+    bars = [(labels['initial'].name, fractions["initial"], labels['initial']),
+            (labels['precipitation'].name, fractions["precipitation"], labels['precipitation']),
+            (labels['seepage'].name, fractions["seepage"], labels['seepage']),
+            (labels['hardened'].name, fractions["hardened"], labels['hardened']),
+            (labels['drained'].name, fractions["drained"], labels['drained']),
+            (labels['undrained'].name, fractions["undrained"], labels['undrained']),
+            (labels['flow_off'].name, fractions["flow_off"], labels['flow_off'])]
+
+    for key, timeserie in fractions['intakes'].items():
+        bars.append((key.name, timeserie, key.label))
+
+    return sorted(bars, key=lambda bar:-bar[2].order)
+
+
+def measured_concentrations(configuration, concentration):
+    """Return the measured reference time series of the given concentration.
+
+    """
+    if concentration == Parameter.PARAMETER_CHLORIDE:
+         parameter = Parameter.PARAMETER_CHLORIDE
+    else:
+         parameter = Parameter.PARAMETER_FOSFAAT
+    return configuration.references.filter(
+        parameter__parameter=parameter,
+        parameter__sourcetype=Parameter.TYPE_MEASURED)
+
+
 #@profile("waterbalance_fraction_distribution.prof")
 def waterbalance_fraction_distribution(
             configuration, waterbalance_computer, start_date, end_date,
@@ -1249,25 +1278,8 @@ def waterbalance_fraction_distribution(
 
     t1 = time()
 
-    labels = dict([(label.program_name, label) for label in Label.objects.all()])
-
-    #get data and bars
-    fractions = waterbalance_computer.get_fraction_timeseries(
-        calc_start_datetime, calc_end_datetime)
-
-    bars = [(labels['initial'].name, fractions["initial"], labels['initial']),
-            (labels['precipitation'].name, fractions["precipitation"], labels['precipitation']),
-            (labels['seepage'].name, fractions["seepage"], labels['seepage']),
-            (labels['hardened'].name, fractions["hardened"], labels['hardened']),
-            (labels['drained'].name, fractions["drained"], labels['drained']),
-            (labels['undrained'].name, fractions["undrained"], labels['undrained']),
-            (labels['flow_off'].name, fractions["flow_off"], labels['flow_off'])]
-
-    for key, timeserie in fractions['intakes'].items():
-        bars.append((key.name, timeserie, key.label))
-
-    #sort
-    bars = sorted(bars, key=lambda bar:-bar[2].order)
+    bars = fraction_bars(waterbalance_computer, calc_start_datetime,
+                         calc_end_datetime)
 
     #setup legend
     names = [abridged_legend_name(bar[0]) for bar in bars]
@@ -1309,13 +1321,8 @@ def waterbalance_fraction_distribution(
     graph.ax2.plot(times, values, **style)
 
     #add metingen
-    if concentration == Parameter.PARAMETER_CHLORIDE:
-         parameter = Parameter.PARAMETER_CHLORIDE
-    else:
-         parameter = Parameter.PARAMETER_FOSFAAT
-
     nr = 0
-    for tijdserie in configuration.references.filter(parameter__parameter=parameter, parameter__sourcetype=Parameter.TYPE_MEASURED):
+    for tijdserie in measured_concentrations(configuration, concentration):
         style = dict(color=colors_list[nr], markersize=10, marker='d', linestyle=" ")
         nr += 1
         times, values = get_raw_timeseries(tijdserie.get_timeseries(),
@@ -1366,20 +1373,17 @@ class LegendInfo(object):
         return label_name, label
 
 
-def waterbalance_phosphate_impact(
-           configuration, waterbalance_computer, start_date, end_date,
-            period, width, height):
-    """Draw the graph for the given area and of the given type."""
-    calc_start_datetime, calc_end_datetime = configuration.get_calc_period(date2datetime(end_date))
-
-    graph = Graph(start_date, end_date, width, height)
-    graph.suptitle("Fosfaatbelasting [mg/m2/dag]")
-
-    bar_width = BAR_WIDTH[period]
+def phosphate_impact_bars(waterbalance_computer, calc_start_datetime,
+                          calc_end_datetime):
+    """Return the bars and legend of the phosphate impact graph.
 
-    t1 = time()
+    This function returns the tuple of the bars of the minimum impacts, the
+    bars of the incremental impacts and the legend. Each bar is a tuple of
+    its name, time series, Label and color, and each legend entry a tuple of
+    its order, name and color. The bars are sorted in the order in which they
+    are stacked and the legend entries in the order in which they are shown.
 
-    #get data and bars
+    """
     impacts, impacts_incremental = waterbalance_computer.get_impact_timeseries(calc_start_datetime,
                                                                                calc_end_datetime)
 
@@ -1406,11 +1410,31 @@ def waterbalance_phosphate_impact(
         legend.append((label.order, name, label.color))
         legend.append((label.order + 1000, name_incremental, label.color_increment))
 
+    legend = sorted(legend, key=lambda bar:-bar[0])
+    bars_minimum = sorted(bars_minimum, key=lambda bar:bar[2].order)
+    bars_increment = sorted(bars_increment, key=lambda bar:bar[2].order)
+    return bars_minimum, bars_increment, legend
+
+
+def waterbalance_phosphate_impact(
+           configuration, waterbalance_computer, start_date, end_date,
+            period, width, height):
+    """Draw the graph for the given area and of the given type."""
+    calc_start_datetime, calc_end_datetime = configuration.get_calc_period(date2datetime(end_date))
+
+    graph = Graph(start_date, end_date, width, height)
+    graph.suptitle("Fosfaatbelasting [mg/m2/dag]")
+
+    bar_width = BAR_WIDTH[period]
+
+    t1 = time()
+
+    bars_minimum, bars_increment, legend = phosphate_impact_bars(
+        waterbalance_computer, calc_start_datetime, calc_end_datetime)
+
     logger.debug('1: Got bars in %s seconds' %
                  (time() - t1))
 
-    legend = sorted(legend, key=lambda bar:-bar[0])
-
     names = [abridged_legend_name(line[1]) for line in legend]
     colors = [line[2] for line in legend]
     handles = [Line2D([], [], color=color, lw=4) for color in colors]
@@ -1418,9 +1442,6 @@ def waterbalance_phosphate_impact(
     graph.legend_space()
     graph.legend(handles, names)
 
-    bars_minimum = sorted(bars_minimum, key=lambda bar:bar[2].order)
-    bars_increment = sorted(bars_increment, key=lambda bar:bar[2].order)
-
     top_height = TopHeight()
 
     for bars in [bars_minimum, bars_increment]:
@@ -1445,36 +1466,61 @@ def waterbalance_phosphate_impact(
     return graph
 
 
-def waterbalance_area_graphs(request,
-                             area_slug,
-                             scenario_slug,
-                             graph_type=None):
+def graph_cache_key(cache_key_name, graph_type, parameters):
+    """Return the key name of the rendered graph with the given parameters.
+
+    The key name contains the fingerprint of the computation and the graph
+    parameters, so it changes when the rendered graph would change.
+
     """
-    Return area graph.
+    parameters = sorted(parameters.items())
+    digest = hashlib.md5(repr((graph_type, parameters))).hexdigest()
+    return cache_key_name.get("graph::" + digest)
+
+
+def graph_etag(cache_key_name, graph_type, parameters):
+    """Return the entity tag of the graph with the given parameters.
+
+    The entity tag only depends on the configuration slug, its fingerprint
+    and generation and the graph parameters, so it can be derived from the
+    CacheKeyName that method CacheKeyName.from_cache returns.
 
     """
-    configuration = WaterbalanceConf.objects.get(
-        waterbalance_area__slug=area_slug,
-        waterbalance_scenario__slug=scenario_slug)
-    area = Area(configuration)
-    waterbalance_computer = \
-        CachedWaterbalanceComputer(CacheKeyName(configuration), configuration,
-                                   area)
+    return hashlib.md5(graph_cache_key(cache_key_name, graph_type,
+                                       parameters)).hexdigest()
 
-    period = request.GET.get('period', 'month')
-    reset_period = request.GET.get('reset_period', 'year')
-    #start_datetime, end_datetime = retrieve_horizon(request)
-    #start_date = start_datetime.date()
-    #end_date = end_datetime.date() + timedelta(1)
 
-    # Don't know the difference in above start/end dates. This seems
-    # better, but not sure if it works correctly with existing
-    # functions.
-    start_date, end_date = current_start_end_dates(request)
+def not_modified_response(etag):
+    """Return the 304 Not Modified response for the given entity tag."""
+    response = HttpResponseNotModified()
+    response['ETag'] = '"%s"' % etag
+    response['Cache-Control'] = 'max-age=600'
+    return response
 
-    width = request.GET.get('width', 1600)
-    height = request.GET.get('height', 400)
 
+def is_not_modified(request, etag, last_modified=None):
+    """Return True when the client already has the given version of a graph.
+
+    The client has that version when it sends the given entity tag in its
+    If-None-Match header or when it sends an If-Modified-Since header that is
+    not older than the given time of last modification.
+
+    """
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        etags = [tag.strip() for tag in if_none_match.split(',')]
+        return '"%s"' % etag in etags or '*' in etags
+    if last_modified is None:
+        return False
+    if_modified_since = request.META.get('HTTP_IF_MODIFIED_SINCE')
+    if if_modified_since is None:
+        return False
+    return not was_modified_since(if_modified_since, last_modified)
+
+
+def render_graph(configuration, waterbalance_computer, graph_type,
+                 start_date, end_date, period, reset_period, width, height):
+    """Return the HttpResponse that contains the PNG of the given graph."""
     if graph_type == 'waterbalans':
         graph = waterbalance_area_graph(
             configuration, waterbalance_computer, start_date, end_date,
@@ -1505,8 +1551,85 @@ def waterbalance_area_graphs(request,
     #canvas = FigureCanvas(graph.figure)
     #response = HttpResponse(content_type='image/png')
 
-    response = graph.http_png()
-    response['Cache-Control'] = 'max-age=600'
+    return graph.http_png()
+
+
+def waterbalance_area_graphs(request,
+                             area_slug,
+                             scenario_slug,
+                             graph_type=None):
+    """
+    Return area graph.
+
+    The rendered image is stored in the cache under a key that contains the
+    fingerprint of the computation and the graph parameters. The response
+    has an ETag and Last-Modified header, so a client that already has the
+    image can revalidate it without the image being rendered again.
+
+    The view does not compute the waterbalance itself. When the results are
+    not in the cache, it queues their computation and returns a 202 response,
+    see function computation_pending_response.
+
+    """
+    configuration = WaterbalanceConf.objects.select_related(
+        'waterbalance_area', 'waterbalance_scenario').get(
+        waterbalance_area__slug=area_slug,
+        waterbalance_scenario__slug=scenario_slug)
+
+    period = request.GET.get('period', 'month')
+    reset_period = request.GET.get('reset_period', 'year')
+    #start_datetime, end_datetime = retrieve_horizon(request)
+    #start_date = start_datetime.date()
+    #end_date = end_datetime.date() + timedelta(1)
+
+    # Don't know the difference in above start/end dates. This seems
+    # better, but not sure if it works correctly with existing
+    # functions.
+    start_date, end_date = current_start_end_dates(request)
+
+    width = request.GET.get('width', 1600)
+    height = request.GET.get('height', 400)
+
+    parameters = {'period': period,
+                  'reset_period': reset_period,
+                  'start_date': start_date,
+                  'end_date': end_date,
+                  'width': width,
+                  'height': height}
+
+    # a client that revalidates its image is answered from the fingerprint
+    # and generation in the cache, without computing the fingerprint
+    cache_key_name = CacheKeyName.from_cache(configuration)
+    if cache_key_name is not None:
+        etag = graph_etag(cache_key_name, graph_type, parameters)
+        if is_not_modified(request, etag):
+            return not_modified_response(etag)
+    else:
+        cache_key_name = CacheKeyName(configuration)
+
+    key_name = graph_cache_key(cache_key_name, graph_type, parameters)
+    etag = graph_etag(cache_key_name, graph_type, parameters)
+    cache_codec = CacheCodec(cache)
+    cached = cache_codec.get(key_name)
+    if cached is None:
+        if not is_computed(configuration, cache_key_name):
+            return computation_pending_response(configuration)
+        area = Area(configuration)
+        waterbalance_computer = \
+            CachedWaterbalanceComputer(cache_key_name, configuration, area)
+        png = render_graph(configuration, waterbalance_computer,
+                           graph_type, start_date, end_date, period,
+                           reset_period, width, height).content
+        cached = (time(), png)
+        cache_codec.set(key_name, cached)
+    last_modified, png = cached
+    if is_not_modified(request, etag, last_modified):
+        response = not_modified_response(etag)
+    else:
+        response = HttpResponse(png, content_type='image/png')
+        response['ETag'] = '"%s"' % etag
+        response['Cache-Control'] = 'max-age=600'
+    response['Last-Modified'] = http_date(last_modified)
     #canvas.print_png(response)
 
     return response
@@ -1542,6 +1665,11 @@ def waterbalance_shapefile_search(request):
 def graph_select(request):
     """
     Processes ajax call, return appropriate png urls.
+
+    The JSON object contains whether the waterbalance has been computed and
+    the urls of the selected graphs. When the results are not in the cache,
+    this view queues their computation and returns no urls, so the page can
+    poll view computation_status and ask again when they are ready.
     """
     if request.is_ajax():
         area_slug = request.POST['area_slug']
@@ -1550,38 +1678,27 @@ def graph_select(request):
         period = request.POST['period']
         reset_period = request.POST['reset_period']
 
-        graphs = []
-        for graph_type, name in GRAPH_TYPES:
-            if not graph_type in selected_graph_types:
-                continue
-
-            url = (reverse('waterbalance_area_graph',
-                           kwargs={'area_slug': area_slug,
-                                   'scenario_slug': scenario_slug,
-                                   'graph_type': graph_type}) +
-                   '?period=' + period +
-                   '&reset_period=' + reset_period)
-            graphs.append(url)
-        json = simplejson.dumps(graphs)
-
-        # If the data has not been cached, we make sure we compute and cache it
-        # now, otherwise all graphs start a computation on their own.
-
         configuration = WaterbalanceConf.objects.get(
             waterbalance_area__slug=area_slug,
             waterbalance_scenario__slug=scenario_slug)
 
-        cache_key_name = CacheKeyName(configuration)
-        area = Area(configuration)
-        waterbalance_computer = CachedWaterbalanceComputer(cache_key_name,
-                                                           configuration,
-                                                           area)
-
-        if waterbalance_computer.get_cached_data("sluice_error") is None:
-            calc_start_datetime, calc_end_datetime = \
-                configuration.get_calc_period()
-            waterbalance_computer.compute(calc_start_datetime,
-                                          calc_end_datetime)
+        graphs = []
+        computed = is_computed(configuration)
+        if not computed:
+            enqueue_computation(configuration)
+        else:
+            for graph_type, name in GRAPH_TYPES:
+                if not graph_type in selected_graph_types:
+                    continue
+
+                url = (reverse('waterbalance_area_graph',
+                               kwargs={'area_slug': area_slug,
+                                       'scenario_slug': scenario_slug,
+                                       'graph_type': graph_type}) +
+                       '?period=' + period +
+                       '&reset_period=' + reset_period)
+                graphs.append(url)
+        json = simplejson.dumps({"computed": computed, "graphs": graphs})
 
         return HttpResponse(json, mimetype='application/json')
     else:
@@ -1616,29 +1733,85 @@ def _actual_recalculation(request, area_slug, scenario_slug):
                             recalculate=True)
 
 
+def is_computed(configuration, cache_key_name=None):
+    """Return True when the results of the given configuration are cached.
+
+    The computation worker stores a marker after it has cached each item the
+    graphs read, so when the marker is present, the graphs can be drawn from
+    the cache.
+
+    """
+    if cache_key_name is None:
+        cache_key_name = CacheKeyName(configuration)
+    key_name = cache_key_name.get(COMPUTED_MARKER)
+    return cache.get(key_name) is not None
+
+
+def enqueue_computation(configuration):
+    """Queue the computation of the configuration unless it is pending.
+
+    The jobs that a crashed worker left behind are marked as failed first, so
+    they do not block a new job.
+
+    """
+    ComputationJob.fail_stale()
+    job = ComputationJob.latest(configuration)
+    if job is None or not job.is_pending():
+        job = ComputationJob.enqueue(configuration)
+    return job
+
+
+def computation_pending_response(configuration):
+    """Return the response for data of which the computation is pending.
+
+    The response has status 202 Accepted and contains the status of the
+    computation as JSON, see view computation_status. This function queues
+    the computation when needed.
+
+    """
+    enqueue_computation(configuration)
+    json = simplejson.dumps(computation_status_dict(configuration))
+    response = HttpResponse(json, mimetype='application/json', status=202)
+    response['Retry-After'] = '5'
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+
+def computation_status_dict(configuration):
+    """Return the dict that describes the computation of the configuration."""
+    ComputationJob.fail_stale()
+    job = ComputationJob.latest(configuration)
+    computed = is_computed(configuration)
+    if job is None:
+        status = computed and "done" or "idle"
+        message = ""
+    else:
+        status = job.get_status_display()
+        message = job.message
+    return {"status": status, "message": message, "computed": computed}
+
+
 def recalculate_graph_data(request, area_slug=None, scenario_slug=None):
-    """Recalculate the graph data and store the data in the cache."""
+    """Enqueue the recomputation of the graph data.
+
+    The results in the cache are invalidated and a worker process computes
+    and stores the new results, see management command compute_worker. An
+    ajax request receives the status of the computation as JSON, so the page
+    can poll view computation_status until the results are ready.
+
+    """
     if request.method == "POST":
 
         configuration = WaterbalanceConf.objects.get(
              waterbalance_area__slug=area_slug,
              waterbalance_scenario__slug=scenario_slug)
 
-        cache_key_name = CacheKeyName(configuration)
-        names = [ "sluice_error", "total_outtakes", "incoming", "outgoing",
-            "outcome", "pair", "ref_in", "ref_out", "sluice_error_waterlevel",
-            "fractions_1", "fractions_2", "concentrations", "impact",
-            "impact_incremental" ]
-        key_names = [cache_key_name.get(name) for name in names]
-        cache.delete_many(key_names)
-        area = Area(configuration)
-        waterbalance_computer = \
-                              CachedWaterbalanceComputer(cache_key_name,
-                                                         configuration,
-                                                         area)
-        calc_start_datetime, calc_end_datetime = configuration.get_calc_period()
-        waterbalance_computer.compute(calc_start_datetime, calc_end_datetime)
+        CacheKeyName(configuration).invalidate()
+        ComputationJob.enqueue(configuration)
 
+        if request.is_ajax():
+            json = simplejson.dumps(computation_status_dict(configuration))
+            return HttpResponse(json, mimetype='application/json')
         return HttpResponseRedirect(
             reverse(
                 'waterbalance_area_summary',
@@ -1648,6 +1821,23 @@ def recalculate_graph_data(request, area_slug=None, scenario_slug=None):
         return HttpResponse("false")
 
 
+def computation_status(request, area_slug=None, scenario_slug=None):
+    """Return the status of the computation of the graph data as JSON.
+
+    The JSON object contains the status of the most recent computation job,
+    which is 'queued', 'running', 'done' or 'failed', or 'idle' when there
+    has not been a job, the error message of a failed job and whether the
+    results are in the cache.
+
+    """
+    configuration = get_object_or_404(
+        WaterbalanceConf,
+        waterbalance_area__slug=area_slug,
+        waterbalance_scenario__slug=scenario_slug)
+    json = simplejson.dumps(computation_status_dict(configuration))
+    return HttpResponse(json, mimetype='application/json')
+
+
 def waterbalance_area_edit(request,
                            area_slug=None,
                            template='lizard_waterbalance/waterbalance_area_edit.html',
@@ -15,6 +15,8 @@ from lizard_waterbalance.localmock import Mock
 from lizard_waterbalance.views import CacheKeyName
 from lizard_waterbalance.views import DataForCumulativeGraph
 from lizard_waterbalance.views import LegendInfo
+from lizard_waterbalance.views import graph_cache_key
+from lizard_waterbalance.views import is_not_modified
 from lizard_waterbalance.views import raw_add_timeseries
 from lizard_waterbalance.views import retrieve_viewable_configurations
 from timeseries.timeseriesstub import TimeseriesStub
@@ -116,22 +118,111 @@ class CacheKeyNameTests(TestCase):
 
     def test_a(self):
         """Test the case for a __unicode__ return value without spaces."""
-        configuration = Mock({"__unicode__": "hello"})
+        configuration = Mock({"__unicode__": "hello", "fingerprint": "abc"})
         cache_key_name = CacheKeyName(configuration)
         self.assertEqual("hello", cache_key_name.configuration_slug)
 
     def test_b(self):
         """Test the case for a __unicode__ return value with spaces."""
-        configuration = Mock({"__unicode__": "hello world"})
+        configuration = Mock({"__unicode__": "hello world",
+                              "fingerprint": "abc"})
         cache_key_name = CacheKeyName(configuration)
         self.assertEqual("hello-world", cache_key_name.configuration_slug)
 
     def test_c(self):
         """Test method get."""
-        configuration = Mock({"__unicode__": "hello world"})
+        configuration = Mock({"__unicode__": "hello world",
+                              "fingerprint": "abc"})
         cache_key_name = CacheKeyName(configuration)
-        self.assertEqual("sluice_error::hello-world",
+        self.assertEqual("sluice_error::hello-world::" +
+                         cache_key_name.fingerprint,
                          cache_key_name.get("sluice_error"))
+        self.assertTrue(cache_key_name.fingerprint.startswith("abc."))
+
+    def test_d(self):
+        """Test method get returns a new key name after invalidate."""
+        configuration = Mock({"__unicode__": "hello world",
+                              "fingerprint": "abc"})
+        cache_key_name = CacheKeyName(configuration)
+        key_name = cache_key_name.get("sluice_error")
+        cache_key_name.invalidate()
+        self.assertNotEqual(key_name, cache_key_name.get("sluice_error"))
+        other_cache_key_name = CacheKeyName(configuration)
+        self.assertEqual(cache_key_name.get("sluice_error"),
+                         other_cache_key_name.get("sluice_error"))
+
+    def test_e(self):
+        """Test the fingerprint of the configuration is kept in the cache."""
+        configuration = Mock({"__unicode__": "kept fingerprint",
+                              "fingerprint": "abc"})
+        CacheKeyName(configuration)
+        configuration = Mock({"__unicode__": "kept fingerprint",
+                              "fingerprint": "def"})
+        cache_key_name = CacheKeyName(configuration)
+        self.assertTrue(cache_key_name.fingerprint.startswith("abc."))
+
+    def test_f(self):
+        """Test from_cache only returns a CacheKeyName for a known fingerprint."""
+        configuration = Mock({"__unicode__": "from cache",
+                              "fingerprint": "abc"})
+        self.assertEqual(None, CacheKeyName.from_cache(configuration))
+        cache_key_name = CacheKeyName(configuration)
+        self.assertEqual(cache_key_name.get("sluice_error"),
+                         CacheKeyName.from_cache(configuration).get(
+                             "sluice_error"))
+
+class GraphCacheKeyTests(TestCase):
+
+    def setUp(self):
+        configuration = Mock({"__unicode__": "hello world",
+                              "fingerprint": "abc"})
+        self.cache_key_name = CacheKeyName(configuration)
+
+    def test_a(self):
+        """Test the key name does not depend on the order of the parameters."""
+        key_name = graph_cache_key(self.cache_key_name, "waterpeil",
+                                   {"period": "month", "width": 800})
+        self.assertEqual(key_name,
+                         graph_cache_key(self.cache_key_name, "waterpeil",
+                                         {"width": 800, "period": "month"}))
+
+    def test_b(self):
+        """Test the key name depends on the graph type and parameters."""
+        key_name = graph_cache_key(self.cache_key_name, "waterpeil",
+                                   {"period": "month"})
+        self.assertNotEqual(key_name,
+                            graph_cache_key(self.cache_key_name, "waterbalans",
+                                            {"period": "month"}))
+        self.assertNotEqual(key_name,
+                            graph_cache_key(self.cache_key_name, "waterpeil",
+                                            {"period": "year"}))
+
+
+class Request(object):
+
+    def __init__(self, **meta):
+        self.META = meta
+
+
+class IsNotModifiedTests(TestCase):
+
+    def test_a(self):
+        """Test a request without validators needs the graph."""
+        self.assertFalse(is_not_modified(Request(), "abc", 0))
+
+    def test_b(self):
+        """Test a request with the current entity tag is not modified."""
+        request = Request(HTTP_IF_NONE_MATCH='"def", "abc"')
+        self.assertTrue(is_not_modified(request, "abc"))
+        self.assertFalse(is_not_modified(request, "ghi"))
+
+    def test_c(self):
+        """Test a request that is as recent as the graph is not modified."""
+        request = Request(HTTP_IF_MODIFIED_SINCE="Mon, 22 Oct 2012 10:00:00 GMT")
+        self.assertTrue(is_not_modified(request, "abc", 1350900000))
+        self.assertFalse(is_not_modified(request, "abc", 1350900001))
+        self.assertFalse(is_not_modified(request, "abc"))
+
 
 class LegendInfoTestSuite(TestCase):
 
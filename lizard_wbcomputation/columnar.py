@@ -0,0 +1,147 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#******************************************************************************
+#
+# This file is part of the lizard_waterbalance Django app.
+#
+# The lizard_waterbalance app is free software: you can redistribute it and/or
+# modify it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or (at your
+# option) any later version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# the lizard_waterbalance app.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2012 Nelen & Schuurmans
+#
+#******************************************************************************
+
+"""Align time series on a shared date axis and store them as columns.
+
+A columnar file is a NumPy .npz file that contains the following arrays:
+  *dates*
+    the datetime64 array of the dates on which at least one time series has
+    an event
+  *values*
+    the float array with a row for each date and a column for each time
+    series, where NaN means that the time series has no event on that date
+  *location_ids*, *parameter_ids* and *units*
+    the string arrays of the location, parameter and units of each column
+
+Such a file can be read without this package, for example::
+
+  data = numpy.load('waterbalance.npz')
+  column = list(data['parameter_ids']).index('water_level')
+  water_level = data['values'][:, column]
+
+"""
+
+import logging
+
+import numpy
+
+logger = logging.getLogger(__name__)
+
+DATE_TYPE = 'datetime64[us]'
+
+# the names of the arrays in a columnar file
+ARRAY_NAMES = ('dates', 'values', 'location_ids', 'parameter_ids', 'units')
+
+
+def timeseries_to_arrays(timeseries):
+    """Return the pair of the date array and value array of the time series."""
+    dates, values = [], []
+    for date, value in timeseries.events():
+        dates.append(date)
+        values.append(value)
+    return (numpy.array(dates, dtype=DATE_TYPE),
+            numpy.array(values, dtype=float))
+
+
+def align_columns(data_cols, start_date, end_date, missing_value=0.0):
+    """Return the events of the given columns aligned on their dates.
+
+    Parameter *data_cols* is the dict of column key to time series. The keys
+    are sorted, so the order of the keys determines the order of the columns.
+
+    This function returns the triple of the sorted list of column keys, the
+    array of dates from start_date up to and including end_date on which at
+    least one time series has an event and the array of values that has a row
+    for each of these dates and a column for each key. The value of a time
+    series that has no event on a date is the given missing value.
+
+    """
+    keys = sorted(data_cols.keys())
+    arrays = [timeseries_to_arrays(data_cols[key]) for key in keys]
+
+    all_dates = [dates for dates, values in arrays]
+    all_dates.append(numpy.zeros(0, dtype=DATE_TYPE))
+    dates = numpy.unique(numpy.concatenate(all_dates))
+    start, end = numpy.array([start_date, end_date], dtype=DATE_TYPE)
+    dates = dates[(dates >= start) & (dates <= end)]
+
+    values = numpy.empty((len(dates), len(keys)))
+    values.fill(missing_value)
+    for index, (event_dates, event_values) in enumerate(arrays):
+        positions = numpy.searchsorted(dates, event_dates)
+        present = positions < len(dates)
+        present[present] = dates[positions[present]] == event_dates[present]
+        values[positions[present], index] = event_values[present]
+    return keys, dates, values
+
+
+def timeseries_columns(timeseries_list):
+    """Return the dict of column key to time series of the given time series.
+
+    Each time series should have the attributes location_id, parameter_id and
+    units, which form its column key. When multiple time series have the same
+    key, only the last one is kept.
+
+    """
+    data_cols = {}
+    for timeseries in timeseries_list:
+        key = (timeseries.location_id, timeseries.parameter_id,
+               timeseries.units)
+        if key in data_cols:
+            logger.warning("multiple time series for location '%s' and "
+                           "parameter '%s', keep the last one", key[0], key[1])
+        data_cols[key] = timeseries
+    return data_cols
+
+
+def write_columnar_file(file_name, data_cols, start_date, end_date):
+    """Write the given columns to the given columnar file.
+
+    Parameter *data_cols* is the dict of (location id, parameter id, units)
+    to time series. The file is compressed and when its name does not end
+    with '.npz', NumPy appends that extension.
+
+    """
+    keys, dates, values = align_columns(data_cols, start_date, end_date,
+                                        numpy.nan)
+    location_ids, parameter_ids, units = \
+        [[unicode(key[index]) for key in keys] for index in range(3)]
+    numpy.savez_compressed(file_name,
+                           dates=dates,
+                           values=values,
+                           location_ids=numpy.array(location_ids,
+                                                    dtype=unicode),
+                           parameter_ids=numpy.array(parameter_ids,
+                                                     dtype=unicode),
+                           units=numpy.array(units, dtype=unicode))
+    logger.debug("wrote %d columns of %d dates to %s", len(keys), len(dates),
+                 file_name)
+
+
+def read_columnar_file(file_name):
+    """Return the dict of array name to array of the given columnar file."""
+    data = numpy.load(file_name)
+    try:
+        return dict((name, data[name]) for name in ARRAY_NAMES)
+    finally:
+        data.close()
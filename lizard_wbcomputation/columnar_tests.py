@@ -0,0 +1,93 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# pylint: disable=C0111
+
+# The lizard_wbcomputation package implements the computational core of the
+# lizard waterbalance Django app.
+#
+# Copyright (C) 2012 Nelen & Schuurmans
+#
+# This package is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this package.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import tempfile
+
+from datetime import datetime
+from unittest import TestCase
+
+import numpy
+
+from lizard_wbcomputation.columnar import align_columns
+from lizard_wbcomputation.columnar import read_columnar_file
+from lizard_wbcomputation.columnar import write_columnar_file
+from timeseries.timeseriesstub import TimeseriesStub
+
+def create_timeseries(day2value):
+    timeseries = TimeseriesStub()
+    for day, value in sorted(day2value.items()):
+        timeseries.add_value(datetime(2011, 1, day), value)
+    return timeseries
+
+class AlignColumnsTests(TestCase):
+
+    def setUp(self):
+        self.data_cols = {
+            (3, 'first', '[-]'): create_timeseries({1: 1.0, 2: 2.0, 3: 3.0}),
+            (2, 'second', '[-]', 'label'): \
+                create_timeseries({3: 30.0, 4: 40.0, 5: 50.0})}
+
+    def test_a(self):
+        """Test the columns are ordered by their key."""
+        keys, dates, values = align_columns(self.data_cols,
+                                            datetime(2011, 1, 1),
+                                            datetime(2011, 1, 5))
+        self.assertEqual([(2, 'second', '[-]', 'label'), (3, 'first', '[-]')],
+                         keys)
+
+    def test_b(self):
+        """Test the missing events are 0.0 and the period is respected."""
+        keys, dates, values = align_columns(self.data_cols,
+                                            datetime(2011, 1, 2),
+                                            datetime(2011, 1, 4))
+        self.assertEqual([datetime(2011, 1, 2), datetime(2011, 1, 3),
+                          datetime(2011, 1, 4)], dates.tolist())
+        self.assertEqual([[0.0, 2.0], [30.0, 3.0], [40.0, 0.0]],
+                         values.tolist())
+
+class ColumnarFileTests(TestCase):
+
+    def setUp(self):
+        handle, self.file_name = tempfile.mkstemp(suffix='.npz')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.file_name)
+
+    def test_a(self):
+        """Test the columns and their metadata are written and read."""
+        data_cols = {
+            ('SAP', 'water_level', 'mNAP'): create_timeseries({1: -1.0}),
+            ('SAP', 'seepage', 'm3/dag'): create_timeseries({2: 2.0})}
+        write_columnar_file(self.file_name, data_cols, datetime(2011, 1, 1),
+                            datetime(2011, 1, 31))
+        data = read_columnar_file(self.file_name)
+        self.assertEqual([datetime(2011, 1, 1), datetime(2011, 1, 2)],
+                         data['dates'].tolist())
+        self.assertEqual(['seepage', 'water_level'],
+                         data['parameter_ids'].tolist())
+        self.assertEqual(['m3/dag', 'mNAP'], data['units'].tolist())
+        values = data['values']
+        self.assertTrue(numpy.isnan(values[0, 0]))
+        self.assertEqual([2.0, -1.0], [values[1, 0], values[0, 1]])
@@ -30,15 +30,32 @@
 
 import time
 import logging
+import math
+import numpy
 import xlrd
 from xlutils.copy import copy
 import xlwt
 
+try:
+    import xlsxwriter
+except ImportError:
+    # xlsxwriter is only required to export to an .xlsx file
+    xlsxwriter = None
 
-from timeseries.timeseriesstub import enumerate_dict_events
+from lizard_wbcomputation.columnar import DATE_TYPE
+from lizard_wbcomputation.columnar import align_columns
 
 logger = logging.getLogger(__name__)
 
+EXCEL_DATE_FMT = 'D/M/YY'
+
+# the rows of the labels, names and units of the columns and the first row of
+# the events
+LABEL_ROW = 9
+NAME_ROW = 10
+UNIT_ROW = 11
+START_ROW = 13
+
 ######################################################
 
 
@@ -46,44 +63,150 @@ def test_export():
     pass
     #TODO
 
+
+def header_rows(keys):
+    """Return the list of (row, column, text) of the header of the columns.
+
+    The cells are ordered by row, so they can be written to a sheet that
+    only accepts rows in ascending order.
+
+    """
+    labels = [(LABEL_ROW, key[0], key[3]) for key in keys if len(key) > 3]
+    names = [(NAME_ROW, 0, 'datum')] + \
+        [(NAME_ROW, key[0], key[1]) for key in keys]
+    units = [(UNIT_ROW, key[0], key[2]) for key in keys]
+    return labels + names + units
+
+
+def present_cells(cols, row_values):
+    """Return the list of (column, value) of the values that are not NaN.
+
+    A NaN value means that the time series of the column has no event on the
+    date of the row, so its cell remains empty.
+
+    """
+    return [(col, value) for col, value in zip(cols, row_values)
+            if not math.isnan(value)]
+
+
+class XlsExport(object):
+    """Writes the export to a copy of an Excel 97 template.
+
+    xlwt keeps the complete workbook in memory until it is saved.
+
+    """
+    def __init__(self, template_fileloc):
+        self.template = xlrd.open_workbook(template_fileloc, on_demand=True)
+        self.workbook = copy(self.template)
+        self.date_style = xlwt.XFStyle()
+        self.date_style.num_format_str = EXCEL_DATE_FMT
+
+    def get_sheet(self, name=None):
+        """Return the sheet with the given name or the first sheet."""
+        if name is None:
+            return self.workbook.get_sheet(0)
+        sheet_names = self.template.sheet_names()
+        if name in sheet_names:
+            return self.workbook.get_sheet(sheet_names.index(name))
+        return self.workbook.add_sheet(name)
+
+    def write_table(self, keys, dates, values, name=None):
+        """Write the header and the rows of the aligned columns."""
+        sheet = self.get_sheet(name)
+        for row, col, text in header_rows(keys):
+            sheet.write(row, col, text)
+        cols = [key[0] for key in keys]
+        dates = dates.astype(DATE_TYPE).tolist()
+        for row, (date, row_values) in enumerate(zip(dates, values.tolist())):
+            sheet_row = sheet.row(START_ROW + row)
+            sheet_row.set_cell_date(0, date, self.date_style)
+            for col, value in present_cells(cols, row_values):
+                sheet_row.set_cell_number(col, value)
+
+    def save(self, output_fileloc):
+        self.workbook.save(output_fileloc)
+        self.template.release_resources()
+
+
+class XlsxExport(object):
+    """Streams the export to an .xlsx file.
+
+    The workbook is written in the constant memory mode of xlsxwriter, which
+    flushes each row to disk as soon as the next row is written. As xlsxwriter
+    cannot read the template, the export contains empty sheets with the names
+    of the template instead of a copy of the template.
+
+    """
+    def __init__(self, template_fileloc, output_fileloc):
+        if xlsxwriter is None:
+            raise ImportError("an export to .xlsx requires xlsxwriter")
+        template = xlrd.open_workbook(template_fileloc, on_demand=True)
+        self.sheet_names = template.sheet_names()
+        template.release_resources()
+        self.workbook = xlsxwriter.Workbook(output_fileloc,
+                                            {'constant_memory': True})
+        self.date_format = self.workbook.add_format(
+            {'num_format': EXCEL_DATE_FMT})
+        # the first sheet is added now, so it remains the first sheet
+        self.sheets = {None: self.workbook.add_worksheet(self.sheet_names[0])}
+
+    def get_sheet(self, name=None):
+        """Return the sheet with the given name or the first sheet."""
+        if name not in self.sheets:
+            self.sheets[name] = self.workbook.add_worksheet(name)
+        return self.sheets[name]
+
+    def write_table(self, keys, dates, values, name=None):
+        """Write the header and the rows of the aligned columns."""
+        sheet = self.get_sheet(name)
+        for row, col, text in header_rows(keys):
+            sheet.write_string(row, col, text)
+        width = max([key[0] for key in keys] + [0])
+        positions = [key[0] - 1 for key in keys]
+        dates = dates.astype(DATE_TYPE).tolist()
+        for row, (date, row_values) in enumerate(zip(dates, values.tolist())):
+            cells = [None] * width
+            for position, value in present_cells(positions, row_values):
+                cells[position] = value
+            sheet.write_datetime(START_ROW + row, 0, date, self.date_format)
+            sheet.write_row(START_ROW + row, 1, cells)
+
+    def save(self, output_fileloc):
+        self.workbook.close()
+
+
 def export_excel_small(waterbalance_computer, template_fileloc, output_fileloc, start_date, end_date, bucket_export=True,):
-    """ export van een configuratie naar Excel """
+    """ export van een configuratie naar Excel
+
+    When the output file has extension .xlsx, the export is streamed to that
+    file, see XlsxExport, otherwise it is written to a copy of the template.
+
+    """
 
     t1 = time.time()
     logger.debug("%s seconds - got waterbalance computer", time.time() - t1)
 
-    rb = xlrd.open_workbook(template_fileloc, on_demand=True)
-    wb = copy(rb)
+    if output_fileloc.endswith('.xlsx'):
+        export = XlsxExport(template_fileloc, output_fileloc)
+    else:
+        export = XlsExport(template_fileloc)
 
     logger.debug("%s seconds - opened excel template", time.time() - t1)
 
     input_ts = waterbalance_computer.get_input_timeseries(start_date, end_date)
     buckets_summary = waterbalance_computer.get_bucketflow_summary(start_date, end_date)
 
-    start_row = 13
-    row = start_row
-
-    excel_date_fmt = 'D/M/YY'
-    style = xlwt.XFStyle()
-    style.num_format_str = excel_date_fmt
-
-
     bucket_export = True
     #bakjes export
     if bucket_export:
 
-        if u'bakjes' in rb.sheet_names():
-            sheet = wb.sheet_by_name(u'bakjes')
-        else:
-            sheet = wb.add_sheet('bakje')
-
         buckets = waterbalance_computer.get_buckets_timeseries(start_date, end_date)
 
         data_cols = {}
         i = 2
 
         for key, bucket in buckets.items():
-            print key.name
+            logger.debug("export bucket %s", key.name)
 
             data_cols[(i+1, 'storage', '[mm/dag]', key.name)] = bucket.storage
             data_cols[(i+2, 'flow_off', '[mm/dag]')] = bucket.flow_off
@@ -93,34 +216,18 @@ def export_excel_small(waterbalance_computer, template_fileloc, output_fileloc,
 
             i = i + 6
 
-        row = start_row
-
-        sheet.write(10,0,'datum')
-        for key in data_cols.keys():
-            sheet.write(10,key[0],key[1])
-            sheet.write(11,key[0],key[2])
-            if len(key) > 3:
-                sheet.write(9,key[0],key[3])
-
-        for event_dict in enumerate_dict_events(data_cols):
-            date = event_dict['date']
-            sheet.write(row,0,date, style)
-            for key, event in event_dict.items():
-                if not key == 'date':
-                    sheet.write(row,key[0],event[1])
-
-            row = row + 1
-            if date > end_date:
-                break
-
+        keys, dates, values = align_columns(data_cols, start_date, end_date,
+                                            numpy.nan)
+        del data_cols
+        export.write_table(keys, dates, values, u'bakjes')
+        del values
 
+        logger.debug("%s seconds - exported buckets", time.time() - t1)
 
 
     from lizard_wbcomputation.compute import transform_evaporation_timeseries_penman_to_makkink
 
-    sheet = wb.get_sheet(0)
     #tests
-    buckets_summary = waterbalance_computer.get_bucketflow_summary(start_date, end_date)
     vertical_openwater = waterbalance_computer.get_vertical_open_water_timeseries(start_date, end_date)
     level_control = waterbalance_computer.get_level_control_timeseries(start_date, end_date)
     fractions = waterbalance_computer.get_fraction_timeseries(start_date, end_date)
@@ -208,29 +315,13 @@ def export_excel_small(waterbalance_computer, template_fileloc, output_fileloc,
 
     logger.debug("%s seconds - referenced all values", time.time() - t1)
 
-    row = start_row
-
-    sheet.write(10,0,'datum')
-    for key in data_cols.keys():
-        sheet.write(10,key[0],key[1])
-        sheet.write(11,key[0],key[2])
-
-    for event_dict in enumerate_dict_events(data_cols):
-        date = event_dict['date']
-        sheet.write(row,0,date, style)
-        for key, event in event_dict.items():
-            if not key == 'date':
-                sheet.write(row,key[0],event[1])
-
-        row = row + 1
-        if date > end_date:
-            break
+    keys, dates, values = align_columns(data_cols, start_date, end_date,
+                                        numpy.nan)
+    del data_cols
+    export.write_table(keys, dates, values)
 
     #for max: Formula('MAX(A1:B1)')
-    buffer = file(output_fileloc,'w')
-    wb.save(buffer)
-    del wb
-    logger.debug("%s seconds - saved excel file to memory", time.time() - t1)
+    export.save(output_fileloc)
+    logger.debug("%s seconds - saved excel file", time.time() - t1)
 
     return
-
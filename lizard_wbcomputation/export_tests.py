@@ -0,0 +1,45 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# pylint: disable=C0111
+
+# The lizard_wbcomputation package implements the computational core of the
+# lizard waterbalance Django app.
+#
+# Copyright (C) 2012 Nelen & Schuurmans
+#
+# This package is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this package.  If not, see <http://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+
+from lizard_wbcomputation.export import header_rows
+from lizard_wbcomputation.export import present_cells
+
+class HeaderRowsTests(TestCase):
+
+    def test_a(self):
+        """Test the header cells are ordered by row."""
+        keys = [(2, 'second', '[-]', 'label'), (3, 'first', '[-]')]
+        self.assertEqual([(9, 2, 'label'),
+                          (10, 0, 'datum'), (10, 2, 'second'),
+                          (10, 3, 'first'),
+                          (11, 2, '[-]'), (11, 3, '[-]')], header_rows(keys))
+
+
+class PresentCellsTests(TestCase):
+
+    def test_a(self):
+        """Test the cells of missing values are skipped."""
+        self.assertEqual([(2, 1.0), (4, 0.0)],
+                         present_cells([2, 3, 4], [1.0, float('nan'), 0.0]))
@@ -17,6 +17,10 @@ class memoize(object):
 
         http://code.activestate.com/recipes/466320-another-memoize/#c7
 
+    When the instance has a (non-None) attribute 'tracer', the decorator
+    records each invocation of the method as a stage of that
+    lizard_wbcomputation.tracing.Tracer.
+
     """
     def __init__(self, function):
         self._function = function
@@ -26,8 +30,20 @@ class memoize(object):
         return self
     def __call__(self, *args):
         cache = self._instance.__dict__.setdefault(self._cacheName, {})
+        tracer = getattr(self._instance, 'tracer', None)
         if cache.has_key(args):
+            if tracer is not None:
+                tracer.hit(self._function.__name__)
             return cache[args]
-        else:
+        elif tracer is None:
             object = cache[args] = self._function(self._instance, *args)
             return object
+        else:
+            # retrieve the function and instance now as the call may rebind
+            # them when it invokes another memoized method of the instance
+            function, instance = self._function, self._instance
+            with tracer.stage(function.__name__) as record:
+                object = cache[args] = function(instance, *args)
+            if tracer.count_events:
+                record.add_events(object)
+            return object
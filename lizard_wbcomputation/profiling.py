@@ -0,0 +1,91 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# pylint: disable=C0111
+
+# The lizard_wbcomputation package implements the computational core of the
+# lizard waterbalance Django app.
+#
+# Copyright (C) 2012 Nelen & Schuurmans
+#
+# This package is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this package.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Capture a cProfile profile of a script or management command.
+
+The profile is dumped to a file that you can inspect with pstats or tools
+such as RunSnakeRun, and a summary of the most expensive functions is
+logged.
+
+"""
+
+import cProfile
+import logging
+import pstats
+
+from StringIO import StringIO
+
+logger = logging.getLogger(__name__)
+
+# number of functions to include in the logged summary
+HOT_FUNCTIONS_LIMIT = 30
+
+
+def log_hot_functions(profiler, limit=HOT_FUNCTIONS_LIMIT, log=logger):
+    """Log the given number of functions that took the most time.
+
+    The functions are sorted by the time spent in the function itself, that
+    is, excluding the time spent in the functions it called.
+
+    """
+    stream = StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats('time').print_stats(limit)
+    log.info("the %d functions that took the most time:\n%s", limit,
+             stream.getvalue())
+
+
+def run_profiled(profile_file, function, *args, **kwargs):
+    """Call the given function under the profiler and return its result.
+
+    The profile is dumped to the given file and the hot functions are logged,
+    also when the function raises an exception. Pass keyword argument 'log'
+    to specify the logger to use instead of the logger of this module.
+
+    """
+    log = kwargs.pop('log', logger)
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args, **kwargs)
+    finally:
+        profiler.dump_stats(profile_file)
+        log.info("profile written to %s", profile_file)
+        log_hot_functions(profiler, log=log)
+
+
+def profiled(handle):
+    """Decorator to profile a management command when option profile is set.
+
+    The decorator is meant for the handle method of a management command
+    that has a '--profile' option: when the option specifies a file name, the
+    command runs under the profiler and the profile is dumped to that file.
+
+    """
+    def wrapper(self, *args, **options):
+        profile_file = options.get('profile')
+        if profile_file is None:
+            return handle(self, *args, **options)
+        return run_profiled(profile_file, handle, self, *args, **options)
+    wrapper.__name__ = handle.__name__
+    wrapper.__doc__ = handle.__doc__
+    return wrapper
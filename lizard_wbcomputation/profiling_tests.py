@@ -0,0 +1,73 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# pylint: disable=C0111
+
+# The lizard_wbcomputation package implements the computational core of the
+# lizard waterbalance Django app.
+#
+# Copyright (C) 2012 Nelen & Schuurmans
+#
+# This package is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this package.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import pstats
+import tempfile
+
+from unittest import TestCase
+
+from lizard_wbcomputation.profiling import profiled
+from lizard_wbcomputation.profiling import run_profiled
+
+
+def add(a, b):
+    return a + b
+
+
+class Command(object):
+
+    @profiled
+    def handle(self, *args, **options):
+        return sum(args)
+
+
+class ProfilingTests(TestCase):
+
+    def setUp(self):
+        handle, self.profile_file = tempfile.mkstemp(suffix='.prof')
+        os.close(handle)
+
+    def tearDown(self):
+        os.remove(self.profile_file)
+
+    def test_a(self):
+        """Test run_profiled returns the result and dumps the profile."""
+        self.assertEqual(3, run_profiled(self.profile_file, add, 1, b=2))
+        stats = pstats.Stats(self.profile_file)
+        functions = [function[2] for function in stats.stats]
+        self.assertTrue('add' in functions)
+
+    def test_b(self):
+        """Test the decorated command is profiled when option profile is set."""
+        command = Command()
+        self.assertEqual(3, command.handle(1, 2, profile=self.profile_file))
+        stats = pstats.Stats(self.profile_file)
+        functions = [function[2] for function in stats.stats]
+        self.assertTrue('handle' in functions)
+
+    def test_c(self):
+        """Test the decorated command is not profiled without option profile."""
+        command = Command()
+        self.assertEqual(3, command.handle(1, 2, profile=None))
+        self.assertEqual(0, os.path.getsize(self.profile_file))
@@ -0,0 +1,276 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# pylint: disable=C0111
+
+# The lizard_wbcomputation package implements the computational core of the
+# lizard waterbalance Django app.
+#
+# Copyright (C) 2012 Nelen & Schuurmans
+#
+# This package is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this package.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Specify the parameter and units of each computed time series.
+
+The time series that wbcompute writes to its PI XML output and the columns of
+the columnar export use the same location, parameter and units, which are
+specified in this module. Function spec_columns determines them from the
+mappings of label to time series that a WaterbalanceComputer2 returns.
+
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Units(object):
+    """Specifies the different units for each flow type.
+
+    These units are implemented as class variables to mimic global definitions.
+
+    """
+    concentration = 'g/m3'
+    flow = 'm3/dag'
+    fraction = '[0,1]'
+    impact = 'mg/m2/dag'
+    level = 'mNAP'
+    storage = 'm3'
+
+
+class TimeSeriesSpec(object):
+    """Specifies TimeSeries attributes.
+
+    A TimeSeries has several attributes that have to be set for a TimeSeries to
+    be valid. A TimeSeriesSpec specifies these attributes for a single
+    TimeSeries.
+
+    """
+
+    def __init__(self, parameter_id, units):
+        self.parameter_id = parameter_id
+        self.units = units
+
+
+LABEL2TIMESERIESSPEC = {
+    'drained': \
+        TimeSeriesSpec('discharge_drained', Units.flow),
+    'evaporation': \
+        TimeSeriesSpec('evaporation', Units.flow),
+    'flow_off': \
+        TimeSeriesSpec('discharge_flow_off', Units.flow),
+    'hardened': \
+        TimeSeriesSpec('discharge_hardened', Units.flow),
+    'indraft': \
+        TimeSeriesSpec('indraft', Units.flow),
+    'infiltration': \
+        TimeSeriesSpec('infiltration', Units.flow),
+    'precipitation': \
+        TimeSeriesSpec('precipitation', Units.flow),
+    'seepage': \
+        TimeSeriesSpec('seepage', Units.flow),
+    'water_level': \
+        TimeSeriesSpec('water_level', Units.level),
+    'sluice_error': \
+        TimeSeriesSpec('sluice_error_outlet', Units.flow),
+    'sluice_error_inlet':\
+        TimeSeriesSpec('sluice_error_inlet', Units.flow),
+    'undrained': \
+        TimeSeriesSpec('discharge_drainage', Units.flow),
+    'sewer': \
+        TimeSeriesSpec('discharge_sewer', Units.flow),
+    'min_impact_phosphate_precipitation': \
+        TimeSeriesSpec('min_impact_phosphate_precipitation', Units.impact),
+    'min_impact_phosphate_seepage': \
+        TimeSeriesSpec('min_impact_phosphate_seepage', Units.impact),
+    'incr_impact_phosphate_precipitation': \
+        TimeSeriesSpec('incr_impact_phosphate_precipitation', Units.impact),
+    'incr_impact_phosphate_seepage': \
+        TimeSeriesSpec('incr_impact_phosphate_seepage', Units.impact),
+    'min_impact_nitrogen_precipitation': \
+        TimeSeriesSpec('min_impact_nitrogen_precipitation', Units.impact),
+    'min_impact_nitrogen_seepage': \
+        TimeSeriesSpec('min_impact_nitrogen_seepage', Units.impact),
+    'incr_impact_nitrogen_precipitation': \
+        TimeSeriesSpec('incr_impact_nitrogen_precipitation', Units.impact),
+    'incr_impact_nitrogen_seepage': \
+        TimeSeriesSpec('incr_impact_nitrogen_seepage', Units.impact),
+    'min_impact_phosphate_discharge': \
+        TimeSeriesSpec('min_impact_phosphate_discharge', Units.impact),
+    'incr_impact_phosphate_discharge': \
+        TimeSeriesSpec('incr_impact_phosphate_discharge', Units.impact),
+    'min_impact_nitrogen_discharge': \
+        TimeSeriesSpec('min_impact_nitrogen_discharge', Units.impact),
+    'incr_impact_nitrogen_discharge': \
+        TimeSeriesSpec('incr_impact_nitrogen_discharge', Units.impact),
+    'min_impact_phosphate_level_control': \
+        TimeSeriesSpec('min_impact_phosphate_level_control', Units.impact),
+    'incr_impact_phosphate_level_control': \
+        TimeSeriesSpec('incr_impact_phosphate_level_control', Units.impact),
+    'min_impact_nitrogen_level_control': \
+        TimeSeriesSpec('min_impact_nitrogen_level_control', Units.impact),
+    'incr_impact_nitrogen_level_control': \
+        TimeSeriesSpec('incr_impact_nitrogen_level_control', Units.impact),
+    'min_impact_phosphate_hardened': \
+        TimeSeriesSpec('min_impact_phosphate_hardened', Units.impact),
+    'incr_impact_phosphate_hardened': \
+        TimeSeriesSpec('incr_impact_phosphate_hardened', Units.impact),
+    'min_impact_nitrogen_hardened': \
+        TimeSeriesSpec('min_impact_nitrogen_hardened', Units.impact),
+    'incr_impact_nitrogen_hardened': \
+        TimeSeriesSpec('incr_impact_nitrogen_hardened', Units.impact),
+    'min_impact_phosphate_drained': \
+        TimeSeriesSpec('min_impact_phosphate_drained', Units.impact),
+    'incr_impact_phosphate_drained': \
+        TimeSeriesSpec('incr_impact_phosphate_drained', Units.impact),
+    'min_impact_nitrogen_drained': \
+        TimeSeriesSpec('min_impact_nitrogen_drained', Units.impact),
+    'incr_impact_nitrogen_drained': \
+        TimeSeriesSpec('incr_impact_nitrogen_drained', Units.impact),
+    'min_impact_phosphate_undrained': \
+        TimeSeriesSpec('min_impact_phosphate_drainage', Units.impact),
+    'incr_impact_phosphate_undrained': \
+        TimeSeriesSpec('incr_impact_phosphate_drainage', Units.impact),
+    'min_impact_nitrogen_undrained': \
+        TimeSeriesSpec('min_impact_nitrogen_drainage', Units.impact),
+    'incr_impact_nitrogen_undrained': \
+        TimeSeriesSpec('incr_impact_nitrogen_drainage', Units.impact),
+    'min_impact_phosphate_flow_off': \
+        TimeSeriesSpec('min_impact_phosphate_flow_off', Units.impact),
+    'incr_impact_phosphate_flow_off': \
+        TimeSeriesSpec('incr_impact_phosphate_flow_off', Units.impact),
+    'min_impact_nitrogen_flow_off': \
+        TimeSeriesSpec('min_impact_nitrogen_flow_off', Units.impact),
+    'incr_impact_nitrogen_flow_off': \
+        TimeSeriesSpec('incr_impact_nitrogen_flow_off', Units.impact),
+    'min_impact_phosphate_sewer': \
+        TimeSeriesSpec('min_impact_phosphate_sewer', Units.impact),
+    'incr_impact_phosphate_sewer': \
+        TimeSeriesSpec('incr_impact_phosphate_sewer', Units.impact),
+    'min_impact_nitrogen_sewer': \
+        TimeSeriesSpec('min_impact_nitrogen_sewer', Units.impact),
+    'incr_impact_nitrogen_sewer': \
+        TimeSeriesSpec('incr_impact_nitrogen_sewer', Units.impact),
+    'min_impact_sulphate_precipitation': \
+        TimeSeriesSpec('min_impact_sulphate_precipitation', Units.impact),
+    'min_impact_sulphate_seepage': \
+        TimeSeriesSpec('min_impact_sulphate_seepage', Units.impact),
+    'incr_impact_sulphate_precipitation': \
+        TimeSeriesSpec('incr_impact_sulphate_precipitation', Units.impact),
+    'incr_impact_sulphate_seepage': \
+        TimeSeriesSpec('incr_impact_sulphate_seepage', Units.impact),
+    'min_impact_sulphate_discharge': \
+        TimeSeriesSpec('min_impact_sulphate_discharge', Units.impact),
+    'incr_impact_sulphate_discharge': \
+        TimeSeriesSpec('incr_impact_sulphate_discharge', Units.impact),
+    'min_impact_sulphate_level_control': \
+        TimeSeriesSpec('min_impact_sulphate_level_control', Units.impact),
+    'incr_impact_sulphate_level_control': \
+        TimeSeriesSpec('incr_impact_sulphate_level_control', Units.impact),
+    'min_impact_sulphate_hardened': \
+        TimeSeriesSpec('min_impact_sulphate_hardened', Units.impact),
+    'incr_impact_sulphate_hardened': \
+        TimeSeriesSpec('incr_impact_sulphate_hardened', Units.impact),
+    'min_impact_sulphate_drained': \
+        TimeSeriesSpec('min_impact_sulphate_drained', Units.impact),
+    'incr_impact_sulphate_drained': \
+        TimeSeriesSpec('incr_impact_sulphate_drained', Units.impact),
+    'min_impact_sulphate_undrained': \
+        TimeSeriesSpec('min_impact_sulphate_drainage', Units.impact),
+    'incr_impact_sulphate_undrained': \
+        TimeSeriesSpec('incr_impact_sulphate_drainage', Units.impact),
+    'min_impact_sulphate_flow_off': \
+        TimeSeriesSpec('min_impact_sulphate_flow_off', Units.impact),
+    'incr_impact_sulphate_flow_off': \
+        TimeSeriesSpec('incr_impact_sulphate_flow_off', Units.impact),
+    'min_impact_sulphate_sewer': \
+        TimeSeriesSpec('min_impact_sulphate_sewer', Units.impact),
+    'incr_impact_sulphate_sewer': \
+        TimeSeriesSpec('incr_impact_sulphate_sewer', Units.impact),
+    'concentrations': \
+        TimeSeriesSpec('chloride', Units.concentration),
+    'delta_storage': \
+        TimeSeriesSpec('delta_storage', Units.storage),
+    'fraction_initial': \
+        TimeSeriesSpec('fraction_water_initial', Units.fraction),
+    'fraction_precipitation': \
+        TimeSeriesSpec('fraction_water_precipitation', Units.fraction),
+    'fraction_seepage': \
+        TimeSeriesSpec('fraction_water_seepage', Units.fraction),
+    'fraction_hardened': \
+        TimeSeriesSpec('fraction_water_hardened', Units.fraction),
+    'fraction_drained': \
+        TimeSeriesSpec('fraction_water_drained', Units.fraction),
+    'fraction_undrained': \
+        TimeSeriesSpec('fraction_water_drainage', Units.fraction),
+    'fraction_flow_off': \
+        TimeSeriesSpec('fraction_water_flow_off', Units.fraction),
+    'fraction_sewer': \
+        TimeSeriesSpec('fraction_water_sewer', Units.fraction),
+    'fraction_discharge': \
+        TimeSeriesSpec('fraction_water_discharge', Units.fraction),
+    }
+
+
+def spec_columns(mapping2timeseries, location_id, station_location_id,
+                 label2time_series_spec=LABEL2TIMESERIESSPEC):
+    """Return the list of the column of each time series in the mapping.
+
+    Each column is the tuple of location id, parameter id, units and time
+    series. The mapping maps a label to a time series or, for the following
+    keys, to the time series of multiple pumping stations:
+
+      *intakes*
+        the pair of a label and the dict of intake to time series, where the
+        specification of the label applies to each intake
+      *defined_input* and *defined_output*
+        the dict of pumping station to discharge
+      *intake_wl_control* and *outtake_wl_control*
+        the dict of pumping station to computed discharge
+
+    The location of a time series of a label is the given location id and
+    the location of a time series of a pumping station is returned by the
+    given function station_location_id. A label without a specification is
+    skipped.
+
+    """
+    columns = []
+    for key, timeseries in sorted(mapping2timeseries.items()):
+        if key == 'intakes':
+            label, intake2timeseries = timeseries
+            spec = label2time_series_spec.get(label)
+            if spec is not None:
+                for intake, intake_timeseries in intake2timeseries.iteritems():
+                    columns.append((station_location_id(intake),
+                                    spec.parameter_id, spec.units,
+                                    intake_timeseries))
+        elif key in ['defined_input', 'defined_output']:
+            for station, station_timeseries in timeseries.items():
+                columns.append((station_location_id(station), 'Q',
+                                Units.flow, station_timeseries))
+        elif key in ['intake_wl_control', 'outtake_wl_control']:
+            for station, station_timeseries in timeseries.items():
+                if station is None:
+                    if key == 'intake_wl_control':
+                        logger.warn('no intake present for level control')
+                    else:
+                        logger.warn('no outtake present for level control')
+                columns.append((station_location_id(station), 'Q_COMP',
+                                Units.flow, station_timeseries))
+        else:
+            spec = label2time_series_spec.get(key)
+            if spec is not None:
+                columns.append((location_id, spec.parameter_id, spec.units,
+                                timeseries))
+    return columns
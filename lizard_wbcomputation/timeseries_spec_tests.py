@@ -0,0 +1,66 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# pylint: disable=C0111
+
+# The lizard_wbcomputation package implements the computational core of the
+# lizard waterbalance Django app.
+#
+# Copyright (C) 2012 Nelen & Schuurmans
+#
+# This package is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this package.  If not, see <http://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+
+from lizard_wbcomputation.timeseries_spec import TimeSeriesSpec
+from lizard_wbcomputation.timeseries_spec import Units
+from lizard_wbcomputation.timeseries_spec import spec_columns
+
+
+class Station(object):
+
+    def __init__(self, name):
+        self.name = name
+
+
+class SpecColumnsTests(TestCase):
+
+    def setUp(self):
+        self.label2spec = {'hardened': TimeSeriesSpec('discharge_hardened',
+                                                      Units.flow)}
+        self.station = Station('inlaat')
+
+    def columns(self, mapping2timeseries):
+        return spec_columns(mapping2timeseries, 'SAP',
+                            lambda station: station.name, self.label2spec)
+
+    def test_a(self):
+        """Test a label uses its specification and the location id."""
+        self.assertEqual([('SAP', 'discharge_hardened', Units.flow, 'ts')],
+                         self.columns({'hardened': 'ts'}))
+
+    def test_b(self):
+        """Test a label without a specification is skipped."""
+        self.assertEqual([], self.columns({'unknown': 'ts'}))
+
+    def test_c(self):
+        """Test a pumping station uses its location and parameter Q."""
+        self.assertEqual([('inlaat', 'Q', Units.flow, 'ts')],
+                         self.columns({'defined_input': {self.station: 'ts'}}))
+
+    def test_d(self):
+        """Test an intake uses the specification of its label."""
+        self.assertEqual([('inlaat', 'discharge_hardened', Units.flow, 'ts')],
+                         self.columns({'intakes': ('hardened',
+                                                   {self.station: 'ts'})}))
@@ -0,0 +1,238 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# pylint: disable=C0111
+
+# The lizard_wbcomputation package implements the computational core of the
+# lizard waterbalance Django app.
+#
+# Copyright (C) 2012 Nelen & Schuurmans
+#
+# This package is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this package.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Record the time and memory that each stage of a computation uses.
+
+A Tracer keeps a StageRecord for each named stage. A stage can be any block of
+code that you wrap in Tracer.stage, but the main use is to trace the memoized
+methods of a WaterbalanceComputer2: when such a computer has a tracer, each
+memoized method records its calls, cache hits, wall time, CPU time, the number
+of events of its result and the peak resident set size.
+
+"""
+
+import json
+import logging
+import os
+import sys
+
+from contextlib import contextmanager
+from time import time
+
+from lizard_wbcomputation.bucket_computer import BucketOutcome
+
+try:
+    import resource
+except ImportError:
+    # the resource module is not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+def cpu_time():
+    """Return the user and system time of the current process."""
+    times = os.times()
+    return times[0] + times[1]
+
+
+def peak_rss():
+    """Return the peak resident set size of the current process in kB.
+
+    This function returns None when the peak resident set size is not
+    available on the current platform.
+
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        # Mac OS X reports the size in bytes instead of kilobytes
+        peak = peak / 1024
+    return peak
+
+
+def count_events(result):
+    """Return the number of events of the time series in the given result.
+
+    The result can be a time series, an object that holds a time series
+    such as a Load or BucketOutcome, or any combination of dicts, lists and
+    tuples of these.
+
+    """
+    if hasattr(result, 'events'):
+        return sum(1 for _ in result.events())
+    if isinstance(result, dict):
+        values = result.values()
+    elif isinstance(result, (list, tuple)):
+        values = result
+    elif isinstance(result, BucketOutcome):
+        values = vars(result).values()
+    elif hasattr(result, 'timeseries'):
+        values = [result.timeseries]
+    else:
+        values = []
+    return sum(count_events(value) for value in values)
+
+
+class StageRecord(object):
+    """Contains the measurements of a single stage.
+
+    Instance variables:
+      *calls*
+        number of times the stage was executed
+      *hits*
+        number of times the result of the stage came from the cache
+      *wall*
+        total wall time in seconds, including the time of the stages it calls
+      *own_wall*
+        total wall time in seconds, excluding the time of the stages it calls
+      *cpu*
+        total CPU time in seconds, including the time of the stages it calls
+      *events*
+        total number of events of the time series it computed, or None when
+        the tracer does not count events
+      *peak_rss*
+        peak resident set size in kB of the process at the end of the stage
+
+    """
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.hits = 0
+        self.wall = 0.0
+        self.own_wall = 0.0
+        self.cpu = 0.0
+        self.events = None
+        self.peak_rss = None
+
+    def add_events(self, result):
+        self.events = (self.events or 0) + count_events(result)
+
+    def as_dict(self):
+        return {'name': self.name,
+                'calls': self.calls,
+                'hits': self.hits,
+                'wall': self.wall,
+                'own_wall': self.own_wall,
+                'cpu': self.cpu,
+                'events': self.events,
+                'peak_rss': self.peak_rss,
+                }
+
+    def __str__(self):
+        return "trace stage=%s calls=%d hits=%d wall=%.3f own_wall=%.3f " \
+            "cpu=%.3f events=%s peak_rss_kb=%s" % \
+            (self.name, self.calls, self.hits, self.wall, self.own_wall,
+             self.cpu, self.events, self.peak_rss)
+
+
+@contextmanager
+def untraced_stage(name):
+    """Context manager that has the interface of Tracer.stage but does
+    not record anything."""
+    yield StageRecord(name)
+
+
+def stage(tracer, name):
+    """Return the context manager to measure the given stage.
+
+    Parameter *tracer* is the Tracer to record the measurements in. When
+    tracer is None, the returned context manager does not record anything.
+
+    """
+    if tracer is None:
+        return untraced_stage(name)
+    return tracer.stage(name)
+
+
+class Tracer(object):
+    """Records the measurements of the stages of a computation.
+
+    Counting the events of a result visits every event, so a tracer only
+    counts them when its attribute count_events holds.
+
+    """
+    def __init__(self, count_events=True):
+        self.count_events = count_events
+        self.records = []
+        self._name2record = {}
+        # stack of the wall time of the nested stages for each running stage
+        self._nested_walls = []
+
+    def record(self, name):
+        """Return the StageRecord of the given stage and create it if needed."""
+        record = self._name2record.get(name)
+        if record is None:
+            record = self._name2record[name] = StageRecord(name)
+            self.records.append(record)
+        return record
+
+    @contextmanager
+    def stage(self, name):
+        """Measure the execution of the with-block as the given stage.
+
+        The with-statement binds the StageRecord of the stage, so the block
+        can add the events of its result.
+
+        """
+        record = self.record(name)
+        self._nested_walls.append(0.0)
+        start_wall, start_cpu = time(), cpu_time()
+        try:
+            yield record
+        finally:
+            wall = time() - start_wall
+            record.cpu += cpu_time() - start_cpu
+            record.wall += wall
+            record.own_wall += wall - self._nested_walls.pop()
+            if self._nested_walls:
+                self._nested_walls[-1] += wall
+            record.calls += 1
+            record.peak_rss = peak_rss()
+
+    def hit(self, name):
+        """Record that the result of the given stage came from the cache."""
+        self.record(name).hits += 1
+
+    def log(self, log=logger, level=logging.INFO):
+        """Log a single line for each stage in the order of first execution."""
+        for record in self.records:
+            log.log(level, str(record))
+
+    def as_dict(self):
+        return {'stages': [record.as_dict() for record in self.records]}
+
+    def write_json(self, file_name, **extra):
+        """Write the measurements as JSON to the given file.
+
+        The keyword arguments are added to the top-level JSON object.
+
+        """
+        content = self.as_dict()
+        content.update(extra)
+        json_file = open(file_name, 'w')
+        try:
+            json.dump(content, json_file, indent=2, sort_keys=True)
+        finally:
+            json_file.close()
@@ -0,0 +1,99 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# pylint: disable=C0111
+
+# The lizard_wbcomputation package implements the computational core of the
+# lizard waterbalance Django app.
+#
+# Copyright (C) 2012 Nelen & Schuurmans
+#
+# This package is free software: you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# This library is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE.  See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this package.  If not, see <http://www.gnu.org/licenses/>.
+
+from datetime import datetime
+from unittest import TestCase
+
+from timeseries.timeseriesstub import TimeseriesStub
+
+from lizard_wbcomputation.memoize import memoize
+from lizard_wbcomputation.tracing import count_events
+from lizard_wbcomputation.tracing import Tracer
+
+
+class Computer(object):
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+
+    @memoize
+    def get_outer(self, value):
+        return [self.get_inner(value), self.get_inner(value)]
+
+    @memoize
+    def get_inner(self, value):
+        return TimeseriesStub((datetime(2012, 1, 1), value),
+                              (datetime(2012, 1, 2), value))
+
+
+class TracerTests(TestCase):
+
+    def setUp(self):
+        self.tracer = Tracer()
+
+    def test_a(self):
+        """Test each memoized method is traced once with its cache hits."""
+        computer = Computer(self.tracer)
+        computer.get_outer(1.0)
+        computer.get_outer(1.0)
+        names = [record.name for record in self.tracer.records]
+        self.assertEqual(['get_outer', 'get_inner'], names)
+        outer, inner = self.tracer.records
+        self.assertEqual((1, 1), (outer.calls, outer.hits))
+        self.assertEqual((1, 1), (inner.calls, inner.hits))
+
+    def test_b(self):
+        """Test the events of the results are counted."""
+        computer = Computer(self.tracer)
+        computer.get_outer(1.0)
+        outer, inner = self.tracer.records
+        self.assertEqual(4, outer.events)
+        self.assertEqual(2, inner.events)
+
+    def test_c(self):
+        """Test the own wall time excludes the wall time of nested stages."""
+        computer = Computer(self.tracer)
+        computer.get_outer(1.0)
+        outer, inner = self.tracer.records
+        self.assertTrue(outer.wall >= inner.wall)
+        self.assertAlmostEqual(outer.own_wall, outer.wall - inner.wall)
+
+    def test_d(self):
+        """Test a computer without tracer is not traced."""
+        computer = Computer(None)
+        computer.get_outer(1.0)
+        self.assertEqual([], self.tracer.records)
+
+    def test_e(self):
+        """Test count_events handles nested dicts and lists."""
+        timeseries = TimeseriesStub((datetime(2012, 1, 1), 1.0))
+        result = {'a': timeseries, 'b': [timeseries, (timeseries, 10.0)]}
+        self.assertEqual(3, count_events(result))
+
+    def test_f(self):
+        """Test the events are not counted when the tracer does not count."""
+        computer = Computer(Tracer(count_events=False))
+        computer.get_outer(1.0)
+        outer, inner = computer.tracer.records
+        self.assertEqual((None, None), (outer.events, inner.events))
+        self.assertEqual((1, 1), (outer.calls, inner.calls))
@@ -20,6 +20,7 @@ install_requires = [
     'lizard-ui > 1.53',
     'mock >= 0.7.2',
     'nens >= 1.10',
+    'numpy >= 1.7',
     'timeseries >= 0.11',
     'xlrd',
     'xlwt',
@@ -47,12 +48,14 @@ setup(name='lizard-waterbalance',
       zip_safe=False,
       install_requires=install_requires,
       tests_require=tests_require,
-      extras_require = {'test': tests_require},
+      extras_require = {'test': tests_require,
+                        'xlsx': ['XlsxWriter']},
       entry_points={
           'console_scripts': [
               'wbcompute = xmlmodel.wbcompute:main',
               'check_symmetry = lizard_wbcomputation.check_symmetry:main',
               'check_fractions = lizard_wbcomputation.check_fractions:main',
+              'wbbenchmark = benchmark.run:main',
               ],
           'lizard_map.adapter_class': [
               'adapter_waterbalance = lizard_waterbalance.layers:AdapterWaterbalance',
@@ -13,6 +13,7 @@ long_description = '\n\n'.join([
 
 install_requires = [
     'nens == 1.10',
+    'numpy >= 1.7',
     'pkginfo >= 0.8',
     'timeseries == 0.17',
     ],
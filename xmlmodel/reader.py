@@ -32,9 +32,26 @@ import datetime
 
 logger = logging.getLogger(__name__)
 
+from xml.etree.cElementTree import iterparse
+
 from timeseries.timeseries import TimeSeries
 
 
+class RestrictedRetriever(object):
+    """callable that returns a time series of a model for a given range.
+
+    an instance is stored as attribute `retrieve_<name>` of the model
+    to which the time series `name` is attached.
+    """
+
+    def __init__(self, model, name):
+        self.model = model
+        self.name = name
+
+    def __call__(self, start=None, end=None):
+        return self.model.retrieve(self.name, start, end)
+
+
 class BaseModel(object):
     expected = ['obj_id', 'location_id']
     def __init__(self):
@@ -59,15 +76,42 @@ class BaseModel(object):
     def __hash__(self):
         return hash(str(self))
 
-    def __getattr__(self, attr):
+    def attach_timeseries(self, name, timeseries):
+        """store timeseries as field `name` and define `retrieve_<name>`.
+
+        `retrieve_<name>` is an explicit instance attribute, so asking
+        for the retrieve function of a time series that has not been
+        attached raises the usual AttributeError.
+        """
+
+        setattr(self, name, timeseries)
+        self.timeseries_names.add(name)
+        setattr(self, 'retrieve_' + name, RestrictedRetriever(self, name))
+
+    def retrieve(self, name, start=None, end=None):
+        """return the named time series restricted to [start, end].
+
+        the restricted time series is a filtered copy that is computed
+        only once for each range and shared by all callers, so callers
+        must not modify it.  this also holds without start and end: the
+        result is then a copy of the whole time series and never the
+        attached time series itself.
 
-        if attr.startswith("retrieve_"):
-            name = attr[len("retrieve_"):]
-            if name in self.timeseries_names:
-                timeseries = getattr(self, name)
-                return (lambda start=None, end=None:
-                            timeseries.filter(timestamp_gte=start, timestamp_lte=end))
-        return getattr(super(BaseModel, self), attr)
+        the cache is kept per object and keyed by name and range.  an
+        entry remains valid only as long as field `name` refers to the
+        time series it was computed from, so assigning a new time series
+        to the field is all it takes to invalidate it.
+        """
+
+        timeseries = getattr(self, name)
+        cache = self.__dict__.setdefault('_restricted_cache', {})
+        key = (name, start, end)
+        cached = cache.get(key)
+        if cached is None or cached[0] is not timeseries:
+            restricted = timeseries.filter(timestamp_gte=start,
+                                           timestamp_lte=end)
+            cached = cache[key] = (timeseries, restricted)
+        return cached[1]
 
     def validate(self):
         """check whether self contains all expected fields
@@ -261,6 +305,43 @@ classes = {'Area': Area,
            }
 
 
+def parse_bool(text):
+    return text.lower().strip() == "true"
+
+
+# each parameter holds its value in one of the following elements: the
+# element determines the type of the value.  when a parameter contains
+# more than one of these elements, the first one in this list wins.
+VALUE_TYPES = [('dblValue', float),
+               ('stringValue', str),
+               ('boolValue', parse_bool),
+               ('intValue', int),
+               ]
+
+
+def local_name(tag):
+    """return tag without its namespace.
+    """
+
+    return tag.rsplit('}', 1)[-1]
+
+
+def parameter_value(parameter):
+    """return the typed value of the parameter element.
+
+    the value is None when the parameter does not contain any
+    non-empty value element.
+    """
+
+    texts = {}
+    for element in parameter.iter():
+        texts.setdefault(local_name(element.tag), element.text)
+    for tag, convert in VALUE_TYPES:
+        if texts.get(tag) is not None:
+            return convert(texts[tag])
+    return None
+
+
 def parse_parameters(stream):
     r"""parse the xml stream into set of objects
 
@@ -421,50 +502,50 @@ def parse_parameters(stream):
     >>>
     """
 
-    from xml.dom.minidom import parse
-    d = parse(stream)
-    rootNode = d.childNodes[0]
-    groupNodes = [i for i in rootNode.childNodes if i.nodeType != i.TEXT_NODE]
-
     result = None
-
-    for group in groupNodes:
-        models = group.getElementsByTagName("model")
-        assert(len(models) == 1)
-        for model in models:
-            class_name = str(model.childNodes[0].nodeValue)
+    objects = []
+
+    # we process each parameter as soon as it has been read and we drop
+    # each group as soon as its object has been created, so the complete
+    # document never is in memory
+    root_element = None
+    for event, element in iterparse(stream, events=('start', 'end')):
+        tag = local_name(element.tag)
+        if event == 'start':
+            if root_element is None:
+                root_element = element
+            elif tag == 'group':
+                models, parameters = [], []
+            continue
+
+        if tag == 'model':
+            models.append(str(element.text))
+        elif tag == 'parameter':
+            parameters.append((element.get('id', ''),
+                               parameter_value(element)))
+            element.clear()
+        elif tag == 'group':
+            assert(len(models) == 1)
+            class_name = models[0]
             this_class = classes[class_name]
 
-        obj = this_class()
-        obj.obj_id = str(uuid.uuid4())
-        if result is None:
-            result = obj
-        for parameter in group.getElementsByTagName("parameter"):
-            try:
-                value_node = parameter.getElementsByTagName("dblValue")[0]
-                value = float(value_node.childNodes[0].nodeValue)
-            except IndexError:
-                try:
-                    value_node = parameter.getElementsByTagName("stringValue")[0]
-                    value = str(value_node.childNodes[0].nodeValue)
-                except IndexError:
-                    try:
-                        value_node = parameter.getElementsByTagName("boolValue")[0]
-                        value = (value_node.childNodes[0].nodeValue).lower().strip() == "true"
-                    except IndexError:
-                        try:
-                            value_node = parameter.getElementsByTagName("intValue")[0]
-                            value = int(value_node.childNodes[0].nodeValue)
-                        except IndexError:
-                            value = None
-            setattr(obj, parameter.getAttribute('id'), value)
+            obj = this_class()
+            obj.obj_id = str(uuid.uuid4())
+            if result is None:
+                result = obj
+            for name, value in parameters:
+                setattr(obj, name, value)
+            objects.append(obj)
 
-        obj.validate()
+            if obj != result:
+                if not hasattr(result, class_name.lower()):
+                    setattr(result, class_name.lower(), [])
+                getattr(result, class_name.lower()).append(obj)
 
-        if obj != result:
-            if not hasattr(result, class_name.lower()):
-                setattr(result, class_name.lower(), [])
-            getattr(result, class_name.lower()).append(obj)
+            root_element.clear()
+
+    for obj in objects:
+        obj.validate()
 
     return result
 
@@ -534,9 +615,9 @@ def attach_timeseries_to_structures(root, tsd, corresponding):
     [(17, 18, 19)]
 
     >>> root.retrieve_precipitation # doctest:+ELLIPSIS
-    <function <lambda> at ...>
+    <xmlmodel.reader.RestrictedRetriever object at ...>
     >>> [i.retrieve_evaporation for i in root.pumpingstation] # doctest:+ELLIPSIS
-    [<function <lambda> at ...>]
+    [<xmlmodel.reader.RestrictedRetriever object at ...>]
     """
 
     available = set(tsd.keys())
@@ -555,8 +636,7 @@ def attach_timeseries_to_structures(root, tsd, corresponding):
                     series = TimeSeries(location_id=obj.location_id,
                                         parameter_id=obj.corresponding_parameter_id(local))
                 available.discard((obj.location_id, remote))
-                setattr(obj, local, series)
-                obj.timeseries_names.add(local)
+                obj.attach_timeseries(local, series)
 
     for locpar in sorted(available):
         logger.info("unused series loc/par:  %s/%s" % locpar)
@@ -29,6 +29,7 @@
 #**********************************************************************
 
 from reader import parse_parameters
+from reader import Area
 from reader import attach_timeseries_to_structures
 from timeseries.timeseries import TimeSeries
 import logging
@@ -99,6 +100,46 @@ class CoupleParametersWithTimeseriesTest(unittest.TestCase):
         self.assertEquals(3, current[start][0])
         self.assertEquals(7, current[end][0])
 
+    def test_retrieve_same_range_returns_same_timeseries(self):
+        start = datetime(1991, 01, 02)
+        end = datetime(1991, 01, 04)
+        bucket = self.root.bucket[0]
+        first = bucket.retrieve_precipitation(start, end)
+        self.assertTrue(first is bucket.retrieve_precipitation(start, end))
+        self.assertFalse(first is bucket.retrieve_precipitation(start))
+
+    def test_retrieve_without_range_returns_shared_copy(self):
+        bucket = self.root.bucket[0]
+        first = bucket.retrieve_precipitation()
+        self.assertFalse(bucket.precipitation is first)
+        self.assertTrue(first is bucket.retrieve_precipitation())
+        self.assertEquals(list(bucket.precipitation.events()),
+                          list(first.events()))
+
+    def test_retrieve_after_assignment_uses_new_timeseries(self):
+        start = datetime(1991, 01, 02)
+        end = datetime(1991, 01, 04)
+        bucket = self.root.bucket[0]
+        bucket.retrieve_precipitation(start, end)
+        bucket.precipitation = bucket.evaporation
+        current = dict(bucket.retrieve_precipitation(start, end))
+        self.assertEquals(3, current[start][0])
+        self.assertEquals(7, current[end][0])
+
+    def test_init_water_level_is_last_known_level(self):
+        self.root.attach_timeseries('water_level',
+                                    self.root.bucket[0].precipitation)
+        self.root.set_init_water_level(datetime(1991, 01, 03, 12))
+        self.assertEquals(2, self.root.init_water_level)
+        self.root.set_init_water_level(datetime(1991, 01, 03))
+        self.assertEquals(2, self.root.init_water_level)
+
+    def test_init_water_level_before_first_level_is_zero(self):
+        self.root.attach_timeseries('water_level',
+                                    self.root.bucket[0].precipitation)
+        self.root.set_init_water_level(datetime(1990, 01, 01))
+        self.assertEquals(0.0, self.root.init_water_level)
+
     def test_retrieve_not_existing_gives_exception(self):
         try:
             self.root.bucket[0].retrieve_something_else()
@@ -108,6 +149,42 @@ class CoupleParametersWithTimeseriesTest(unittest.TestCase):
                     "has no attribute 'retrieve_something_else'"))
 
 
+class ParseParametersTest(unittest.TestCase):
+    def parse(self, content):
+        return parse_parameters(mock.Stream(
+                '<parameters xmlns="http://www.wldelft.nl/fews">'
+                '<group><model>Area</model>%s</group></parameters>' % content))
+
+    def test_namespaced_input(self):
+        root = self.parse('<parameter id="max_inl">'
+                          '<dblValue>144000</dblValue></parameter>')
+        self.assertEquals(Area, root.__class__)
+        self.assertEquals(144000.0, root.max_inl)
+
+    def test_description_is_ignored(self):
+        root = self.parse('<parameter id="geb_naam">'
+                          '<description>naam van het gebied</description>'
+                          '<stringValue>Aetsveldsche polder</stringValue>'
+                          '</parameter>')
+        self.assertEquals('Aetsveldsche polder', root.geb_naam)
+
+    def test_int_value(self):
+        root = self.parse('<parameter id="peil">'
+                          '<intValue>3</intValue></parameter>')
+        self.assertEquals(3, root.peil)
+        self.assertEquals(int, root.peil.__class__)
+
+    def test_empty_value_gives_none(self):
+        root = self.parse('<parameter id="peil"><dblValue/></parameter>')
+        self.assertEquals(None, root.peil)
+
+    def test_double_takes_precedence_over_string(self):
+        root = self.parse('<parameter id="peil">'
+                          '<stringValue>tekst</stringValue>'
+                          '<dblValue>1.5</dblValue></parameter>')
+        self.assertEquals(1.5, root.peil)
+
+
 class CouplingLogsMismatchesTest(unittest.TestCase):
     def setUp(self):
         self.handler = mock.Handler()
@@ -1,5 +1,7 @@
 import re
 
+import numpy
+
 
 def convert_dom(dom):
     """
@@ -11,3 +13,16 @@ def convert_dom(dom):
         e.tag = re.sub('{.*}', '', e.tag)
         if e.tag is None:
             e.tag = ''
+
+
+def event_columns(timeseries):
+    """
+    return the events of timeseries as a tuple of the list of sorted dates
+    and the float array of the corresponding values.
+    """
+    dates = []
+    values = []
+    for event in timeseries.events():
+        dates.append(event[0])
+        values.append(event[1])
+    return dates, numpy.array(values, dtype=float)
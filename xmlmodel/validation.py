@@ -30,9 +30,26 @@ import uuid
 import logging
 import datetime
 
+import numpy
+
+from xmlmodel.utils import event_columns
+
 logger = logging.getLogger(__name__)
 
 
+def ranges_below(dates, values, limit):
+    """return the (first, last) date of each run of values below limit.
+
+    :param dates: sorted list of dates
+    :param values: array of values, one for each date
+    :param limit: the value to compare with
+    """
+    below = numpy.asarray(values) < limit
+    # +1 marks the start of a run and -1 the position just after its end
+    edges = numpy.diff(numpy.concatenate(([0], below.astype(int), [0])))
+    firsts = numpy.flatnonzero(edges == 1)
+    lasts = numpy.flatnonzero(edges == -1) - 1
+    return [(dates[first], dates[last]) for first, last in zip(firsts, lasts)]
 
 
 def validate_settings(area):
@@ -52,14 +69,12 @@ def validate_settings(area):
 
     for ts_name in ['minimum_level',
                     'maximum_level']:
-        value_error = False
-
-        for event in getattr(area,ts_name).events():
-            if event[1] < area.bottom_height:
-                value_error = True
+        dates, values = event_columns(getattr(area, ts_name))
 
-        if value_error:
+        if len(values) and values.min() < area.bottom_height:
             logger.error('Het ingestelde %s moet hoger of gelijk liggen aan het streefpeil'%ts_name)
+            for start, end in ranges_below(dates, values, area.bottom_height):
+                logger.error('%s ligt onder de bodemhoogte van %s tot en met %s'%(ts_name, start.isoformat(' '), end.isoformat(' ')))
             errors += 1
 
     for prop in ['concentr_chloride_precipitation',
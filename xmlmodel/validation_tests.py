@@ -0,0 +1,99 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+#***********************************************************************
+#
+# This file is part of the waterbalance program.
+#
+# the waterbalance program is free software: you can redistribute it
+# and/or modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation, either version 3 of
+# the License, or (at your option) any later version.
+#
+# the waterbalance program is distributed in the hope that it will be
+# useful, but WITHOUT ANY WARRANTY; without even the implied warranty
+# of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with the nens libraray.  If not, see
+# <http://www.gnu.org/licenses/>.
+#
+# Copyright 2012 Nelen & Schuurmans
+#*
+#***********************************************************************
+
+from datetime import datetime
+import logging
+import unittest
+
+from nens import mock
+from timeseries.timeseriesstub import TimeseriesStub
+
+from xmlmodel.reader import Area
+from xmlmodel.validation import ranges_below
+from xmlmodel.validation import validate_settings
+
+
+class RangesBelowTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dates = [datetime(2012, 1, day) for day in range(1, 7)]
+
+    def test_no_values_below(self):
+        self.assertEquals([], ranges_below(self.dates,
+                                           [1.0, 2.0, 1.0, 3.0, 1.0, 2.0], 0.0))
+
+    def test_every_run_is_reported(self):
+        values = [-1.0, -2.0, 1.0, -1.0, 1.0, 1.0]
+        self.assertEquals([(self.dates[0], self.dates[1]),
+                           (self.dates[3], self.dates[3])],
+                          ranges_below(self.dates, values, 0.0))
+
+    def test_run_up_to_last_date(self):
+        values = [1.0, 1.0, 1.0, 1.0, -1.0, -1.0]
+        self.assertEquals([(self.dates[4], self.dates[5])],
+                          ranges_below(self.dates, values, 0.0))
+
+    def test_value_equal_to_limit_is_not_below(self):
+        self.assertEquals([], ranges_below(self.dates[:1], [0.0], 0.0))
+
+
+class ValidateSettingsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.handler = mock.Handler()
+        logging.getLogger().addHandler(self.handler)
+        self.area = Area()
+        for field in Area.expected[2:]:
+            setattr(self.area, field, 1.0)
+        self.area.name = 'area'
+        self.area.bottom_height = 0.0
+        self.area.init_water_level = 1.0
+        self.area.bucket = []
+        self.area.pumpingstation = []
+        self.area.maximum_level = TimeseriesStub((datetime(2012, 1, 1), 1.0))
+
+    def tearDown(self):
+        logging.getLogger().removeHandler(self.handler)
+
+    def test_levels_above_bottom_height_are_valid(self):
+        self.area.minimum_level = TimeseriesStub((datetime(2012, 1, 1), 0.5),
+                                                 (datetime(2012, 1, 2), 0.0))
+        self.assertEquals((0, 0), validate_settings(self.area))
+
+    def test_each_period_below_bottom_height_is_logged(self):
+        self.area.minimum_level = TimeseriesStub((datetime(2012, 1, 1), -0.5),
+                                                 (datetime(2012, 1, 2), 0.5),
+                                                 (datetime(2012, 1, 3), -0.5),
+                                                 (datetime(2012, 1, 4), -0.5))
+        self.handler.flush()
+        self.assertEquals((1, 0), validate_settings(self.area))
+        periods = [line for line in self.handler.content
+                   if 'onder de bodemhoogte' in line]
+        self.assertEquals(2, len(periods))
+        self.assertTrue(periods[1].endswith(
+                'van 2012-01-03 00:00:00 tot en met 2012-01-04 00:00:00'))
+
+    def test_missing_level_is_valid(self):
+        self.area.minimum_level = TimeseriesStub()
+        self.assertEquals((0, 0), validate_settings(self.area))
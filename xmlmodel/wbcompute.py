@@ -27,10 +27,11 @@
 #******************************************************************************
 
 import logging
+import os
 import sys
-from time import time
 
 from datetime import datetime
+from optparse import OptionParser
 from xml.etree import ElementTree
 
 import pkginfo
@@ -40,9 +41,19 @@ from nens import fews
 from timeseries.timeseries import TimeSeries
 from timeseries.timeseriesstub import enumerate_events
 
+from lizard_wbcomputation.columnar import timeseries_columns
+from lizard_wbcomputation.columnar import write_columnar_file
 from lizard_wbcomputation.compute import WaterbalanceComputer2
 from lizard_wbcomputation.delta_storage import DeltaStorage
 from lizard_wbcomputation.load_computer import LoadForIntake
+from lizard_wbcomputation.profiling import run_profiled
+# the specifications of the time series used to be defined in this module, so
+# they are still available from it
+from lizard_wbcomputation.timeseries_spec import LABEL2TIMESERIESSPEC
+from lizard_wbcomputation.timeseries_spec import TimeSeriesSpec
+from lizard_wbcomputation.timeseries_spec import Units
+from lizard_wbcomputation.timeseries_spec import spec_columns
+from lizard_wbcomputation.tracing import Tracer
 
 from xmlmodel.utils import convert_dom
 from xmlmodel.reader import parse_parameters
@@ -87,192 +98,45 @@ ASSOC = {
     }
 
 
-class Units(object):
-    """Specifies the different units for each flow type.
+def get_run_properties(root):
+    """Return the dict of key to value of the properties in the run file.
 
-    These units are implemented as class variables to mimic global definitions.
+    Parameter *root* is the root element of the run file, whose tags do not
+    contain a namespace.
 
     """
-    concentration = 'g/m3'
-    flow = 'm3/dag'
-    fraction = '[0,1]'
-    impact = 'mg/m2/dag'
-    level = 'mNAP'
-    storage = 'm3'
+    properties = root.find('properties')
+    if properties is None:
+        return {}
+    return dict((element.get('key'), element.get('value'))
+                for element in properties.getchildren())
 
 
-class TimeSeriesSpec(object):
-    """Specifies TimeSeries attributes.
+def is_true(value):
+    """Return True if and only if the given property value means true."""
+    return value is not None and value.strip().lower() in ('true', '1', 'yes')
 
-    A TimeSeries has several attributes that have to be set for a TimeSeries to
-    be valid. A TimeSeriesSpec specifies these attributes for a single
-    TimeSeries.
+
+def get_trace_file_name(output_timeseries_file):
+    """Return the name of the JSON file to write the trace to.
+
+    The trace file is written next to the output time series file:
+    'output/waterbalance-graph.xml' has trace file
+    'output/waterbalance-graph-trace.json'.
 
     """
+    return os.path.splitext(output_timeseries_file)[0] + '-trace.json'
 
-    def __init__(self, parameter_id, units):
-        self.parameter_id = parameter_id
-        self.units = units
 
+def get_columnar_file_name(output_timeseries_file):
+    """Return the name of the columnar file to write the time series to.
 
-LABEL2TIMESERIESSPEC = {
-    'drained': \
-        TimeSeriesSpec('discharge_drained', Units.flow),
-    'evaporation': \
-        TimeSeriesSpec('evaporation', Units.flow),
-    'flow_off': \
-        TimeSeriesSpec('discharge_flow_off', Units.flow),
-    'hardened': \
-        TimeSeriesSpec('discharge_hardened', Units.flow),
-    'indraft': \
-        TimeSeriesSpec('indraft', Units.flow),
-    'infiltration': \
-        TimeSeriesSpec('infiltration', Units.flow),
-    'precipitation': \
-        TimeSeriesSpec('precipitation', Units.flow),
-    'seepage': \
-        TimeSeriesSpec('seepage', Units.flow),
-    'water_level': \
-        TimeSeriesSpec('water_level', Units.level),
-    'sluice_error': \
-        TimeSeriesSpec('sluice_error_outlet', Units.flow),
-    'sluice_error_inlet':\
-        TimeSeriesSpec('sluice_error_inlet', Units.flow),
-    'undrained': \
-        TimeSeriesSpec('discharge_drainage', Units.flow),
-    'sewer': \
-        TimeSeriesSpec('discharge_sewer', Units.flow),
-    'min_impact_phosphate_precipitation': \
-        TimeSeriesSpec('min_impact_phosphate_precipitation', Units.impact),
-    'min_impact_phosphate_seepage': \
-        TimeSeriesSpec('min_impact_phosphate_seepage', Units.impact),
-    'incr_impact_phosphate_precipitation': \
-        TimeSeriesSpec('incr_impact_phosphate_precipitation', Units.impact),
-    'incr_impact_phosphate_seepage': \
-        TimeSeriesSpec('incr_impact_phosphate_seepage', Units.impact),
-    'min_impact_nitrogen_precipitation': \
-        TimeSeriesSpec('min_impact_nitrogen_precipitation', Units.impact),
-    'min_impact_nitrogen_seepage': \
-        TimeSeriesSpec('min_impact_nitrogen_seepage', Units.impact),
-    'incr_impact_nitrogen_precipitation': \
-        TimeSeriesSpec('incr_impact_nitrogen_precipitation', Units.impact),
-    'incr_impact_nitrogen_seepage': \
-        TimeSeriesSpec('incr_impact_nitrogen_seepage', Units.impact),
-    'min_impact_phosphate_discharge': \
-        TimeSeriesSpec('min_impact_phosphate_discharge', Units.impact),
-    'incr_impact_phosphate_discharge': \
-        TimeSeriesSpec('incr_impact_phosphate_discharge', Units.impact),
-    'min_impact_nitrogen_discharge': \
-        TimeSeriesSpec('min_impact_nitrogen_discharge', Units.impact),
-    'incr_impact_nitrogen_discharge': \
-        TimeSeriesSpec('incr_impact_nitrogen_discharge', Units.impact),
-    'min_impact_phosphate_level_control': \
-        TimeSeriesSpec('min_impact_phosphate_level_control', Units.impact),
-    'incr_impact_phosphate_level_control': \
-        TimeSeriesSpec('incr_impact_phosphate_level_control', Units.impact),
-    'min_impact_nitrogen_level_control': \
-        TimeSeriesSpec('min_impact_nitrogen_level_control', Units.impact),
-    'incr_impact_nitrogen_level_control': \
-        TimeSeriesSpec('incr_impact_nitrogen_level_control', Units.impact),
-    'min_impact_phosphate_hardened': \
-        TimeSeriesSpec('min_impact_phosphate_hardened', Units.impact),
-    'incr_impact_phosphate_hardened': \
-        TimeSeriesSpec('incr_impact_phosphate_hardened', Units.impact),
-    'min_impact_nitrogen_hardened': \
-        TimeSeriesSpec('min_impact_nitrogen_hardened', Units.impact),
-    'incr_impact_nitrogen_hardened': \
-        TimeSeriesSpec('incr_impact_nitrogen_hardened', Units.impact),
-    'min_impact_phosphate_drained': \
-        TimeSeriesSpec('min_impact_phosphate_drained', Units.impact),
-    'incr_impact_phosphate_drained': \
-        TimeSeriesSpec('incr_impact_phosphate_drained', Units.impact),
-    'min_impact_nitrogen_drained': \
-        TimeSeriesSpec('min_impact_nitrogen_drained', Units.impact),
-    'incr_impact_nitrogen_drained': \
-        TimeSeriesSpec('incr_impact_nitrogen_drained', Units.impact),
-    'min_impact_phosphate_undrained': \
-        TimeSeriesSpec('min_impact_phosphate_drainage', Units.impact),
-    'incr_impact_phosphate_undrained': \
-        TimeSeriesSpec('incr_impact_phosphate_drainage', Units.impact),
-    'min_impact_nitrogen_undrained': \
-        TimeSeriesSpec('min_impact_nitrogen_drainage', Units.impact),
-    'incr_impact_nitrogen_undrained': \
-        TimeSeriesSpec('incr_impact_nitrogen_drainage', Units.impact),
-    'min_impact_phosphate_flow_off': \
-        TimeSeriesSpec('min_impact_phosphate_flow_off', Units.impact),
-    'incr_impact_phosphate_flow_off': \
-        TimeSeriesSpec('incr_impact_phosphate_flow_off', Units.impact),
-    'min_impact_nitrogen_flow_off': \
-        TimeSeriesSpec('min_impact_nitrogen_flow_off', Units.impact),
-    'incr_impact_nitrogen_flow_off': \
-        TimeSeriesSpec('incr_impact_nitrogen_flow_off', Units.impact),
-    'min_impact_phosphate_sewer': \
-        TimeSeriesSpec('min_impact_phosphate_sewer', Units.impact),
-    'incr_impact_phosphate_sewer': \
-        TimeSeriesSpec('incr_impact_phosphate_sewer', Units.impact),
-    'min_impact_nitrogen_sewer': \
-        TimeSeriesSpec('min_impact_nitrogen_sewer', Units.impact),
-    'incr_impact_nitrogen_sewer': \
-        TimeSeriesSpec('incr_impact_nitrogen_sewer', Units.impact),
-    'min_impact_sulphate_precipitation': \
-        TimeSeriesSpec('min_impact_sulphate_precipitation', Units.impact),
-    'min_impact_sulphate_seepage': \
-        TimeSeriesSpec('min_impact_sulphate_seepage', Units.impact),
-    'incr_impact_sulphate_precipitation': \
-        TimeSeriesSpec('incr_impact_sulphate_precipitation', Units.impact),
-    'incr_impact_sulphate_seepage': \
-        TimeSeriesSpec('incr_impact_sulphate_seepage', Units.impact),
-    'min_impact_sulphate_discharge': \
-        TimeSeriesSpec('min_impact_sulphate_discharge', Units.impact),
-    'incr_impact_sulphate_discharge': \
-        TimeSeriesSpec('incr_impact_sulphate_discharge', Units.impact),
-    'min_impact_sulphate_level_control': \
-        TimeSeriesSpec('min_impact_sulphate_level_control', Units.impact),
-    'incr_impact_sulphate_level_control': \
-        TimeSeriesSpec('incr_impact_sulphate_level_control', Units.impact),
-    'min_impact_sulphate_hardened': \
-        TimeSeriesSpec('min_impact_sulphate_hardened', Units.impact),
-    'incr_impact_sulphate_hardened': \
-        TimeSeriesSpec('incr_impact_sulphate_hardened', Units.impact),
-    'min_impact_sulphate_drained': \
-        TimeSeriesSpec('min_impact_sulphate_drained', Units.impact),
-    'incr_impact_sulphate_drained': \
-        TimeSeriesSpec('incr_impact_sulphate_drained', Units.impact),
-    'min_impact_sulphate_undrained': \
-        TimeSeriesSpec('min_impact_sulphate_drainage', Units.impact),
-    'incr_impact_sulphate_undrained': \
-        TimeSeriesSpec('incr_impact_sulphate_drainage', Units.impact),
-    'min_impact_sulphate_flow_off': \
-        TimeSeriesSpec('min_impact_sulphate_flow_off', Units.impact),
-    'incr_impact_sulphate_flow_off': \
-        TimeSeriesSpec('incr_impact_sulphate_flow_off', Units.impact),
-    'min_impact_sulphate_sewer': \
-        TimeSeriesSpec('min_impact_sulphate_sewer', Units.impact),
-    'incr_impact_sulphate_sewer': \
-        TimeSeriesSpec('incr_impact_sulphate_sewer', Units.impact),
-    'concentrations': \
-        TimeSeriesSpec('chloride', Units.concentration),
-    'delta_storage': \
-        TimeSeriesSpec('delta_storage', Units.storage),
-    'fraction_initial': \
-        TimeSeriesSpec('fraction_water_initial', Units.fraction),
-    'fraction_precipitation': \
-        TimeSeriesSpec('fraction_water_precipitation', Units.fraction),
-    'fraction_seepage': \
-        TimeSeriesSpec('fraction_water_seepage', Units.fraction),
-    'fraction_hardened': \
-        TimeSeriesSpec('fraction_water_hardened', Units.fraction),
-    'fraction_drained': \
-        TimeSeriesSpec('fraction_water_drained', Units.fraction),
-    'fraction_undrained': \
-        TimeSeriesSpec('fraction_water_drainage', Units.fraction),
-    'fraction_flow_off': \
-        TimeSeriesSpec('fraction_water_flow_off', Units.fraction),
-    'fraction_sewer': \
-        TimeSeriesSpec('fraction_water_sewer', Units.fraction),
-    'fraction_discharge': \
-        TimeSeriesSpec('fraction_water_discharge', Units.fraction),
-    }
+    The columnar file is written next to the output time series file:
+    'output/waterbalance-graph.xml' has columnar file
+    'output/waterbalance-graph.npz'.
+
+    """
+    return os.path.splitext(output_timeseries_file)[0] + '.npz'
 
 
 def insert_calculation_range(run_dom, run_info):
@@ -299,45 +163,14 @@ class TimeseriesForSomething(object):
 
     @classmethod
     def create(cls, area, label2time_series_spec, mapping2timeseries):
-        multiple_timeseries = []
-        sorted_elements = mapping2timeseries.items()
-        sorted_elements.sort(key=lambda e:e[0])
-        for key, timeseries in sorted_elements:
+        for key in mapping2timeseries:
             assert type(key) == str
-            if key == 'intakes':
-                label, intake2timeseries = timeseries
-                if label in label2time_series_spec.keys():
-                    spec = label2time_series_spec[label]
-                    for intake, ts in intake2timeseries.iteritems():
-                        multiple_timeseries.append(TimeseriesForLabel(ts,
-                                                                      intake.location_id,
-                                                                      spec.parameter_id,
-                                                                      spec.units))
-            elif key in ['defined_input', 'defined_output']:
-                for station, station_timeseries in timeseries.items():
-                    multiple_timeseries.append(TimeseriesForPumpingStation(station_timeseries,
-                                                                           station.location_id))
-            elif key in ['intake_wl_control', 'outtake_wl_control']:
-                for station, station_timeseries in timeseries.items():
-                    if station is None:
-                        if key == 'intake_wl_control':
-                            log.warn('no intake present for level control')
-                        else:
-                            log.warn('no outtake present for level control')
-                    multiple_timeseries.append(TimeseriesForLabel(station_timeseries,
-                                                                  station.location_id,
-                                                                  'Q_COMP',
-                                                                  Units.flow))
-            else:
-                label = key
-                if label in label2time_series_spec.keys():
-                    spec = label2time_series_spec[label]
-                    multiple_timeseries.append(TimeseriesForLabel(timeseries,
-                                                                  area.location_id,
-                                                                  spec.parameter_id,
-                                                                  spec.units))
-
-        return multiple_timeseries
+        columns = spec_columns(mapping2timeseries, area.location_id,
+                               lambda station: station.location_id,
+                               label2time_series_spec)
+        return [TimeseriesForLabel(timeseries, location_id, parameter_id,
+                                   units)
+                for location_id, parameter_id, units, timeseries in columns]
 
     def set_standard_fields(self):
         self.timeseries.type = 'instantaneous'
@@ -365,18 +198,6 @@ class TimeseriesForLabel(TimeseriesForSomething):
             self.units == other.units
 
 
-class TimeseriesForPumpingStation(TimeseriesForSomething):
-
-    def __init__(self, timeseries, location_id):
-        self.timeseries = timeseries
-        self.location_id = location_id
-
-    def set_specific_fields(self):
-        self.timeseries.location_id = self.location_id
-        self.timeseries.parameter_id = 'Q'
-        self.timeseries.units = Units.flow
-
-
 class WriteableTimeseriesList(object):
 
     def __init__(self, area, label2time_series_spec):
@@ -443,9 +264,9 @@ class FractionsTimeseries(object):
         units = Units.fraction
         return TimeseriesForLabel(timeseries, location, parameter, units)
 
-def store_graphs_timeseries(run_info, area):
+def store_graphs_timeseries(run_info, area, tracer=None):
 
-    cm = WaterbalanceComputer2(None, area)
+    cm = WaterbalanceComputer2(None, area, tracer=tracer)
 
     start_date, end_date = run_info["startDateTime"], run_info["endDateTime"]
     incoming = cm.get_open_water_incoming_flows(start_date, end_date)
@@ -540,7 +361,7 @@ def negate_outgoing_timeseries(area):
     area.infiltration = abs(area.infiltration) * -1.0
 
 
-def main(args):
+def run(run_file):
     """Compute the waterbalance for the information specified in the given file.
 
     This function accepts a single parameter, viz. the file path to the Run.xml
@@ -548,62 +369,95 @@ def main(args):
 
     """
     try:
-        t1= time()
-
-        #from pydev import pydevd
-
-        #pydevd.settrace('192.168.20.53', port=51234, stdoutToServer=True, stderrToServer=True, suspend=False)
-
-
-        run_file, = args
-        run_dom = ElementTree.parse(run_file)
-        convert_dom(run_dom)
-        root = run_dom.getroot()
-        run_info = dict((i.tag, i.text)
-                         for i in root.getchildren()
-                         if i.tag != u"properties")
-        insert_calculation_range(run_dom, run_info)
-        diag = fews.DiagHandler(run_info['outputDiagnosticFile'])
-        diag.setLevel(logging.INFO)
-        logging.getLogger().addHandler(diag)
-
-        screen = logging.StreamHandler()
-        screen.setLevel(logging.DEBUG)
-        logging.getLogger().addHandler(screen)
-
-        log.setLevel(logging.DEBUG)
-
-        log.info("version: %s", version)
-
-        t2 = time()
-        log.debug("init: %s s"%(t2-t1))
-
-        tsd = TimeSeries.as_dict(run_info['inputTimeSeriesFile'])
-
-        area = parse_parameters(run_info['inputParameterFile'])
-        attach_timeseries_to_structures(area, tsd, ASSOC)
-        negate_outgoing_timeseries(area)
-        area.set_init_water_level(run_info['startDateTime'])
-        validate_settings(area)
-
-        t3 = time()
-        log.debug("reading data: %s"%(t3-t2))
-
-        graphs_timeseries = store_graphs_timeseries(run_info, area)
-
-        t4 = time()
-        log.debug("calculation: %s"%(t4-t3))
-
-        TimeSeries.write_to_pi_file(run_info['outputTimeSeriesFile'],
-                                    graphs_timeseries)
-        t5 = time()
-        log.debug("writing data: %s"%(t5-t4))
+        tracer = Tracer()
+        with tracer.stage('init'):
+
+            #from pydev import pydevd
+
+            #pydevd.settrace('192.168.20.53', port=51234, stdoutToServer=True, stderrToServer=True, suspend=False)
+
+
+            run_dom = ElementTree.parse(run_file)
+            convert_dom(run_dom)
+            root = run_dom.getroot()
+            run_info = dict((i.tag, i.text)
+                             for i in root.getchildren()
+                             if i.tag != u"properties")
+            run_properties = get_run_properties(root)
+            # counting the events is only worth it for the trace file
+            tracer.count_events = is_true(run_properties.get('traceFile'))
+            insert_calculation_range(run_dom, run_info)
+            diag = fews.DiagHandler(run_info['outputDiagnosticFile'])
+            diag.setLevel(logging.INFO)
+            logging.getLogger().addHandler(diag)
+
+            screen = logging.StreamHandler()
+            screen.setLevel(logging.DEBUG)
+            logging.getLogger().addHandler(screen)
+
+            log.setLevel(logging.DEBUG)
+
+            log.info("version: %s", version)
+
+        with tracer.stage('reading'):
+            tsd = TimeSeries.as_dict(run_info['inputTimeSeriesFile'])
+
+            area = parse_parameters(run_info['inputParameterFile'])
+            attach_timeseries_to_structures(area, tsd, ASSOC)
+            negate_outgoing_timeseries(area)
+            area.set_init_water_level(run_info['startDateTime'])
+            validate_settings(area)
+
+        with tracer.stage('calculation'):
+            graphs_timeseries = store_graphs_timeseries(run_info, area, tracer)
+
+        with tracer.stage('writing'):
+            TimeSeries.write_to_pi_file(run_info['outputTimeSeriesFile'],
+                                        graphs_timeseries)
+            if is_true(run_properties.get('columnarFile')):
+                columnar_file = \
+                    get_columnar_file_name(run_info['outputTimeSeriesFile'])
+                write_columnar_file(columnar_file,
+                                    timeseries_columns(graphs_timeseries),
+                                    run_info['startDateTime'],
+                                    run_info['endDateTime'])
+
+        tracer.log(log)
+        if is_true(run_properties.get('traceFile')):
+            trace_file = get_trace_file_name(run_info['outputTimeSeriesFile'])
+            tracer.write_json(trace_file, location_id=area.location_id,
+                              version=version)
     except:
         log.warning('wbcompute aborts prematurely')
         import traceback
         log.warning("The strack trace is:\n%s"%traceback.format_exc().replace('"','\''))
         raise
 
+
+def main(args=None):
+    """Compute the waterbalance for the run file specified on the command-line.
+
+    The command-line consists of the file path to the Run.xml file and
+    optionally, option '--profile' followed by the file to write a cProfile
+    profile of the computation to.
+
+    """
+    if args is None:
+        args = sys.argv[1:]
+    parser = OptionParser(
+        usage="%prog [--profile <profile-file>] <path-to-the-run-xml-file>")
+    parser.add_option("--profile",
+                      help="write a cProfile profile of the computation to "
+                           "the given file")
+    options, args = parser.parse_args(args)
+    if len(args) != 1:
+        parser.error("specify a single run file")
+    run_file, = args
+    if options.profile is None:
+        run(run_file)
+    else:
+        run_profiled(options.profile, run, run_file, log=log)
+
 if __name__ == '__main__':
 
     main(sys.argv[1:])
@@ -32,6 +32,9 @@ from nens import mock as nens_mock
 from timeseries.timeseriesstub import TimeseriesStub
 from timeseries.timeseriesstub import SparseTimeseriesStub
 from xmlmodel.reader import Area
+from xmlmodel.wbcompute import get_columnar_file_name
+from xmlmodel.wbcompute import get_run_properties
+from xmlmodel.wbcompute import get_trace_file_name
 from xmlmodel.wbcompute import insert_calculation_range
 from xmlmodel.wbcompute import FractionsTimeseries
 from xmlmodel.wbcompute import TimeSeriesSpec
@@ -81,6 +84,21 @@ class Tests(TestCase):
         self.assertEqual(datetime(2004, 12, 23), run_info['startDateTime'])
         self.assertEqual(datetime(2011, 11, 16), run_info['endDateTime'])
 
+    def test_properties(self):
+        """Function get_run_properties returns the properties of the run file."""
+        properties = get_run_properties(self.run_dom.getroot())
+        self.assertEqual({'Regio': 'Waternet', 'Gebied': 'SAP'}, properties)
+
+    def test_trace_file_name(self):
+        """The trace file is stored next to the output time series file."""
+        self.assertEqual('data/deltares/output/waterbalance-graph-trace.json',
+            get_trace_file_name('data/deltares/output/waterbalance-graph.xml'))
+
+    def test_columnar_file_name(self):
+        """The columnar file is stored next to the output time series file."""
+        self.assertEqual('data/deltares/output/waterbalance-graph.npz',
+            get_columnar_file_name('data/deltares/output/waterbalance-graph.xml'))
+
     def test_b(self):
         """Test the requirements for a TimeseriesStub to be writeable."""
         stream = nens_mock.Stream()